@@ -0,0 +1,237 @@
+"""
+Async orchestration of the question → conversation → audio chain.
+
+QuestionGenerator, AudioGenerator and JLPTQuestionVectorStore are
+synchronous (boto3 has no asyncio API), so the async counterparts below
+offload each call to a worker thread with asyncio.to_thread. On top of them
+QuestionPipeline overlaps the steps that do not depend on each other: once
+a question exists, its conversation formatting and the feedback for every
+option run concurrently while the question is being rendered, and audio
+synthesis starts as soon as the conversation format is known.
+
+Every step is recorded in a Timeline, so the overlap can be checked:
+
+    python -m backend.async_pipeline --section 2 --topic "Shopping"
+"""
+import argparse
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from backend import tracing
+
+# Also synthesize audio when prefetching for a question that is being shown
+PIPELINE_PREFETCH_AUDIO = os.environ.get('PIPELINE_PREFETCH_AUDIO', 'false').lower() == 'true'
+
+
+class Timeline:
+    """Thread-safe record of named spans, relative to the timeline's creation"""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self._spans: List[Dict] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self._spans.append({
+                    "name": name,
+                    "start_ms": round((start - self.origin) * 1000, 1),
+                    "end_ms": round((end - self.origin) * 1000, 1)
+                })
+
+    def spans(self) -> List[Dict]:
+        """Recorded spans ordered by start time"""
+        with self._lock:
+            return sorted(self._spans, key=lambda span: span["start_ms"])
+
+    def render(self, width: int = 50) -> str:
+        """Text Gantt chart of the spans"""
+        spans = self.spans()
+        if not spans:
+            return "(no spans)"
+        total = max(span["end_ms"] for span in spans) or 1.0
+        label_width = max(len(span["name"]) for span in spans)
+        lines = []
+        for span in spans:
+            begin = int(span["start_ms"] / total * width)
+            length = max(1, int(span["end_ms"] / total * width) - begin)
+            bar = " " * begin + "█" * length
+            lines.append(f"{span['name']:<{label_width}} |{bar:<{width}}| "
+                         f"{span['start_ms']:>8.0f} → {span['end_ms']:>8.0f} ms")
+        return "\n".join(lines)
+
+
+class AsyncQuestionGenerator:
+    """asyncio facade over a QuestionGenerator"""
+
+    def __init__(self, generator):
+        self.generator = generator
+
+    async def generate_question(self, section: int = None, topic: str = None, record: bool = True) -> Optional[Dict]:
+        return await asyncio.to_thread(self.generator.generate_question, section, topic, record)
+
+    async def provide_feedback(self, question: Dict, user_answer: str) -> str:
+        return await asyncio.to_thread(self.generator.provide_feedback, question, user_answer)
+
+    async def prewarm_feedback(self, question: Dict):
+        """Wait until feedback for every option is cached"""
+        futures = await asyncio.to_thread(self.generator.prewarm_feedback, question)
+        if futures:
+            await asyncio.gather(*(asyncio.wrap_future(future) for future in futures), return_exceptions=True)
+
+
+class AsyncAudioGenerator:
+    """asyncio facade over an AudioGenerator"""
+
+    def __init__(self, audio_generator):
+        self.audio_generator = audio_generator
+
+    async def prepare_conversation(self, question: Dict) -> bool:
+        return await asyncio.to_thread(self.audio_generator.prepare_conversation, question)
+
+    async def generate_audio(self, question: Dict, force: bool = False) -> Optional[str]:
+        return await asyncio.to_thread(self.audio_generator.generate_audio, question, force)
+
+
+class AsyncVectorStore:
+    """asyncio facade over a JLPTQuestionVectorStore"""
+
+    def __init__(self, vector_store):
+        self.vector_store = vector_store
+
+    async def query_similar_questions(self, query: str, section: Optional[int] = None,
+                                      n_results: int = 5) -> List[Dict]:
+        return await asyncio.to_thread(self.vector_store.query_similar_questions, query, section, n_results)
+
+
+class QuestionPipeline:
+    """
+    Overlapping question pipeline
+
+    run() drives the whole chain for a new question. prefetch() starts the
+    follow-up work for a question that is already shown, on a background
+    event loop, and returns immediately; the Streamlit script thread never
+    waits on it.
+    """
+
+    def __init__(self, generator, audio_generator):
+        """
+        Initialize the pipeline
+
+        Args:
+            generator (QuestionGenerator): Question and feedback generation
+            audio_generator (AudioGenerator): Conversation formatting and synthesis
+        """
+        self.generator = AsyncQuestionGenerator(generator)
+        self.audio = AsyncAudioGenerator(audio_generator)
+        self.last_timeline: Optional[Timeline] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+
+    async def _timed(self, timeline: Timeline, name: str, coroutine):
+        with timeline.span(name):
+            return await coroutine
+
+    async def _conversation_then_audio(self, question: Dict, timeline: Timeline, with_audio: bool) -> Optional[str]:
+        ready = await self._timed(timeline, "format_conversation", self.audio.prepare_conversation(question))
+        if not (ready and with_audio):
+            return None
+        return await self._timed(timeline, "synthesize_audio", self.audio.generate_audio(question))
+
+    async def follow_up(self, question: Dict, timeline: Optional[Timeline] = None, with_audio: bool = True) -> Dict:
+        """
+        Run the work that only needs the question, concurrently
+
+        Conversation formatting (then audio synthesis) and the feedback for
+        every option run side by side.
+
+        Returns:
+            Dict: "audio_file" (or None) and the "timeline"
+        """
+        timeline = timeline or Timeline()
+        audio_file, _ = await asyncio.gather(
+            self._conversation_then_audio(question, timeline, with_audio),
+            self._timed(timeline, "prefetch_feedback", self.generator.prewarm_feedback(question))
+        )
+        self.last_timeline = timeline
+        return {"audio_file": audio_file, "timeline": timeline}
+
+    async def run(self, section: int, topic: str, on_question: Optional[Callable[[Dict], None]] = None,
+                  with_audio: bool = True) -> Optional[Dict]:
+        """
+        Generate a question and everything that follows from it
+
+        Args:
+            section (int): JLPT section
+            topic (str): Question topic
+            on_question (Callable, optional): Called with the question as soon as it exists,
+                e.g. to render it, in a worker thread while the follow-up work runs
+            with_audio (bool): Synthesize the audio as well
+
+        Returns:
+            Optional[Dict]: "question", "audio_file" and "timeline", or None if generation failed
+        """
+        timeline = Timeline()
+        question = await self._timed(timeline, "generate_question",
+                                     self.generator.generate_question(section, topic))
+        if not question:
+            return None
+
+        steps = [self.follow_up(question, timeline, with_audio)]
+        if on_question:
+            steps.append(self._timed(timeline, "render_question", asyncio.to_thread(on_question, question)))
+        result, *_ = await asyncio.gather(*steps)
+        if result["audio_file"]:
+            question['audio_file'] = result["audio_file"]
+        return {"question": question, **result}
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="question-pipeline", daemon=True).start()
+            return self._loop
+
+    async def _traced_follow_up(self, question: Dict, with_audio: bool) -> Dict:
+        with tracing.span("prefetch", kind="action"):
+            return await self.follow_up(question, with_audio=with_audio)
+
+    def prefetch(self, question: Dict, with_audio: bool = PIPELINE_PREFETCH_AUDIO):
+        """Start follow_up for a shown question in the background; returns a concurrent Future"""
+        return asyncio.run_coroutine_threadsafe(self._traced_follow_up(question, with_audio), self._ensure_loop())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the overlapping question pipeline and print its timeline")
+    parser.add_argument("--section", type=int, default=2, help="JLPT section (2 or 3)")
+    parser.add_argument("--topic", default="Daily Conversation", help="Question topic")
+    parser.add_argument("--no-audio", action="store_true", help="Skip audio synthesis")
+    args = parser.parse_args()
+
+    from backend import resources
+    pipeline = QuestionPipeline(resources.get_question_generator(), resources.get_audio_generator())
+    result = asyncio.run(pipeline.run(
+        args.section,
+        args.topic,
+        on_question=lambda question: print(f"Question: {question.get('question')}"),
+        with_audio=not args.no_audio
+    ))
+    if result is None:
+        print("Failed to generate a question")
+        return
+    print(f"Audio: {result['audio_file']}\n")
+    print(result["timeline"].render())
+
+
+if __name__ == "__main__":
+    main()
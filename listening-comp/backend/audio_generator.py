@@ -1,60 +1,139 @@
 import json
 import os
-import tempfile
+import re
 import subprocess
-from typing import Dict, List, Optional
-import boto3
-from datetime import datetime
-import uuid
+import threading
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from backend import resources, tracing
+from backend.audio_store import AudioArtifactStore
+from backend.tts_cache import TTSSegmentCache, get_segment_cache
+from backend.tts_providers import SAMPLE_RATE, TTSProvider, create_tts_provider
+from backend.question_history import QuestionHistory, question_hash
+
+# Maximum number of TTS requests in flight per AudioGenerator
+TTS_MAX_CONCURRENCY = int(os.environ.get('TTS_MAX_CONCURRENCY', '4'))
+# Final audio container: "wav" (no encoder needed) or "mp3" (one ffmpeg call)
+AUDIO_OUTPUT_FORMAT = os.environ.get('AUDIO_OUTPUT_FORMAT', 'wav')
+
+@lru_cache(maxsize=None)
+def _silence(duration_ms: int) -> np.ndarray:
+    """Precomputed block of silent 16-bit PCM samples"""
+    samples = np.zeros(SAMPLE_RATE * duration_ms // 1000, dtype='<i2')
+    samples.flags.writeable = False
+    return samples
+
+# "話者：せりふ" lines, with a full-width or ASCII colon; labels contain no digits,
+# so times and ratios such as "会議は10:30から" are not taken for a speaker
+SPEAKER_LINE = re.compile(r'^\s*([^：:\s0-9０-９]{1,12})\s*[：:]\s*(.+?)\s*$')
+
+def split_marked_dialogue(question: Dict) -> Optional[Dict]:
+    """Build the speaker-turn format without an LLM when every line has a speaker marker
+    
+    Speakers whose label contains 男 or 女 get that gender; other speakers
+    alternate between male and female in order of appearance.
+    
+    Returns:
+        Optional[Dict]: Conversation format, or None if the dialogue is not marked
+    """
+    lines = [line for line in question.get('conversation', '').splitlines() if line.strip()]
+    matches = [SPEAKER_LINE.match(line) for line in lines]
+    if not lines or not all(matches):
+        return None
+    
+    genders = {}
+    turns = []
+    for match in matches:
+        speaker, text = match.group(1), match.group(2)
+        if speaker not in genders:
+            if '男' in speaker:
+                genders[speaker] = 'male'
+            elif '女' in speaker:
+                genders[speaker] = 'female'
+            else:
+                genders[speaker] = 'male' if len(genders) % 2 == 0 else 'female'
+        turns.append({"speaker": speaker, "gender": genders[speaker], "text": text})
+    
+    return {
+        "announcer_intro": question.get('introduction', ''),
+        "conversation": turns,
+        "announcer_question": question.get('question', '')
+    }
 
 class AudioGenerator:
-    def __init__(self):
-        """Initialize the audio generator with Bedrock and Polly clients"""
-        self.bedrock_client = boto3.client('bedrock-runtime', region_name="us-east-1")
-        self.polly_client = boto3.client('polly', region_name="us-east-1")
+    def __init__(self, bedrock_client=None, polly_client=None, max_concurrency: int = TTS_MAX_CONCURRENCY,
+                 segment_cache: Optional[TTSSegmentCache] = None, tts_provider: Optional[TTSProvider] = None,
+                 history: Optional[QuestionHistory] = None, store: Optional[AudioArtifactStore] = None):
+        """Initialize the audio generator with a Bedrock client and a TTS provider
         
-        # Define available Japanese standard voices by gender
-        self.voices = {
-            "male": "Takumi",
-            "female": "Mizuki",
-            "announcer": "Takumi"
-        }
+        Existing clients can be passed in to share connection pools. The TTS
+        provider defaults to the one selected by TTS_PROVIDER (Polly, reusing
+        polly_client if given). Segments of one question are synthesized
+        concurrently, at most max_concurrency at a time, and looked up in the
+        shared on-disk segment cache first. When a QuestionHistory is given,
+        LLM conversation formats are persisted there by question hash.
+        Finished audio is kept in an AudioArtifactStore, one file per question.
+        """
+        self.bedrock_client = bedrock_client or resources.get_bedrock_client()
+        self.tts_provider = tts_provider or create_tts_provider(polly_client=polly_client)
+        self.segment_cache = segment_cache or get_segment_cache()
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="tts")
+        self.history = history
+        self._conversation_formats: Dict[str, Dict] = {}
+        self._conversation_lock = threading.Lock()
         
-        # Create audio output directory if it doesn't exist
+        # Finished audio in audio/, files being written in temp/
         project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-        self.audio_dir = os.path.join(project_root, "audio")
-        try:
-            os.makedirs(self.audio_dir, exist_ok=True)
-            print(f"Audio directory created/verified at: {self.audio_dir}")
-        except OSError as e:
-            print(f"Error creating audio directory: {str(e)}")
+        self.store = store or AudioArtifactStore(
+            os.path.join(project_root, "audio"),
+            os.path.join(project_root, "temp"),
+            referenced_hashes=history.get_audio_references if history else None
+        )
+        self.audio_dir = self.store.audio_dir
+    
+    @property
+    def voices(self) -> Dict[str, str]:
+        """Voice ids by role, discovered lazily by the TTS provider"""
+        return self.tts_provider.voices
+    
+    def _convert_to_conversation_format(self, question: Dict) -> Optional[Dict]:
+        """Convert question into a format with speaker roles
         
-        # Verify voices are available
-        try:
-            voices = self.polly_client.describe_voices(LanguageCode='ja-JP')
-            available_voices = {voice['Id'] for voice in voices['Voices']}
-            print(f"Available Japanese voices: {available_voices}")
-            
-            # Default to first available voice if preferred voices not available
-            if not any(voice in available_voices for voice in self.voices.values()):
-                default_voice = next(iter(available_voices))
-                self.voices = {
-                    "male": default_voice,
-                    "female": default_voice,
-                    "announcer": default_voice
-                }
-        except Exception as e:
-            print(f"Error verifying voices: {str(e)}")
+        Tries, in order: the in-memory memo, the persisted format in the
+        question history, the rule-based splitter for marked dialogues, and
+        finally Bedrock. LLM results are memoized by question hash.
+        """
+        content_hash = question_hash(question)
+        with self._conversation_lock:
+            conversation = self._conversation_formats.get(content_hash)
+        if conversation is None and self.history is not None:
+            conversation = self.history.get_conversation_format(content_hash)
+        if conversation is None:
+            conversation = split_marked_dialogue(question)
+        if conversation is None:
+            conversation = self._convert_with_llm(question)
+            if conversation and self.history is not None:
+                self.history.save_conversation_format(content_hash, conversation)
         
-        # Create temp directory if it doesn't exist
-        self.temp_dir = os.path.join(project_root, "temp")
+        if conversation:
+            with self._conversation_lock:
+                self._conversation_formats[content_hash] = conversation
+        return conversation
+    
+    def prepare_conversation(self, question: Dict) -> bool:
+        """Work out (and memoize) the question's conversation format ahead of synthesis"""
         try:
-            os.makedirs(self.temp_dir, exist_ok=True)
-            print(f"Temp directory created/verified at: {self.temp_dir}")
-        except OSError as e:
-            print(f"Error creating temp directory: {str(e)}")
+            with tracing.span("format_conversation"):
+                return self._convert_to_conversation_format(question) is not None
+        except Exception as e:
+            print(f"Error preparing conversation: {str(e)}")
+            return False
     
-    def _convert_to_conversation_format(self, question: Dict) -> Dict:
+    def _convert_with_llm(self, question: Dict) -> Optional[Dict]:
         """Convert question into a format with speaker roles using Bedrock"""
         # Prepare the prompt for conversation formatting
         messages = [{
@@ -118,251 +197,177 @@ class AudioGenerator:
         gender = gender.lower()
         return self.voices.get(gender, self.voices["announcer"])
     
-    def _generate_audio_segment(self, text: str, output_file: str, voice_id: str) -> bool:
-        """Generate audio segment using Amazon Polly"""
+    def _generate_audio_segment(self, text: str, voice_id: str) -> Optional[np.ndarray]:
+        """Generate a speech segment as 16-bit PCM samples using the TTS provider"""
         try:
-            # Check if voice_id is available and use Japanese voice if not
-            if voice_id not in ["Takumi", "Mizuki"]:
-                voice_id = self.voices["male"] if voice_id in ["Matthew", "Justin"] else self.voices["female"]
-                print(f"Substituting non-Japanese voice with {voice_id}")
-            
-            response = self.polly_client.synthesize_speech(
-                Text=text,
-                OutputFormat='mp3',
-                VoiceId=voice_id,
-                LanguageCode='ja-JP',
-                Engine='standard'  # Use standard engine for Japanese voices
-            )
+            # Repeated lines (announcer prompts, common phrases) come from the cache
+            cache_key = TTSSegmentCache.make_key(voice_id, self.tts_provider.name, text, SAMPLE_RATE)
+            pcm = self.segment_cache.get(cache_key)
+            if pcm is None:
+                pcm = self.tts_provider.synthesize(text, voice_id)
+                self.segment_cache.put(cache_key, pcm)
             
-            # Save to temporary file
-            with open(output_file, 'wb') as f:
-                f.write(response['AudioStream'].read())
-            return True
+            # Providers return signed 16-bit little-endian mono
+            return np.frombuffer(pcm, dtype='<i2')
         except Exception as e:
             print(f"Error generating audio segment with voice {voice_id}: {str(e)}")
             # Try with default announcer voice if the specified voice fails
             if voice_id != self.voices["announcer"]:
                 print(f"Retrying with announcer voice {self.voices['announcer']}")
-                return self._generate_audio_segment(text, output_file, self.voices["announcer"])
-            return False
+                return self._generate_audio_segment(text, self.voices["announcer"])
+            return None
     
-    def _generate_silence(self, duration_ms: int, output_file: str) -> bool:
-        """Generate a silent audio segment using ffmpeg"""
+    def _encode_audio(self, samples: np.ndarray, output_file: str) -> bool:
+        """Encode PCM samples once: WAV in-process, MP3 with a single piped ffmpeg call"""
         try:
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            pcm = samples.astype('<i2').tobytes()
+            
+            if output_file.endswith('.wav'):
+                with wave.open(output_file, 'wb') as f:
+                    f.setnchannels(1)
+                    f.setsampwidth(2)
+                    f.setframerate(SAMPLE_RATE)
+                    f.writeframes(pcm)
+                return True
+            
             # Use Docker container's ffmpeg
             ffmpeg_path = "/usr/bin/ffmpeg"
-            
             if not os.path.exists(ffmpeg_path):
                 print(f"ffmpeg not found at {ffmpeg_path}")
                 return False
             
-            # Generate silence using ffmpeg
             cmd = [
                 ffmpeg_path,
                 '-y',
-                '-f', 'lavfi',
-                '-i', f'anullsrc=r=24000:cl=mono',
-                '-t', f'{duration_ms/1000}',  # Convert ms to seconds
+                '-f', 's16le',
+                '-ar', str(SAMPLE_RATE),
+                '-ac', '1',
+                '-i', 'pipe:0',
                 '-acodec', 'libmp3lame',
                 '-b:a', '128k',
                 output_file
             ]
-            
-            process = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                check=False
-            )
-            
+            process = subprocess.run(cmd, input=pcm, capture_output=True, check=False)
             if process.returncode != 0:
-                print(f"Error generating silence: {process.stderr}")
+                print(f"ffmpeg stderr: {process.stderr.decode(errors='replace')}")
                 return False
-                
             return True
             
         except Exception as e:
-            print(f"Error generating silence: {str(e)}")
+            print(f"Error encoding audio: {str(e)}")
             return False
     
-    def _combine_audio_files(self, audio_files: List[str], output_file: str) -> bool:
-        """Combine multiple audio files using ffmpeg"""
-        try:
-            if not audio_files:
-                print("No audio files to combine")
-                return False
-                
-            if len(audio_files) == 1:
-                # If only one file, just copy it to the output location
-                import shutil
-                shutil.copy2(audio_files[0], output_file)
-                # Clean up temporary file
-                os.remove(audio_files[0])
-                return True
-            
-            # Create output directory if it doesn't exist
-            output_dir = os.path.dirname(output_file)
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # Create a temporary file list for ffmpeg
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False, encoding='utf-8') as f:
-                for audio_file in audio_files:
-                    # Verify file exists and convert path for ffmpeg
-                    if not os.path.exists(audio_file):
-                        print(f"Audio file not found: {audio_file}")
-                        return False
-                    # Use absolute path with forward slashes
-                    abs_path = os.path.abspath(audio_file).replace('\\', '/')
-                    f.write(f"file '{abs_path}'\n")
-                file_list = f.name
-            
-            try:
-                print(f"Running ffmpeg with file list: {file_list}")
-                with open(file_list, 'r', encoding='utf-8') as f:
-                    print("File list contents:")
-                    print(f.read())
-                
-                # Use Docker container's ffmpeg
-                ffmpeg_path = "/usr/bin/ffmpeg"
-                
-                if not os.path.exists(ffmpeg_path):
-                    print(f"ffmpeg not found at {ffmpeg_path}")
-                    return False
-                
-                # Build the ffmpeg command with proper quoting
-                cmd = [
-                    ffmpeg_path,
-                    '-y',  # Overwrite output file if it exists
-                    '-f', 'concat',
-                    '-safe', '0',
-                    '-i', file_list,
-                    '-c', 'copy',  # Copy codec without re-encoding
-                    output_file
-                ]
-                
-                print(f"Running command: {' '.join(cmd)}")
-                
-                # Run ffmpeg directly without PowerShell
-                process = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    check=False,  # Don't raise exception on non-zero return
-                    cwd=os.path.dirname(output_file)  # Set working directory to output location
-                )
-                
-                if process.returncode != 0:
-                    print(f"ffmpeg stdout: {process.stdout}")
-                    print(f"ffmpeg stderr: {process.stderr}")
-                    return False
-                
-                # Clean up temporary files
-                os.unlink(file_list)
-                for file in audio_files:
-                    try:
-                        os.remove(file)
-                    except Exception as e:
-                        print(f"Error removing temporary file {file}: {str(e)}")
-                
-                return True
-                
-            except Exception as e:
-                print(f"Error running ffmpeg: {str(e)}")
-                # Clean up temporary files
-                try:
-                    os.unlink(file_list)
-                except:
-                    pass
-                for file in audio_files:
-                    try:
-                        os.remove(file)
-                    except:
-                        pass
-                return False
-                
-        except Exception as e:
-            print(f"Error combining audio files: {str(e)}")
-            # Clean up any temporary files
-            for file in audio_files:
-                try:
-                    os.remove(file)
-                except:
-                    pass
-            return False
+    def _build_segment_plan(self, conversation: Dict) -> List[Tuple]:
+        """Lay out the audio as an ordered list of ("speech", text, voice) and ("silence", ms) parts"""
+        plan = [
+            # Intro with announcer voice, then a longer pause (2 seconds)
+            ("speech", conversation['announcer_intro'], self.voices["announcer"]),
+            ("silence", 2000)
+        ]
+        
+        # Conversation alternating between voices, with a shorter pause (1 second) between parts
+        lines = conversation['conversation']
+        for i, segment in enumerate(lines, 1):
+            gender = segment.get('gender', 'male').lower()
+            plan.append(("speech", segment['text'], self._get_voice_for_gender(gender)))
+            if i < len(lines):
+                plan.append(("silence", 1000))
+        
+        # Announcer question
+        plan.append(("speech", conversation['announcer_question'], self.voices["announcer"]))
+        return plan
+    
+    def _iter_segments(self, plan: List[Tuple]) -> Iterator[np.ndarray]:
+        """Synthesize all speech parts of a plan concurrently, yielding PCM buffers in plan order
+        
+        Every TTS request is submitted up front, so each buffer is yielded as
+        soon as it and everything before it are ready.
+        
+        Raises:
+            RuntimeError: If a segment could not be generated
+        """
+        futures = [
+            self._executor.submit(self._generate_audio_segment, part[1], part[2])
+            if part[0] == "speech" else None
+            for part in plan
+        ]
+        
+        for i, (part, future) in enumerate(zip(plan, futures)):
+            samples = _silence(part[1]) if future is None else future.result()
+            if samples is None:
+                raise RuntimeError(f"Failed to generate {part[0]} segment {i}")
+            yield samples
     
-    def generate_audio(self, question: Dict) -> Optional[str]:
-        """Generate audio for a question by converting it to a conversation format"""
+    def _synthesize_segments(self, plan: List[Tuple]) -> Optional[List[np.ndarray]]:
+        """Synthesize all parts of a plan
+        
+        Returns:
+            Optional[List[np.ndarray]]: PCM buffers in plan order, or None if any part failed
+        """
         try:
-            # Generate a unique filename for this question
-            output_file = os.path.join(self.audio_dir, f"question_{uuid.uuid4()}.mp3")
-            
-            # Convert question to conversation format
+            return list(self._iter_segments(plan))
+        except RuntimeError as e:
+            print(str(e))
+            return None
+    
+    def output_path(self, question: Dict) -> str:
+        """Path the question's audio is (or will be) stored at"""
+        return self.store.path_for(question, AUDIO_OUTPUT_FORMAT)
+    
+    def get_cached_audio(self, question: Dict) -> Optional[str]:
+        """Previously generated audio for the question, if still stored"""
+        return self.store.get(question, AUDIO_OUTPUT_FORMAT)
+    
+    def stream_audio(self, question: Dict) -> Iterator[np.ndarray]:
+        """Yield the question's PCM segments in playback order as soon as each is ready
+        
+        Once every segment has been yielded the full audio is encoded and
+        committed to output_path(question), so consumers can start playback
+        at the first segment and still end up with the usual audio file.
+        
+        Raises:
+            RuntimeError: If conversion, synthesis or encoding fails
+        """
+        # Convert question to conversation format
+        with tracing.span("format_conversation"):
             conversation = self._convert_to_conversation_format(question)
-            if not conversation:
-                print("Failed to convert question to conversation format")
-                return None
-            
-            audio_files = []
-            try:
-                # Generate intro audio with announcer voice
-                intro_voice = self.voices["announcer"]
-                intro_text = conversation['announcer_intro']
-                intro_file = os.path.join(self.temp_dir, f"intro_{uuid.uuid4()}.mp3")
-                if not self._generate_audio_segment(intro_text, intro_file, intro_voice):
-                    print("Failed to generate intro audio")
-                    return None
-                audio_files.append(intro_file)
-                
-                # Add a longer pause (2 seconds) after intro
-                silence_file = os.path.join(self.temp_dir, f"silence_{uuid.uuid4()}.mp3")
-                if not self._generate_silence(2000, silence_file):
-                    print("Failed to generate silence after intro")
-                    return None
-                audio_files.append(silence_file)
-                
-                # Generate conversation audio alternating between voices
-                for i, segment in enumerate(conversation['conversation'], 1):
-                    gender = segment.get('gender', 'male').lower()
-                    voice = self._get_voice_for_gender(gender)
-                    audio_file = os.path.join(self.temp_dir, f"segment_{i}_{uuid.uuid4()}.mp3")
-                    if not self._generate_audio_segment(segment['text'], audio_file, voice):
-                        print(f"Failed to generate audio for segment {i}")
-                        return None
-                    audio_files.append(audio_file)
-                    
-                    # Add a shorter pause (1 second) between conversation parts
-                    if i < len(conversation['conversation']):
-                        silence_file = os.path.join(self.temp_dir, f"silence_{i}_{uuid.uuid4()}.mp3")
-                        if not self._generate_silence(1000, silence_file):
-                            print("Failed to generate silence between segments")
-                            return None
-                        audio_files.append(silence_file)
-                
-                # Generate announcer question
-                announcer_voice = self.voices["announcer"]
-                announcer_question_text = conversation['announcer_question']
-                announcer_question_file = os.path.join(self.temp_dir, f"announcer_question_{uuid.uuid4()}.mp3")
-                if not self._generate_audio_segment(announcer_question_text, announcer_question_file, announcer_voice):
-                    print("Failed to generate announcer question audio")
-                    return None
-                audio_files.append(announcer_question_file)
-                
-                # Combine all audio segments
-                if not self._combine_audio_files(audio_files, output_file):
-                    print("Failed to combine audio files")
-                    return None
-                
-                return output_file
-                
-            except Exception as e:
-                print(f"Error generating audio segments: {str(e)}")
-                # Clean up any temporary files
-                for file in audio_files:
-                    try:
-                        os.remove(file)
-                    except:
-                        pass
-                return None
+        if not conversation:
+            raise RuntimeError("Failed to convert question to conversation format")
+        
+        # Synthesize intro, dialogue and question in parallel, keeping their order
+        segments = []
+        for samples in self._iter_segments(self._build_segment_plan(conversation)):
+            segments.append(samples)
+            yield samples
+        
+        # Concatenate PCM buffers in memory, encode once into temp/ and move into place
+        temp_file = self.store.temp_path(AUDIO_OUTPUT_FORMAT)
+        try:
+            with tracing.span("encode_audio", format=AUDIO_OUTPUT_FORMAT):
+                if not self._encode_audio(np.concatenate(segments), temp_file):
+                    raise RuntimeError("Failed to encode audio")
+                self.store.commit(temp_file, question, AUDIO_OUTPUT_FORMAT)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+    
+    def generate_audio(self, question: Dict, force: bool = False) -> Optional[str]:
+        """Generate audio for a question by converting it to a conversation format
+        
+        Args:
+            question (Dict): Question to voice
+            force (bool): Synthesize again even if the question's audio is already stored
+        """
+        if not force:
+            audio_file = self.get_cached_audio(question)
+            if audio_file:
+                return audio_file
+        
+        try:
+            for _ in self.stream_audio(question):
+                pass
+            return self.output_path(question)
                 
         except Exception as e:
             print(f"Error generating audio: {str(e)}")
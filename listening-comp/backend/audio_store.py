@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, Optional
+
+from backend.question_history import question_hash
+
+# Disk budget for finished question audio
+AUDIO_STORE_MAX_MB = int(os.environ.get('AUDIO_STORE_MAX_MB', '500'))
+# Unreferenced audio older than this is removed even when under budget
+AUDIO_STORE_MAX_AGE_DAYS = float(os.environ.get('AUDIO_STORE_MAX_AGE_DAYS', '30'))
+# Temp files older than this are treated as leftovers of crashed runs
+AUDIO_TEMP_GRACE_SECONDS = int(os.environ.get('AUDIO_TEMP_GRACE_SECONDS', '3600'))
+# Referenced hashes read from history are reused for this long by budget sweeps after a commit
+REFERENCES_MAX_AGE_SECONDS = 60
+
+
+class AudioArtifactStore:
+    """
+    Content-addressed store for finished question audio.
+
+    Each question's audio lives at question_<hash>.<ext>, so regenerating or
+    re-serving the same question reuses one file instead of adding another.
+    Files are written to temp/ first and moved into place atomically. When
+    the directory exceeds its size budget, files are evicted least recently
+    used first, with audio of questions still in the history evicted last
+    (matched by content hash, or by file name for older question_<uuid>
+    files that history entries point to); unreferenced audio past the age
+    limit is removed regardless of size.
+    """
+
+    def __init__(self, audio_dir: str, temp_dir: str, max_bytes: int = AUDIO_STORE_MAX_MB * 1024 * 1024,
+                 max_age_days: float = AUDIO_STORE_MAX_AGE_DAYS,
+                 referenced_hashes: Optional[Callable[[], Iterable[str]]] = None):
+        """
+        Initialize the store and clean up leftovers from previous runs
+
+        Args:
+            audio_dir (str): Folder holding finished audio
+            temp_dir (str): Folder for files still being written
+            max_bytes (int): Size budget before LRU eviction
+            max_age_days (float): Age limit for unreferenced audio
+            referenced_hashes (callable, optional): Returns question hashes and audio file
+                names still in use, e.g. QuestionHistory.get_audio_references
+        """
+        self.audio_dir = audio_dir
+        self.temp_dir = temp_dir
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self.referenced_hashes = referenced_hashes
+        os.makedirs(audio_dir, exist_ok=True)
+        os.makedirs(temp_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._references = None
+        self._references_time = 0.0
+        self._temp_files_removed = self.cleanup_temp()
+        self._size_bytes = 0
+        self.enforce_budget()
+
+    def path_for(self, question: Dict, extension: str) -> str:
+        """Final location of a question's audio"""
+        return os.path.join(self.audio_dir, f"question_{question_hash(question)}.{extension}")
+
+    def temp_path(self, extension: str) -> str:
+        """Unique file in temp/ to write audio into before commit()"""
+        return os.path.join(self.temp_dir, f"audio_{uuid.uuid4().hex}.{extension}")
+
+    def get(self, question: Dict, extension: str) -> Optional[str]:
+        """Return the stored audio path for a question, or None on a miss"""
+        path = self.path_for(question, extension)
+        try:
+            # Mark as recently used for LRU eviction
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._misses += 1
+            return None
+
+        with self._lock:
+            self._hits += 1
+        return path
+
+    def commit(self, temp_file: str, question: Dict, extension: str) -> str:
+        """Move a finished temp file to the question's path and enforce the budget"""
+        path = self.path_for(question, extension)
+        existing = os.path.getsize(path) if os.path.exists(path) else 0
+        size = os.path.getsize(temp_file)
+        # Atomic so the player never sees a partially written file
+        os.replace(temp_file, path)
+
+        with self._lock:
+            self._size_bytes += size - existing
+            over_budget = self._size_bytes > self.max_bytes
+        if over_budget:
+            self.enforce_budget(keep=path, references_max_age=REFERENCES_MAX_AGE_SECONDS)
+        return path
+
+    def cleanup_temp(self, grace_seconds: int = AUDIO_TEMP_GRACE_SECONDS) -> int:
+        """
+        Remove temp/ files older than grace_seconds
+
+        Returns:
+            int: Number of files removed
+        """
+        cutoff = time.time() - grace_seconds
+        removed = 0
+        for directory in (self.temp_dir, self.audio_dir):
+            for entry in os.scandir(directory):
+                if not entry.is_file():
+                    continue
+                # Everything in temp/ is scratch; in audio/ only interrupted writes
+                if directory == self.audio_dir and not entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                        removed += 1
+                except OSError:
+                    pass
+        if removed:
+            print(f"Removed {removed} orphaned temporary audio files")
+        return removed
+
+    def _referenced(self, max_age: float = 0) -> set:
+        """Referenced hashes and file names, reusing the last read if it is younger than max_age seconds"""
+        if self.referenced_hashes is None:
+            return set()
+        with self._lock:
+            if self._references is not None and time.time() - self._references_time < max_age:
+                return self._references
+        try:
+            references = set(self.referenced_hashes())
+        except Exception as e:
+            print(f"Error reading referenced audio: {str(e)}")
+            return set()
+        with self._lock:
+            self._references, self._references_time = references, time.time()
+        return references
+
+    def enforce_budget(self, keep: Optional[str] = None, references_max_age: float = 0):
+        """
+        Drop expired unreferenced audio, then evict LRU files until 90% of the budget is free
+
+        Args:
+            keep (str, optional): File that must survive, e.g. the one just committed
+            references_max_age (float): Reuse referenced hashes read this recently
+        """
+        referenced = self._referenced(references_max_age)
+        now = time.time()
+
+        entries = []
+        for entry in os.scandir(self.audio_dir):
+            if not entry.is_file() or entry.name.endswith('.tmp'):
+                continue
+            stat = entry.stat()
+            content_hash = entry.name.split('.', 1)[0][len('question_'):]
+            # Unreferenced files sort first, oldest first within each group
+            is_referenced = content_hash in referenced or entry.name in referenced
+            entries.append((is_referenced, stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+
+        with self._lock:
+            self._size_bytes = sum(size for _, _, size, _ in entries)
+            target = int(self.max_bytes * 0.9) if self._size_bytes > self.max_bytes else self.max_bytes
+            for is_referenced, mtime, size, path in entries:
+                expired = not is_referenced and now - mtime > self.max_age_seconds
+                if path == keep or (not expired and self._size_bytes <= target):
+                    continue
+                try:
+                    os.remove(path)
+                    self._size_bytes -= size
+                    self._evictions += 1
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict:
+        """Hit rate, evictions and current size"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "size_bytes": self._size_bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self._evictions,
+                "temp_files_removed": self._temp_files_removed
+            }
@@ -0,0 +1,171 @@
+import os
+import struct
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+
+from backend.tts_providers import SAMPLE_RATE
+
+# Whether the frontend streams audio while it is being synthesized
+AUDIO_STREAMING = os.environ.get('AUDIO_STREAMING', 'true').lower() == 'true'
+# Port the stream server listens on
+AUDIO_STREAM_PORT = int(os.environ.get('AUDIO_STREAM_PORT', '8502'))
+# Base URL the browser uses to reach the stream server
+AUDIO_STREAM_PUBLIC_URL = os.environ.get('AUDIO_STREAM_PUBLIC_URL', f'http://localhost:{AUDIO_STREAM_PORT}')
+# Seconds a finished stream stays available for replays
+AUDIO_STREAM_TTL = 600
+
+
+def streaming_wav_header(sample_rate: int = SAMPLE_RATE) -> bytes:
+    """
+    WAV header for 16-bit mono PCM of unknown length
+
+    The RIFF and data sizes are set to the maximum value, which browsers
+    treat as "read until the connection closes".
+    """
+    return (
+        b'RIFF' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE'
+        + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+        + b'data' + struct.pack('<I', 0xFFFFFFFF)
+    )
+
+
+class AudioStream:
+    """PCM buffer that grows while segments are synthesized and can be read concurrently"""
+
+    def __init__(self):
+        self._chunks = []
+        self._condition = threading.Condition()
+        self.done = False
+        self.error: Optional[str] = None
+        self.finished_at: Optional[float] = None
+
+    def append(self, data: bytes):
+        with self._condition:
+            self._chunks.append(data)
+            self._condition.notify_all()
+
+    def finish(self, error: Optional[str] = None):
+        with self._condition:
+            self.done = True
+            self.error = error
+            self.finished_at = time.time()
+            self._condition.notify_all()
+
+    def iter_chunks(self, timeout: float = 60.0) -> Iterator[bytes]:
+        """Yield chunks from the start, waiting for new ones until the stream is finished"""
+        index = 0
+        while True:
+            with self._condition:
+                while index >= len(self._chunks) and not self.done:
+                    if not self._condition.wait(timeout):
+                        return
+                if index >= len(self._chunks):
+                    return
+                chunk = self._chunks[index]
+            index += 1
+            yield chunk
+
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    server_version = "ListeningCompAudio/1.0"
+
+    def do_GET(self):
+        stream_id = self.path.rstrip('/').rsplit('/', 1)[-1]
+        stream = self.server.streams.get(stream_id) if self.path.startswith('/stream/') else None
+        if stream is None:
+            self.send_error(404, "Unknown audio stream")
+            return
+
+        # No Content-Length: the body ends when the connection closes
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/wav')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        try:
+            self.wfile.write(streaming_wav_header())
+            for chunk in stream.iter_chunks():
+                self.wfile.write(chunk)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AudioStreamServer:
+    """
+    Serves question audio over HTTP while it is still being synthesized.
+
+    publish() consumes an iterator of PCM segments (AudioGenerator.stream_audio)
+    on a background thread, and GET /stream/<id> sends a WAV stream that grows
+    as segments arrive, so playback starts after the first TTS call instead of
+    after the whole question has been synthesized and encoded.
+    """
+
+    def __init__(self, host: str = '0.0.0.0', port: int = AUDIO_STREAM_PORT,
+                 public_url: str = AUDIO_STREAM_PUBLIC_URL):
+        """
+        Start the server on a daemon thread
+
+        Args:
+            host (str): Interface to bind
+            port (int): Port to listen on (0 picks a free port)
+            public_url (str): Base URL the browser uses to reach this server
+        """
+        self._server = ThreadingHTTPServer((host, port), _StreamHandler)
+        self._server.daemon_threads = True
+        self._server.streams: Dict[str, AudioStream] = {}
+        self.port = self._server.server_address[1]
+        self.public_url = public_url.rstrip('/') if port else f'http://localhost:{self.port}'
+
+        self._thread = threading.Thread(target=self._server.serve_forever, name="audio-stream", daemon=True)
+        self._thread.start()
+
+    def publish(self, segments: Iterator[np.ndarray]) -> str:
+        """
+        Start streaming PCM segments and return the stream id
+
+        Args:
+            segments (Iterator[np.ndarray]): int16 PCM buffers in playback order
+        """
+        self._expire()
+        stream_id = uuid.uuid4().hex
+        stream = AudioStream()
+        self._server.streams[stream_id] = stream
+        threading.Thread(target=self._produce, args=(stream, segments), daemon=True).start()
+        return stream_id
+
+    @staticmethod
+    def _produce(stream: AudioStream, segments: Iterator[np.ndarray]):
+        try:
+            for samples in segments:
+                stream.append(samples.astype('<i2', copy=False).tobytes())
+            stream.finish()
+        except Exception as e:
+            print(f"Error streaming audio: {str(e)}")
+            stream.finish(error=str(e))
+
+    def url(self, stream_id: str) -> str:
+        """Browser URL for a published stream"""
+        return f"{self.public_url}/stream/{stream_id}"
+
+    def get_stream(self, stream_id: str) -> Optional[AudioStream]:
+        return self._server.streams.get(stream_id)
+
+    def _expire(self):
+        """Drop finished streams older than AUDIO_STREAM_TTL"""
+        cutoff = time.time() - AUDIO_STREAM_TTL
+        for stream_id, stream in list(self._server.streams.items()):
+            if stream.finished_at is not None and stream.finished_at < cutoff:
+                self._server.streams.pop(stream_id, None)
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
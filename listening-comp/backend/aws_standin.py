@@ -0,0 +1,583 @@
+"""
+Local record/replay stand-in for the Bedrock runtime and Polly APIs.
+
+StandInServer speaks the REST protocol boto3 uses for converse,
+converse_stream, invoke_model, invoke_model_with_response_stream,
+synthesize_speech and describe_voices, so the unmodified app runs against it
+by pointing BEDROCK_ENDPOINT_URL and POLLY_ENDPOINT_URL at the server.
+Streams are sent as real AWS event-stream frames.
+
+Responses come from recordings when there are any (matched exactly by
+request body, otherwise round-robin over the same operation and model) and
+are synthesized otherwise: a valid question, conversation format or
+feedback text depending on the prompt, deterministic embeddings and a PCM
+tone per Polly request. Each operation waits for a configurable latency
+distribution before answering; streams also wait between events.
+
+Record real traffic by setting AWS_RECORD_DIR while running against AWS:
+Recorder hooks into the clients' after-call events and appends every
+response to <dir>/<Operation>.jsonl. Serve the recordings with:
+
+    python -m backend.aws_standin --recordings ./recordings --latency converse=lognormal:900:0.4
+"""
+import argparse
+import base64
+import binascii
+import hashlib
+import io
+import itertools
+import json
+import os
+import random
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import unquote, urlparse
+
+import numpy as np
+
+STANDIN_PORT = int(os.environ.get('STANDIN_PORT', '8600'))
+
+# Route suffix of /model/<id>/<suffix> per Bedrock operation
+BEDROCK_ROUTES = {
+    "converse": "Converse",
+    "converse-stream": "ConverseStream",
+    "invoke": "InvokeModel",
+    "invoke-with-response-stream": "InvokeModelWithResponseStream"
+}
+# Default wait between stream events
+DEFAULT_CHUNK_LATENCY = "fixed:20"
+EMBEDDING_DIMENSIONS = 1536
+
+
+class LatencyModel:
+    """
+    Latency distribution in milliseconds, parsed from a spec string
+
+    "fixed:MS", "uniform:LOW:HIGH", "normal:MEAN:SD", "lognormal:MEDIAN:SIGMA",
+    or "recorded" to replay the latency stored with each recording.
+    """
+
+    def __init__(self, spec: str = "fixed:0", seed: Optional[int] = None):
+        kind, *params = spec.split(':')
+        if kind not in ("fixed", "uniform", "normal", "lognormal", "recorded"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+        self.spec = spec
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self, recorded_ms: Optional[float] = None) -> float:
+        with self._lock:
+            if self.kind == "fixed":
+                value = self.params[0]
+            elif self.kind == "uniform":
+                value = self._rng.uniform(*self.params)
+            elif self.kind == "normal":
+                value = self._rng.gauss(*self.params)
+            elif self.kind == "lognormal":
+                value = self._rng.lognormvariate(np.log(max(self.params[0], 1e-3)), self.params[1])
+            else:
+                value = recorded_ms or 0.0
+        return max(0.0, value)
+
+
+_SNAKE_NAMES = {
+    "Converse": "converse",
+    "ConverseStream": "converse_stream",
+    "InvokeModel": "invoke_model",
+    "InvokeModelWithResponseStream": "invoke_model_with_response_stream",
+    "SynthesizeSpeech": "synthesize_speech"
+}
+
+
+# Names accepted in latency specs; "<stream operation>:chunk" is the gap between stream events
+LATENCY_OPERATIONS = set(_SNAKE_NAMES.values()) | {"describe_voices"} | {
+    "converse_stream:chunk", "invoke_model_with_response_stream:chunk"
+}
+
+
+def parse_latency_specs(items: List[str]) -> Dict[str, LatencyModel]:
+    """Parse "operation=spec" items (operation as in botocore, e.g. converse or converse_stream:chunk)"""
+    models = {}
+    for item in items:
+        operation, _, spec = item.partition('=')
+        operation = operation.strip()
+        if operation not in LATENCY_OPERATIONS:
+            raise ValueError(f"Unknown operation in latency spec: {item} "
+                             f"(expected one of {', '.join(sorted(LATENCY_OPERATIONS))})")
+        models[operation] = LatencyModel(spec.strip())
+    return models
+
+
+def _encode_header(name: str, value: str) -> bytes:
+    name_bytes, value_bytes = name.encode('utf-8'), value.encode('utf-8')
+    # Header value type 7 is a string
+    return struct.pack('!B', len(name_bytes)) + name_bytes + struct.pack('!BH', 7, len(value_bytes)) + value_bytes
+
+
+def encode_event(event_type: str, payload: Dict) -> bytes:
+    """One AWS event-stream frame: prelude, headers, JSON payload, CRC32 checksums"""
+    headers = b"".join([
+        _encode_header(':event-type', event_type),
+        _encode_header(':content-type', 'application/json'),
+        _encode_header(':message-type', 'event')
+    ])
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    total_length = 12 + len(headers) + len(body) + 4
+    prelude = struct.pack('!II', total_length, len(headers))
+    prelude += struct.pack('!I', binascii.crc32(prelude) & 0xffffffff)
+    message = prelude + headers + body
+    return message + struct.pack('!I', binascii.crc32(message) & 0xffffffff)
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 3)
+
+
+def _prompt_text(request: Dict) -> str:
+    """All user text of a converse or messages-v1 request"""
+    texts = []
+    for message in request.get('messages', []):
+        for block in message.get('content', []):
+            if isinstance(block, dict) and block.get('text'):
+                texts.append(block['text'])
+    return "\n".join(texts) or request.get('prompt', '') or request.get('inputText', '')
+
+
+class SyntheticResponses:
+    """Plausible responses for requests without a recording"""
+
+    def __init__(self):
+        self._counter = itertools.count(1)
+
+    def text_for(self, request: Dict) -> str:
+        n = next(self._counter)
+        kind = request_kind(request)
+        if kind == "conversation":
+            return json.dumps({
+                "announcer_intro": "男の人と女の人が話しています。",
+                "conversation": [
+                    {"speaker": "男", "gender": "male", "text": "週末は何をしますか。"},
+                    {"speaker": "女", "gender": "female", "text": "友達と買い物に行きます。"}
+                ],
+                "announcer_question": "女の人は週末何をしますか。"
+            }, ensure_ascii=False)
+        if kind == "question":
+            return json.dumps({
+                "introduction": "男の人と女の人が話しています。",
+                "conversation": f"男：週末は何をしますか。\n女：友達と買い物に行きます。（{n}）",
+                "question": "女の人は週末何をしますか。",
+                "options": ["家で休む", "買い物に行く", "仕事をする", "旅行に行く"],
+                "correct_answer": 1
+            }, ensure_ascii=False)
+        return "正解は「買い物に行く」です。会話の中で女の人が「友達と買い物に行きます」と言っています。"
+
+    @staticmethod
+    def embedding(text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+        vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIMENSIONS)
+        return (vector / np.linalg.norm(vector)).round(6).tolist()
+
+    @staticmethod
+    def speech(text: str, sample_rate: int) -> bytes:
+        # A quiet tone, roughly 120 ms per character, as 16-bit mono PCM
+        duration = max(0.2, 0.12 * len(text))
+        t = np.arange(int(sample_rate * duration)) / sample_rate
+        return (np.sin(2 * np.pi * 220 * t) * 2000).astype('<i2').tobytes()
+
+
+class RecordingStore:
+    """
+    Recorded responses by operation
+
+    A request is answered with the recording of the identical request body
+    if there is one, otherwise round-robin over recordings of the same
+    operation and prompt kind, preferring the same model. Kinds keep a
+    question-generation call from being answered with recorded feedback.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self._exact: Dict[tuple, Dict] = {}
+        self._cycles: Dict[tuple, itertools.cycle] = {}
+        self._lock = threading.Lock()
+        self.count = 0
+        if not (directory and os.path.isdir(directory)):
+            return
+        grouped: Dict[tuple, List[Dict]] = {}
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith('.jsonl'):
+                continue
+            operation = filename[:-len('.jsonl')]
+            with open(os.path.join(directory, filename), 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    self._exact[(operation, record.get('request_key'))] = record
+                    grouped.setdefault((operation, record.get('kind'), record.get('model_id')), []).append(record)
+                    grouped.setdefault((operation, record.get('kind')), []).append(record)
+                    self.count += 1
+        self._cycles = {key: itertools.cycle(records) for key, records in grouped.items()}
+
+    def lookup(self, operation: str, kind: Optional[str], model_id: Optional[str], key: str) -> Optional[Dict]:
+        with self._lock:
+            record = self._exact.get((operation, key))
+            for group in ((operation, kind, model_id), (operation, kind)):
+                if record is None and group in self._cycles:
+                    record = next(self._cycles[group])
+            return record
+
+
+def request_kind(request: Dict) -> str:
+    """Coarse kind of a request body: conversation, question, embedding or text"""
+    if 'inputText' in request:
+        return "embedding"
+    prompt = _prompt_text(request)
+    if 'announcer_intro' in prompt:
+        return "conversation"
+    if '"correct_answer"' in prompt:
+        return "question"
+    return "text"
+
+
+def request_key(body: bytes) -> str:
+    return hashlib.sha1(body or b"").hexdigest()
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, payload: Dict, headers: Optional[Dict] = None):
+        self._send(200, json.dumps(payload, ensure_ascii=False).encode('utf-8'), 'application/json', headers)
+
+    def _send_stream(self, operation: str, events: List[tuple], record: Optional[Dict]):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/vnd.amazon.eventstream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        gap = self.server.latency(f"{_SNAKE_NAMES.get(operation, operation)}:chunk", DEFAULT_CHUNK_LATENCY)
+        recorded_gap = record['stream_ms'] / max(1, len(events)) if record and record.get('stream_ms') else None
+        for i, (event_type, payload) in enumerate(events):
+            if i:
+                time.sleep(gap.sample(recorded_gap) / 1000)
+            frame = encode_event(event_type, payload)
+            self.wfile.write(f"{len(frame):x}\r\n".encode('ascii') + frame + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/v1/voices':
+            self.server.wait('describe_voices', None)
+            self._send_json({"Voices": [
+                {"Id": "Takumi", "Gender": "Male", "LanguageCode": "ja-JP", "Name": "Takumi"},
+                {"Id": "Mizuki", "Gender": "Female", "LanguageCode": "ja-JP", "Name": "Mizuki"}
+            ]})
+        else:
+            self._send(404, b'{"message": "not found"}', 'application/json')
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0) or 0))
+        path = urlparse(self.path).path
+        parts = path.strip('/').split('/')
+        server = self.server
+        try:
+            if path == '/v1/speech':
+                self._synthesize_speech(body)
+            elif len(parts) == 3 and parts[0] == 'model' and parts[2] in BEDROCK_ROUTES:
+                self._bedrock(BEDROCK_ROUTES[parts[2]], unquote(parts[1]), body)
+            else:
+                self._send(404, b'{"message": "not found"}', 'application/json')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            server.count('errors')
+            self._send(500, json.dumps({"message": str(e)}).encode('utf-8'), 'application/json',
+                       {'x-amzn-ErrorType': 'InternalServerException'})
+
+    def _maybe_throttle(self, operation: str) -> bool:
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            self.server.count(f"{operation}:throttled")
+            self._send(429, b'{"message": "Too many requests (stand-in)"}', 'application/json',
+                       {'x-amzn-ErrorType': 'ThrottlingException'})
+            return True
+        return False
+
+    def _bedrock(self, operation: str, model_id: str, body: bytes):
+        server = self.server
+        request = json.loads(body or b'{}')
+        record = server.recordings.lookup(operation, request_kind(request), model_id, request_key(body))
+        server.count(f"{operation}:{'replayed' if record else 'synthesized'}")
+        server.wait(operation, record)
+        if self._maybe_throttle(operation):
+            return
+
+        if operation == "Converse":
+            if record:
+                return self._send_json(record['response'])
+            text = server.synthetic.text_for(request)
+            return self._send_json({
+                "output": {"message": {"role": "assistant", "content": [{"text": text}]}},
+                "stopReason": "end_turn",
+                "usage": {"inputTokens": _estimate_tokens(_prompt_text(request)),
+                          "outputTokens": _estimate_tokens(text),
+                          "totalTokens": _estimate_tokens(_prompt_text(request)) + _estimate_tokens(text)},
+                "metrics": {"latencyMs": 0}
+            })
+
+        if operation == "ConverseStream":
+            if record:
+                events = [(next(iter(event)), next(iter(event.values()))) for event in record['events']]
+            else:
+                text = server.synthetic.text_for(request)
+                events = [("messageStart", {"role": "assistant"})]
+                events += [("contentBlockDelta", {"contentBlockIndex": 0, "delta": {"text": text[i:i + 8]}})
+                           for i in range(0, len(text), 8)]
+                events += [
+                    ("contentBlockStop", {"contentBlockIndex": 0}),
+                    ("messageStop", {"stopReason": "end_turn"}),
+                    ("metadata", {"usage": {"inputTokens": _estimate_tokens(_prompt_text(request)),
+                                            "outputTokens": _estimate_tokens(text),
+                                            "totalTokens": _estimate_tokens(_prompt_text(request)) + _estimate_tokens(text)},
+                                  "metrics": {"latencyMs": 0}})
+                ]
+            return self._send_stream(operation, events, record)
+
+        if operation == "InvokeModel":
+            if record:
+                return self._send(200, record['body'].encode('utf-8'), 'application/json', record.get('headers'))
+            if 'inputText' in request:
+                payload = {"embedding": SyntheticResponses.embedding(request['inputText']),
+                           "inputTextTokenCount": _estimate_tokens(request['inputText'])}
+                output_tokens = 0
+            else:
+                text = server.synthetic.text_for(request)
+                payload = {"completion": text, "outputText": text}
+                output_tokens = _estimate_tokens(text)
+            return self._send_json(payload, {
+                'x-amzn-bedrock-input-token-count': _estimate_tokens(_prompt_text(request)),
+                'x-amzn-bedrock-output-token-count': output_tokens
+            })
+
+        # InvokeModelWithResponseStream (messages-v1 style chunks)
+        if record:
+            chunks = record['chunks']
+        else:
+            text = server.synthetic.text_for(request)
+            chunks = [json.dumps({"contentBlockDelta": {"delta": {"text": text[i:i + 8]}, "contentBlockIndex": 0}},
+                                 ensure_ascii=False) for i in range(0, len(text), 8)]
+            chunks.append(json.dumps({"metadata": {"usage": {"inputTokens": _estimate_tokens(_prompt_text(request)),
+                                                             "outputTokens": _estimate_tokens(text)}}}))
+        events = [("chunk", {"bytes": base64.b64encode(chunk.encode('utf-8')).decode('ascii')}) for chunk in chunks]
+        self._send_stream(operation, events, record)
+
+    def _synthesize_speech(self, body: bytes):
+        server = self.server
+        request = json.loads(body or b'{}')
+        record = server.recordings.lookup("SynthesizeSpeech", "speech", request.get('VoiceId'), request_key(body))
+        server.count(f"SynthesizeSpeech:{'replayed' if record else 'synthesized'}")
+        server.wait("SynthesizeSpeech", record)
+        if self._maybe_throttle("SynthesizeSpeech"):
+            return
+        if record:
+            audio = base64.b64decode(record['audio'])
+            content_type = record.get('content_type', 'audio/pcm')
+        else:
+            audio = SyntheticResponses.speech(request.get('Text', ''), int(request.get('SampleRate') or 16000))
+            content_type = 'audio/pcm'
+        self._send(200, audio, content_type, {'x-amzn-RequestCharacters': len(request.get('Text', ''))})
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP stand-in for bedrock-runtime and Polly
+
+    Usable in-process (see benchmarks/load_test.py) or from the command line.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = STANDIN_PORT, recordings_dir: Optional[str] = None,
+                 latency: Optional[Dict[str, LatencyModel]] = None, error_rate: float = 0.0):
+        """
+        Initialize the server (not yet serving)
+
+        Args:
+            host (str): Interface to bind
+            port (int): Port to bind, 0 for any free port
+            recordings_dir (str, optional): Directory written by Recorder
+            latency (Dict[str, LatencyModel], optional): Distribution per botocore operation name
+                (e.g. "converse", "synthesize_speech", "converse_stream:chunk"); unlisted ones answer at once
+            error_rate (float): Share of requests answered with a ThrottlingException
+        """
+        super().__init__((host, port), _StandInHandler)
+        self.recordings = RecordingStore(recordings_dir)
+        self.synthetic = SyntheticResponses()
+        self.latencies = latency or {}
+        self.error_rate = error_rate
+        self._counts: Dict[str, int] = {}
+        self._counts_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def latency(self, operation: str, default: str = "fixed:0") -> LatencyModel:
+        model = self.latencies.get(operation)
+        if model is None:
+            model = self.latencies.setdefault(operation, LatencyModel(default))
+        return model
+
+    def wait(self, operation: str, record: Optional[Dict]):
+        """Sleep for the operation's latency; operation may be an API name or a botocore method name"""
+        name = _SNAKE_NAMES.get(operation, operation)
+        time.sleep(self.latency(name).sample(record.get('latency_ms') if record else None) / 1000)
+
+    def count(self, key: str):
+        with self._counts_lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._counts_lock:
+            return dict(self._counts)
+
+    def start(self) -> 'StandInServer':
+        """Serve in a daemon thread"""
+        self._thread = threading.Thread(target=self.serve_forever, name="aws-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class Recorder:
+    """
+    Appends responses of a live boto3 client to <directory>/<Operation>.jsonl
+
+    Uses the client's before-call/after-call events, so calls are made
+    unchanged. Streaming bodies are read (and replaced with an equivalent
+    in-memory body) or wrapped so each stream is written once consumed.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def attach(self, client):
+        """Register the recording hooks on a boto3 client; returns the client"""
+        service = client.meta.service_model.service_id.hyphenize()
+        client.meta.events.register(f'provide-client-params.{service}', self._remember_ids)
+        client.meta.events.register(f'before-call.{service}', self._before_call)
+        client.meta.events.register(f'after-call.{service}', self._after_call)
+        return client
+
+    def _write(self, operation: str, record: Dict):
+        with self._lock:
+            with open(os.path.join(self.directory, f"{operation}.jsonl"), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def _before_call(self, params, context, **kwargs):
+        body = params.get('body') or b""
+        body = body if isinstance(body, bytes) else str(body).encode('utf-8')
+        context['standin_key'] = request_key(body)
+        try:
+            context['standin_kind'] = request_kind(json.loads(body or b'{}'))
+        except ValueError:
+            context['standin_kind'] = "text"
+        context['standin_start'] = time.perf_counter()
+
+    def _after_call(self, http_response, parsed, model, context, **kwargs):
+        if http_response.status_code >= 300 or 'standin_start' not in context:
+            return
+        operation = model.name
+        start = context['standin_start']
+        record = {
+            "request_key": context['standin_key'],
+            "kind": context.get('standin_kind'),
+            "model_id": context.get('standin_model'),
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1)
+        }
+        headers = http_response.headers
+        if operation == "Converse":
+            record["response"] = {k: v for k, v in parsed.items() if k != 'ResponseMetadata'}
+            self._write(operation, record)
+        elif operation == "InvokeModel":
+            from botocore.response import StreamingBody
+            data = parsed['body'].read()
+            parsed['body'] = StreamingBody(io.BytesIO(data), len(data))
+            record["body"] = data.decode('utf-8')
+            record["headers"] = {k: v for k, v in headers.items() if k.lower().startswith('x-amzn-bedrock')}
+            self._write(operation, record)
+        elif operation in ("ConverseStream", "InvokeModelWithResponseStream"):
+            key = 'stream' if operation == "ConverseStream" else 'body'
+            parsed[key] = self._record_stream(operation, parsed[key], record)
+        elif operation == "SynthesizeSpeech":
+            from botocore.response import StreamingBody
+            data = parsed['AudioStream'].read()
+            parsed['AudioStream'] = StreamingBody(io.BytesIO(data), len(data))
+            record["model_id"] = context.get('standin_voice')
+            record["kind"] = "speech"
+            record["audio"] = base64.b64encode(data).decode('ascii')
+            record["content_type"] = parsed.get('ContentType')
+            self._write(operation, record)
+
+    def _record_stream(self, operation: str, events, record: Dict):
+        start = time.perf_counter()
+        collected = []
+        for event in events:
+            if operation == "ConverseStream":
+                collected.append(event)
+            elif 'chunk' in event:
+                collected.append(event['chunk']['bytes'].decode('utf-8'))
+            yield event
+        record["stream_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        record["events" if operation == "ConverseStream" else "chunks"] = collected
+        self._write(operation, record)
+
+    def _remember_ids(self, params, context, **kwargs):
+        context['standin_model'] = params.get('modelId')
+        context['standin_voice'] = params.get('VoiceId')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded or synthetic Bedrock/Polly responses locally")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=STANDIN_PORT)
+    parser.add_argument("--recordings", help="Directory written with AWS_RECORD_DIR")
+    parser.add_argument("--latency", nargs="*", default=[],
+                        help='Per-operation latency, e.g. converse=lognormal:900:0.4 "converse_stream:chunk=fixed:30"')
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests throttled")
+    args = parser.parse_args()
+
+    server = StandInServer(args.host, args.port, args.recordings, parse_latency_specs(args.latency), args.error_rate)
+    print(f"Serving {server.recordings.count} recorded responses on {server.url}")
+    print(f"  export BEDROCK_ENDPOINT_URL={server.url} POLLY_ENDPOINT_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Shared AWS client factory for Bedrock and Polly.
+
+All Bedrock calls in the app go through one bedrock-runtime client, built
+with a connection pool big enough for the TTS, prefetch and ingestion
+thread pools, adaptive retries (exponential backoff plus client-side rate
+adjustment on throttling) and TCP keep-alive. The client is wrapped in a
+RateLimitedClient, which applies an optional per-model token bucket before
+each call and keeps per-model counts of calls, requests in flight, retries
+and throttling errors. Each call is also recorded as an "llm" span (see
+backend.tracing).
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from backend import tracing
+
+REGION_NAME = "us-east-1"
+# HTTP connections kept per client; boto3's default of 10 is below the app's thread count
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.environ.get('BEDROCK_MAX_POOL_CONNECTIONS', '50'))
+# Attempts per call (first try included) in adaptive retry mode
+BEDROCK_MAX_ATTEMPTS = int(os.environ.get('BEDROCK_MAX_ATTEMPTS', '5'))
+BEDROCK_READ_TIMEOUT = int(os.environ.get('BEDROCK_READ_TIMEOUT', '60'))
+# Requests per second per model, e.g. "amazon.nova-micro-v1:0=10,amazon.titan-embed-text-v2:0=20";
+# models not listed are not limited
+BEDROCK_RATE_LIMITS = os.environ.get('BEDROCK_RATE_LIMITS', '')
+# Endpoint overrides, e.g. a local stand-in for tests and load runs
+BEDROCK_ENDPOINT_URL = os.environ.get('BEDROCK_ENDPOINT_URL') or None
+POLLY_ENDPOINT_URL = os.environ.get('POLLY_ENDPOINT_URL') or None
+# Record every Bedrock/Polly response into this directory for replay by backend.aws_standin
+AWS_RECORD_DIR = os.environ.get('AWS_RECORD_DIR', '')
+
+# Operations that carry a modelId and are rate limited and accounted
+MODEL_OPERATIONS = ("converse", "converse_stream", "invoke_model", "invoke_model_with_response_stream")
+
+
+def client_config() -> Config:
+    """botocore Config shared by all clients"""
+    return Config(
+        region_name=REGION_NAME,
+        max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS,
+        retries={'total_max_attempts': BEDROCK_MAX_ATTEMPTS, 'mode': 'adaptive'},
+        tcp_keepalive=True,
+        read_timeout=BEDROCK_READ_TIMEOUT
+    )
+
+
+def parse_rate_limits(spec: str) -> Dict[str, float]:
+    """Parse "model=rps,model=rps" into a dict, skipping malformed entries"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        model_id, _, rate = item.rpartition('=')
+        try:
+            if model_id and float(rate) > 0:
+                limits[model_id] = float(rate)
+        except ValueError:
+            print(f"Ignoring invalid rate limit: {item}")
+    return limits
+
+
+class TokenBucket:
+    """Blocking token bucket: rate tokens per second, at most burst saved up"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available; returns the time waited in seconds"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class ModelStats:
+    """Per-model call accounting"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.throttled = 0
+        self.retries = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.wait_seconds = 0.0
+        self.latency_seconds = 0.0
+
+    def snapshot(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "rate_limit_wait_ms": round(self.wait_seconds * 1000, 1),
+            "avg_latency_ms": round(self.latency_seconds * 1000 / self.calls, 1) if self.calls else None
+        }
+
+
+class RateLimitedClient:
+    """
+    Wraps a bedrock-runtime client with per-model rate limiting and accounting
+
+    Model operations (see MODEL_OPERATIONS) wait for their model's token
+    bucket, if one is configured, and are counted; every other attribute is
+    passed through to the wrapped client. For streaming operations the
+    latency covers the call up to the first response, not the whole stream.
+    """
+
+    def __init__(self, client, rate_limits: Optional[Dict[str, float]] = None):
+        """
+        Wrap a client
+
+        Args:
+            client: boto3 bedrock-runtime client
+            rate_limits (Dict[str, float], optional): Requests per second by model ID
+        """
+        self.client = client
+        self._buckets = {model_id: TokenBucket(rate) for model_id, rate in (rate_limits or {}).items()}
+        self._stats: Dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if name in MODEL_OPERATIONS:
+            return lambda **kwargs: self._call(name, attribute, kwargs)
+        return attribute
+
+    def _call(self, name: str, operation, kwargs: Dict):
+        model_id = kwargs.get('modelId', 'unknown')
+        bucket = self._buckets.get(model_id)
+        waited = bucket.acquire() if bucket else 0.0
+
+        with self._lock:
+            stats = self._stats.setdefault(model_id, ModelStats())
+            stats.calls += 1
+            stats.in_flight += 1
+            stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+            stats.wait_seconds += waited
+
+        llm_span = tracing.start_span(name, kind="llm", model_id=model_id,
+                                      rate_limit_wait_ms=round(waited * 1000, 1))
+        start = time.perf_counter()
+        try:
+            response = operation(**kwargs)
+        except ClientError as e:
+            code = e.response.get('Error', {}).get('Code')
+            retries = e.response.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+            with self._lock:
+                stats.errors += 1
+                if code in ('ThrottlingException', 'TooManyRequestsException'):
+                    stats.throttled += 1
+                stats.retries += retries
+            tracing.finish_llm_span(llm_span, retries=retries, error=code or str(e))
+            raise
+        except Exception as e:
+            with self._lock:
+                stats.errors += 1
+            tracing.finish_llm_span(llm_span, error=f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            with self._lock:
+                stats.in_flight -= 1
+                stats.latency_seconds += time.perf_counter() - start
+
+        retries = response.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        with self._lock:
+            stats.retries += retries
+
+        # Streams are traced until their last event, which carries the token usage
+        stream_key = {'converse_stream': 'stream', 'invoke_model_with_response_stream': 'body'}.get(name)
+        if stream_key and response.get(stream_key) is not None:
+            if llm_span is not None:
+                llm_span.set(first_response_ms=round((time.perf_counter() - start) * 1000, 1))
+            response[stream_key] = tracing.trace_stream(response[stream_key], llm_span, retries)
+        else:
+            tracing.finish_llm_span(llm_span, retries=retries, **tracing.usage_from_response(response))
+        return response
+
+    def stats(self) -> Dict[str, Dict]:
+        """Call accounting by model ID"""
+        with self._lock:
+            return {model_id: stats.snapshot() for model_id, stats in self._stats.items()}
+
+
+def create_bedrock_client(session: Optional[boto3.session.Session] = None) -> RateLimitedClient:
+    """
+    New bedrock-runtime client with the shared config, wrapped for rate limiting
+
+    Most code should use backend.resources.get_bedrock_client() instead,
+    so the whole process shares one connection pool.
+    """
+    session = session or boto3.session.Session(region_name=REGION_NAME)
+    client = session.client('bedrock-runtime', config=client_config(), endpoint_url=BEDROCK_ENDPOINT_URL)
+    if AWS_RECORD_DIR:
+        from backend.aws_standin import Recorder
+        Recorder(AWS_RECORD_DIR).attach(client)
+    return RateLimitedClient(client, parse_rate_limits(BEDROCK_RATE_LIMITS))
+
+
+def create_polly_client(session: Optional[boto3.session.Session] = None):
+    """New Polly client with the shared config"""
+    session = session or boto3.session.Session(region_name=REGION_NAME)
+    client = session.client('polly', config=client_config(), endpoint_url=POLLY_ENDPOINT_URL)
+    if AWS_RECORD_DIR:
+        from backend.aws_standin import Recorder
+        Recorder(AWS_RECORD_DIR).attach(client)
+    return client
@@ -1,49 +1,215 @@
 # Create BedrockChat
 # bedrock_chat.py
-import boto3
+import hashlib
+import os
+import threading
+from collections import OrderedDict
 import streamlit as st
-from typing import Optional, Dict, Any
+from backend import resources
+from backend.streaming import iter_converse_stream_text
+from typing import Optional, Dict, Any, Iterator, List, Tuple
 
 
 # Model ID
 MODEL_ID = "amazon.nova-micro-v1:0"
 
+# Estimated tokens of earlier turns sent with each message; older turns are summarized or dropped
+CHAT_HISTORY_TOKEN_BUDGET = int(os.environ.get('CHAT_HISTORY_TOKEN_BUDGET', '2000'))
+# Replace dropped turns with a short LLM summary instead of forgetting them
+CHAT_SUMMARIZE = os.environ.get('CHAT_SUMMARIZE', 'true').lower() == 'true'
+# Turns are dropped this many at a time, so the summary only changes once per block
+CHAT_SUMMARY_BLOCK_TURNS = int(os.environ.get('CHAT_SUMMARY_BLOCK_TURNS', '8'))
+# Upper bound on the conversation text sent with one summarization request
+CHAT_SUMMARY_MAX_CHARS = int(os.environ.get('CHAT_SUMMARY_MAX_CHARS', '6000'))
+# Mark the system prompt as a cache point (for models with Bedrock prompt caching)
+CHAT_PROMPT_CACHE = os.environ.get('CHAT_PROMPT_CACHE', 'false').lower() == 'true'
+
+# Identical for every request, so it can be served from the prompt cache
+SYSTEM_PROMPT = (
+    "You are a friendly Japanese language tutor for English speakers preparing for the JLPT. "
+    "Answer questions about Japanese grammar, vocabulary, pronunciation and culture clearly and concisely. "
+    "Give Japanese examples with readings (furigana in parentheses) and English translations."
+)
+
+SUMMARY_PROMPT = (
+    "Summarize the following conversation between a student and a Japanese tutor in at most five short "
+    "bullet points. Keep any Japanese words, grammar points and facts about the student that later "
+    "answers may refer to.\n\n{transcript}"
+)
+
+ROLLING_SUMMARY_PROMPT = (
+    "Here is a summary of a conversation between a student and a Japanese tutor:\n\n{summary}\n\n"
+    "Update it with the following further turns, in at most five short bullet points. Keep any Japanese "
+    "words, grammar points and facts about the student that later answers may refer to.\n\n{transcript}"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: about one token per CJK character and per four other characters"""
+    cjk = sum(1 for ch in text if ord(ch) >= 0x2E80)
+    return cjk + (len(text) - cjk + 3) // 4
 
 
 class BedrockChat:
-    def __init__(self, model_id: str = MODEL_ID):
-        """Initialize Bedrock chat client"""
-        self.bedrock_client = boto3.client('bedrock-runtime', region_name="us-east-1")
+    def __init__(self, model_id: str = MODEL_ID, bedrock_client=None,
+                 history_token_budget: int = CHAT_HISTORY_TOKEN_BUDGET):
+        """Initialize Bedrock chat client
+
+        The chat itself is stateless: callers pass the conversation so far
+        ([{"role": "user"|"assistant", "content": str}, ...]) with each
+        message, so one instance can serve every session. Turns that no
+        longer fit are dropped in blocks and folded into a rolling summary:
+        each summary is cached under the dropped prefix it covers, and the
+        next one only adds the newly dropped block to it.
+        """
+        self.bedrock_client = bedrock_client or resources.get_bedrock_client()
         self.model_id = model_id
+        self.history_token_budget = history_token_budget
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._summary_lock = threading.Lock()
+
+    def _split_history(self, history: List[Dict[str, str]]) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+        """
+        Split history into (dropped, kept)
+
+        The newest turns that fit the token budget are kept. The cut is
+        rounded down to a whole block of CHAT_SUMMARY_BLOCK_TURNS, so the
+        dropped prefix (and its summary) stays the same for several
+        messages; the kept part may exceed the budget by less than a block.
+        """
+        kept_tokens = 0
+        cut = len(history)
+        for i in range(len(history) - 1, -1, -1):
+            kept_tokens += estimate_tokens(history[i]["content"])
+            if kept_tokens > self.history_token_budget:
+                break
+            cut = i
+        cut -= cut % max(1, CHAT_SUMMARY_BLOCK_TURNS)
+        # The kept part has to start with a user turn
+        while cut < len(history) and history[cut]["role"] != "user":
+            cut += 1
+        return history[:cut], history[cut:]
+
+    def _summarize(self, turns: List[Dict[str, str]]) -> Optional[str]:
+        """
+        Rolling summary of dropped turns
+
+        Summaries are cached under a hash of the prefix they cover. The
+        longest cached prefix of turns is extended with only the turns
+        after it, so each request carries one summary plus about one block
+        of turns, capped at CHAT_SUMMARY_MAX_CHARS either way.
+        """
+        hasher = hashlib.sha256()
+        prefix_keys = []
+        for turn in turns:
+            hasher.update(f"{turn['role']}: {turn['content']}\n".encode('utf-8'))
+            prefix_keys.append(hasher.hexdigest())
+        key = prefix_keys[-1]
+
+        with self._summary_lock:
+            if key in self._summaries:
+                self._summaries.move_to_end(key)
+                return self._summaries[key]
+            covered = next((n for n in range(len(turns) - 1, 0, -1) if prefix_keys[n - 1] in self._summaries), 0)
+            previous = self._summaries.get(prefix_keys[covered - 1]) if covered else None
+
+        transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns[covered:])
+        # Keep the most recent part when the new turns are too long
+        transcript = transcript[-CHAT_SUMMARY_MAX_CHARS:]
+        if previous:
+            prompt = ROLLING_SUMMARY_PROMPT.format(summary=previous, transcript=transcript)
+        else:
+            prompt = SUMMARY_PROMPT.format(transcript=transcript)
+
+        try:
+            response = self.bedrock_client.converse(
+                modelId=self.model_id,
+                messages=[{"role": "user", "content": [{"text": prompt}]}],
+                inferenceConfig={"temperature": 0.2, "maxTokens": 300}
+            )
+            summary = response['output']['message']['content'][0]['text']
+        except Exception as e:
+            print(f"Error summarizing chat history: {str(e)}")
+            return previous
 
-    def generate_response(self, message: str, inference_config: Optional[Dict[str, Any]] = None) -> Optional[str]:
-        """Generate a response using Amazon Bedrock"""
+        with self._summary_lock:
+            self._summaries[key] = summary
+            while len(self._summaries) > 256:
+                self._summaries.popitem(last=False)
+        return summary
+
+    def build_request(self, message: str, history: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
+        """
+        Build the system prompt and messages for converse / converse_stream
+
+        The system prompt comes first and never changes (optionally followed
+        by a cache point); a summary of dropped turns, if any, is appended
+        after it so the cacheable prefix stays identical. Consecutive turns
+        of the same role (e.g. a user message whose answer failed) are merged,
+        since Bedrock requires alternating roles.
+        """
+        dropped, kept = self._split_history(history or [])
+
+        system = [{"text": SYSTEM_PROMPT}]
+        if CHAT_PROMPT_CACHE:
+            system.append({"cachePoint": {"type": "default"}})
+        if dropped and CHAT_SUMMARIZE:
+            summary = self._summarize(dropped)
+            if summary:
+                system.append({"text": f"Summary of the earlier conversation:\n{summary}"})
+
+        messages: List[Dict[str, Any]] = []
+        for turn in kept + [{"role": "user", "content": message}]:
+            if messages and messages[-1]["role"] == turn["role"]:
+                messages[-1]["content"][0]["text"] += "\n\n" + turn["content"]
+            else:
+                messages.append({"role": turn["role"], "content": [{"text": turn["content"]}]})
+        return {"system": system, "messages": messages}
+
+    def generate_response(self, message: str, inference_config: Optional[Dict[str, Any]] = None,
+                          history: Optional[List[Dict[str, str]]] = None) -> Optional[str]:
+        """Generate a response using Amazon Bedrock, in the context of the conversation so far"""
         if inference_config is None:
             inference_config = {"temperature": 0.7}
 
-        messages = [{
-            "role": "user",
-            "content": [{"text": message}]
-        }]
-
         try:
             response = self.bedrock_client.converse(
                 modelId=self.model_id,
-                messages=messages,
-                inferenceConfig=inference_config
+                inferenceConfig=inference_config,
+                **self.build_request(message, history)
             )
             return response['output']['message']['content'][0]['text']
-            
+
         except Exception as e:
             st.error(f"Error generating response: {str(e)}")
             return None
 
+    def generate_response_stream(self, message: str, inference_config: Optional[Dict[str, Any]] = None,
+                                 history: Optional[List[Dict[str, str]]] = None) -> Iterator[str]:
+        """Like generate_response, yielding text chunks as the model streams them"""
+        if inference_config is None:
+            inference_config = {"temperature": 0.7}
+
+        try:
+            response = self.bedrock_client.converse_stream(
+                modelId=self.model_id,
+                inferenceConfig=inference_config,
+                **self.build_request(message, history)
+            )
+            yield from iter_converse_stream_text(response)
+
+        except Exception as e:
+            st.error(f"Error generating response: {str(e)}")
+
 
 if __name__ == "__main__":
     chat = BedrockChat()
+    history = []
     while True:
         user_input = input("You: ")
         if user_input.lower() == '/exit':
             break
-        response = chat.generate_response(user_input)
+        response = chat.generate_response(user_input, history=history)
         print("Bot:", response)
+        if response:
+            history += [{"role": "user", "content": user_input}, {"role": "assistant", "content": response}]
@@ -1,18 +1,86 @@
+import argparse
+import json
 import os
-from youtube_transcript_api import YouTubeTranscriptApi
+import re
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from typing import Optional, List, Dict
 
+# Concurrent transcript downloads in batch/playlist mode
+TRANSCRIPT_FETCH_WORKERS = int(os.environ.get('TRANSCRIPT_FETCH_WORKERS', '4'))
+
+class TranscriptFetcher:
+    """Source of timed transcript segments ({"text", "start", "duration"} dicts)"""
+
+    def fetch(self, video_id: str, languages: List[str]) -> List[Dict]:
+        raise NotImplementedError
+
+    def list_playlist(self, playlist_id: str) -> List[str]:
+        """Video ids of a playlist, in playlist order"""
+        raise NotImplementedError
+
+class YouTubeTranscriptFetcher(TranscriptFetcher):
+    """Fetches transcripts from YouTube with youtube_transcript_api"""
+
+    def fetch(self, video_id: str, languages: List[str]) -> List[Dict]:
+        from youtube_transcript_api import YouTubeTranscriptApi
+        return YouTubeTranscriptApi.get_transcript(video_id, languages=languages)
+
+    def list_playlist(self, playlist_id: str) -> List[str]:
+        url = f"https://www.youtube.com/playlist?list={urllib.parse.quote(playlist_id)}"
+        request = urllib.request.Request(url, headers={'Accept-Language': 'en-US,en;q=0.9'})
+        with urllib.request.urlopen(request, timeout=30) as response:
+            html = response.read().decode('utf-8', errors='replace')
+        # Video ids appear in the embedded initial data; keep first occurrences in order
+        return list(dict.fromkeys(re.findall(r'"videoId":"([A-Za-z0-9_-]{11})"', html)))
+
+class HTTPTranscriptFetcher(TranscriptFetcher):
+    """
+    Fetches transcripts from a plain HTTP service, e.g. a local fixture server
+
+    Expects GET {base_url}/transcripts/{video_id}?languages=ja,en to return the
+    segment list as JSON (404 when there is none) and
+    GET {base_url}/playlists/{playlist_id} to return a list of video ids.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _get_json(self, path: str):
+        with urllib.request.urlopen(f"{self.base_url}{path}", timeout=self.timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def fetch(self, video_id: str, languages: List[str]) -> List[Dict]:
+        query = urllib.parse.urlencode({'languages': ','.join(languages)})
+        return self._get_json(f"/transcripts/{urllib.parse.quote(video_id)}?{query}")
+
+    def list_playlist(self, playlist_id: str) -> List[str]:
+        return self._get_json(f"/playlists/{urllib.parse.quote(playlist_id)}")
+
 class YouTubeTranscriptDownloader:
-    def __init__(self, languages: List[str] = ["ja", "en"]):
+    def __init__(self, languages: List[str] = ["ja", "en"], fetcher: Optional[TranscriptFetcher] = None,
+                 directory: Optional[str] = None):
+        """
+        Args:
+            languages (List[str]): Transcript languages in order of preference
+            fetcher (TranscriptFetcher, optional): Transcript source, YouTube by default
+            directory (str, optional): Where transcripts are saved and looked up as a cache
+        """
         self.languages = languages
-        
+        self.fetcher = fetcher or YouTubeTranscriptFetcher()
+        # Use absolute path based on the location of this script
+        self.directory = directory or os.path.join(os.path.dirname(os.path.abspath(__file__)), "transcripts")
+
     def extract_video_id(self, url: str) -> Optional[str]:
         """
         Extract video ID from YouTube URL
-       
+
         Args:
             url (str): YouTube URL
-           
+
         Returns:
             Optional[str]: Video ID if found, None otherwise
         """
@@ -21,89 +89,181 @@ class YouTubeTranscriptDownloader:
         elif "youtu.be/" in url:
             return url.split("youtu.be/")[1][:11]
         return None
-        
-    def get_transcript(self, video_id: str) -> Optional[List[Dict]]:
+
+    def extract_playlist_id(self, url: str) -> Optional[str]:
+        """
+        Extract playlist ID from a YouTube URL
+
+        Args:
+            url (str): YouTube URL with a list= parameter
+
+        Returns:
+            Optional[str]: Playlist ID if found, None otherwise
+        """
+        playlist_ids = urllib.parse.parse_qs(urllib.parse.urlparse(url).query).get('list')
+        return playlist_ids[0] if playlist_ids else None
+
+    def _paths(self, video_id: str) -> Dict[str, str]:
+        base_path = os.path.join(self.directory, video_id)
+        return {"text": f"{base_path}.txt", "segments": f"{base_path}.jsonl", "meta": f"{base_path}.meta.json"}
+
+    def load_cached_transcript(self, video_id: str) -> Optional[List[Dict]]:
+        """
+        Load a previously saved transcript for the current languages
+
+        Returns:
+            Optional[List[Dict]]: Timed segments, or None if not cached
+        """
+        paths = self._paths(video_id)
+        try:
+            with open(paths["meta"], 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get("languages") != self.languages:
+                return None
+            with open(paths["segments"], 'r', encoding='utf-8') as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def get_transcript(self, video_id: str, use_cache: bool = True) -> Optional[List[Dict]]:
         """
         Download YouTube Transcript
-       
+
         Args:
             video_id (str): YouTube video ID or URL
-           
+            use_cache (bool): Return the saved transcript instead of downloading when available
+
         Returns:
             Optional[List[Dict]]: Transcript if successful, None otherwise
         """
         # Extract video ID if full URL is provided
         if "youtube.com" in video_id or "youtu.be" in video_id:
             video_id = self.extract_video_id(video_id)
-           
+
         if not video_id:
             print("Invalid video ID or URL")
             return None
+
+        if use_cache:
+            transcript = self.load_cached_transcript(video_id)
+            if transcript is not None:
+                print(f"Using cached transcript for video ID: {video_id}")
+                return transcript
         print(f"Downloading transcript for video ID: {video_id}")
-       
+
         try:
-            return YouTubeTranscriptApi.get_transcript(video_id, languages=self.languages)
+            return self.fetcher.fetch(video_id, self.languages)
         except Exception as e:
             print(f"An error occurred: {str(e)}")
             return None
-    
-    def get_versioned_filename(self, base_path: str) -> str:
-        """
-        Get a versioned filename if the file already exists
-        
-        Args:
-            base_path (str): Base file path without extension
-            
-        Returns:
-            str: Versioned file path
-        """
-        if not os.path.exists(f"{base_path}.txt"):
-            return f"{base_path}.txt"
-            
-        version = 1
-        while os.path.exists(f"{base_path} ({version}).txt"):
-            version += 1
-            
-        return f"{base_path} ({version}).txt"
-            
+
     def save_transcript(self, transcript: List[Dict], filename: str) -> bool:
         """
-        Save transcript to file with versioning
-       
+        Save transcript to {filename}.txt, with timed segments in {filename}.jsonl
+
+        Saving the same video again overwrites its files, and the saved
+        segments serve as the cache for later get_transcript calls.
+
         Args:
             transcript (List[Dict]): Transcript data
-            filename (str): Output filename (without extension)
-           
+            filename (str): Output filename (without extension), normally the video ID
+
         Returns:
             bool: True if successful, False otherwise
         """
-        # Use absolute path based on the location of this script
-        directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "transcripts")
-        print(f"Using absolute directory path: {directory}")
-        
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-            print(f"Created directory: {directory}")
-       
-        # Create base path without extension
-        base_path = os.path.join(directory, filename)
-        
-        # Get versioned filename
-        versioned_filename = self.get_versioned_filename(base_path)
-        print(f"Saving transcript to {versioned_filename}")
-       
+        os.makedirs(self.directory, exist_ok=True)
+        paths = self._paths(filename)
+        print(f"Saving transcript to {paths['text']}")
+
         try:
-            with open(versioned_filename, 'w', encoding='utf-8') as f:
-                print("Opened file for writing")
-                for entry in transcript:
-                    f.write(f"{entry['text']}\n")
-                print("Finished writing to file")
-            print(f"Transcript saved successfully to {versioned_filename}")
+            contents = {
+                "text": "".join(f"{entry['text']}\n" for entry in transcript),
+                "segments": "".join(f"{json.dumps(entry, ensure_ascii=False)}\n" for entry in transcript),
+                # Written last: a transcript only counts as cached once its meta file exists
+                "meta": json.dumps({
+                    "video_id": filename,
+                    "languages": self.languages,
+                    "segments": len(transcript),
+                    "saved_at": datetime.now().isoformat()
+                }, ensure_ascii=False)
+            }
+            for kind, content in contents.items():
+                temp_path = f"{paths[kind]}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                os.replace(temp_path, paths[kind])
+            print(f"Transcript saved successfully to {paths['text']}")
             return True
         except Exception as e:
             print(f"Error saving transcript: {str(e)}")
             return False
 
+    def download_and_save(self, video_id: str) -> bool:
+        """Get a transcript (from the cache when possible) and save it"""
+        video_id = self.extract_video_id(video_id) or video_id
+        if self.load_cached_transcript(video_id) is not None:
+            print(f"Transcript for {video_id} already downloaded")
+            return True
+        transcript = self.get_transcript(video_id, use_cache=False)
+        return bool(transcript) and self.save_transcript(transcript, video_id)
+
+    def download_many(self, videos: List[str], max_workers: int = TRANSCRIPT_FETCH_WORKERS) -> Dict[str, bool]:
+        """
+        Download and save transcripts for many videos, at most max_workers at a time
+
+        Args:
+            videos (List[str]): Video IDs or URLs
+
+        Returns:
+            Dict[str, bool]: Success per video ID
+        """
+        video_ids = list(dict.fromkeys(self.extract_video_id(video) or video for video in videos))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="transcripts") as executor:
+            results = executor.map(self.download_and_save, video_ids)
+            return dict(zip(video_ids, results))
+
+    def download_playlist(self, playlist: str, max_workers: int = TRANSCRIPT_FETCH_WORKERS) -> Dict[str, bool]:
+        """
+        Download and save transcripts for every video of a playlist
+
+        Args:
+            playlist (str): Playlist ID or a URL with a list= parameter
+        """
+        playlist_id = self.extract_playlist_id(playlist) or playlist
+        try:
+            video_ids = self.fetcher.list_playlist(playlist_id)
+        except Exception as e:
+            print(f"Error listing playlist {playlist_id}: {str(e)}")
+            return {}
+        print(f"Found {len(video_ids)} videos in playlist {playlist_id}")
+        return self.download_many(video_ids, max_workers=max_workers)
+
+def main():
+    parser = argparse.ArgumentParser(description="Download YouTube transcripts")
+    parser.add_argument("videos", nargs="*", help="Video IDs or URLs")
+    parser.add_argument("--playlist", help="Playlist ID or URL to download completely")
+    parser.add_argument("--languages", default="ja,en", help="Comma-separated language preference")
+    parser.add_argument("--workers", type=int, default=TRANSCRIPT_FETCH_WORKERS, help="Concurrent downloads")
+    parser.add_argument("--fetcher-url", help="Fetch from an HTTP transcript service instead of YouTube")
+    parser.add_argument("--print", dest="print_transcript", action="store_true", help="Print single transcripts")
+    args = parser.parse_args()
+
+    fetcher = HTTPTranscriptFetcher(args.fetcher_url) if args.fetcher_url else None
+    downloader = YouTubeTranscriptDownloader(languages=args.languages.split(','), fetcher=fetcher)
+
+    if args.playlist:
+        results = downloader.download_playlist(args.playlist, max_workers=args.workers)
+    elif len(args.videos) == 1 and args.print_transcript:
+        video_id = downloader.extract_video_id(args.videos[0]) or args.videos[0]
+        transcript = downloader.get_transcript(video_id)
+        if transcript:
+            for entry in transcript:
+                print(entry['text'])
+        results = {video_id: bool(transcript) and downloader.save_transcript(transcript, video_id)}
+    else:
+        results = downloader.download_many(args.videos, max_workers=args.workers)
+
+    print(f"Saved {sum(results.values())} of {len(results)} transcripts")
+
 if __name__ == "__main__":
-    video_url = "https://www.youtube.com/watch?v=sY7L5cfCWno&list=PLkGU7DnOLgRMl-h4NxxrGbK-UdZHIXzKQ"
-    main(video_url, print_transcript=True)
\ No newline at end of file
+    main()
@@ -0,0 +1,235 @@
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# "hybrid" (BM25 + vectors) or "vector" (embedding similarity only)
+RETRIEVAL_MODE = os.environ.get('RETRIEVAL_MODE', 'hybrid')
+# Reciprocal-rank fusion constant; 60 is the usual choice
+RRF_K = 60
+
+# Japanese keywords for the topics offered in the UI, so lexical search can match them
+TOPIC_KEYWORDS = {
+    "Daily Conversation": "友達 週末 天気 家族 趣味 昨日 明日 一緒",
+    "Shopping": "買い物 店 値段 円 買う 売り場 セール サイズ",
+    "Restaurant": "レストラン 料理 注文 食べる 飲み物 メニュー 予約 席",
+    "School Life": "学校 先生 学生 授業 宿題 試験 教室 レポート",
+    "Work Situation": "会社 仕事 会議 部長 資料 出張 課長 締め切り",
+    "Public Announcement": "お知らせ 皆様 放送 案内 ご注意 ください",
+    "Train Station": "駅 電車 ホーム 番線 乗り換え 切符 発車 遅れ",
+    "Hospital": "病院 医者 薬 診察 受付 熱 痛い 予約",
+    "Office": "事務所 会議室 コピー 書類 パソコン 机 社員",
+    "Event Information": "イベント 会場 開始 参加 チケット 入口 受付 時間"
+}
+
+_STRIP = re.compile(r'[\s\W_]+', re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Character bigrams of width-normalized text without spaces or punctuation
+
+    Bigrams need no Japanese word segmenter and still match inflected or
+    partially overlapping words; single-character texts yield one unigram.
+    """
+    normalized = _STRIP.sub('', unicodedata.normalize('NFKC', text or '').lower())
+    if len(normalized) < 2:
+        return [normalized] if normalized else []
+    return [normalized[i:i + 2] for i in range(len(normalized) - 1)]
+
+
+def question_text(question: Dict) -> str:
+    return " ".join(str(question.get(field, '')) for field in ('introduction', 'conversation', 'question'))
+
+
+class BM25Index:
+    """
+    Okapi BM25 over pre-tokenized documents
+
+    Documents can be added (or replaced) after construction; IDF and the
+    average length are derived from the postings at query time, so an
+    update only touches the document's own tokens.
+    """
+
+    def __init__(self, documents: List[Tuple[str, List[str]]] = (), k1: float = 1.5, b: float = 0.75):
+        """
+        Build the index
+
+        Args:
+            documents (List[Tuple[str, List[str]]]): (id, tokens) pairs
+            k1 (float): Term frequency saturation
+            b (float): Length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self.lengths: Dict[str, int] = {}
+        self.total_length = 0
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._terms: Dict[str, List[str]] = {}
+        self.add(documents)
+
+    @property
+    def avg_length(self) -> float:
+        return self.total_length / len(self.lengths) if self.lengths else 0.0
+
+    def idf(self, token: str) -> Optional[float]:
+        docs = self.postings.get(token)
+        if not docs:
+            return None
+        n = len(self.lengths)
+        return math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+
+    def remove(self, doc_id: str):
+        for token in self._terms.pop(doc_id, []):
+            docs = self.postings[token]
+            docs.pop(doc_id, None)
+            if not docs:
+                del self.postings[token]
+        self.total_length -= self.lengths.pop(doc_id, 0)
+
+    def add(self, documents: List[Tuple[str, List[str]]]):
+        """Index documents, replacing any already indexed under the same id"""
+        for doc_id, tokens in documents:
+            if doc_id in self.lengths:
+                self.remove(doc_id)
+            counts = Counter(tokens)
+            for token, count in counts.items():
+                self.postings[token][doc_id] = count
+            self._terms[doc_id] = list(counts)
+            self.lengths[doc_id] = len(tokens)
+            self.total_length += len(tokens)
+
+    def search(self, tokens: List[str], n_results: int, allowed: Optional[set] = None) -> List[Tuple[str, float]]:
+        """Top documents for the query tokens, optionally restricted to allowed ids"""
+        scores: Dict[str, float] = defaultdict(float)
+        avg_length = self.avg_length or 1
+        for token, query_count in Counter(tokens).items():
+            idf = self.idf(token)
+            if idf is None:
+                continue
+            for doc_id, count in self.postings[token].items():
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / avg_length)
+                scores[doc_id] += query_count * idf * count * (self.k1 + 1) / (count + norm)
+        return sorted(scores.items(), key=lambda item: -item[1])[:n_results]
+
+
+class HybridRetriever:
+    """
+    Lexical + semantic retrieval over the question vector store.
+
+    A BM25 index over character bigrams of each stored question's
+    introduction, conversation and question sits next to the vector index.
+    Both rankings are merged with reciprocal-rank fusion, so a question that
+    shares the topic's Japanese vocabulary ranks well even when the English
+    embedding query is vague. The lexical index is built on first use and
+    then kept up to date with only the questions written since (see
+    JLPTQuestionVectorStore.writes_since); it is rebuilt from scratch only
+    when those writes are no longer known.
+    """
+
+    def __init__(self, vector_store, rrf_k: int = RRF_K):
+        """
+        Initialize the retriever
+
+        Args:
+            vector_store (JLPTQuestionVectorStore): Store providing questions and vector search
+            rrf_k (int): Reciprocal-rank fusion constant
+        """
+        self.vector_store = vector_store
+        self.rrf_k = rrf_k
+        self._lock = threading.Lock()
+        self._index: Optional[BM25Index] = None
+        self._entries: Dict[str, Dict] = {}
+        self._version = None
+
+    def _ensure_index(self):
+        version = getattr(self.vector_store, 'version', None)
+        if self._index is not None and version == self._version:
+            return
+        with self._lock:
+            if self._index is not None and version == self._version:
+                return
+            writes = None
+            if self._index is not None and hasattr(self.vector_store, 'writes_since'):
+                writes = self.vector_store.writes_since(self._version)
+
+            if writes is None:
+                entries = {entry['id']: entry for entry in self.vector_store.get_all_questions()}
+                self._index = BM25Index([(entry_id, tokenize(question_text(entry['metadata'])))
+                                         for entry_id, entry in entries.items()])
+                self._entries = entries
+            else:
+                self._index.add([(entry['id'], tokenize(question_text(entry['metadata']))) for entry in writes])
+                self._entries.update((entry['id'], entry) for entry in writes)
+            self._version = version
+
+    def _allowed(self, section: Optional[int], topic: Optional[str]) -> Optional[set]:
+        """Ids passing the section filter and not tagged with a different topic"""
+        if section is None and topic is None:
+            return None
+        return {
+            entry_id for entry_id, entry in self._entries.items()
+            if (section is None or entry['section'] == section)
+            and (topic is None or entry['metadata'].get('topic') in (None, topic))
+        }
+
+    def lexical_search(self, query_text: str, section: Optional[int] = None, topic: Optional[str] = None,
+                       n_results: int = 20) -> List[Tuple[str, float]]:
+        """BM25 ranking for the query plus the topic's Japanese keywords"""
+        self._ensure_index()
+        query = f"{query_text} {TOPIC_KEYWORDS.get(topic, '')}"
+        return self._index.search(tokenize(query), n_results, self._allowed(section, topic))
+
+    def vector_search(self, query_text: str, section: Optional[int] = None, topic: Optional[str] = None,
+                      n_results: int = 20) -> List[Dict]:
+        """Embedding similarity results, with the topic filter applied"""
+        try:
+            results = self.vector_store.query_similar_questions(query_text, section=section, n_results=n_results)
+        except Exception as e:
+            print(f"Error in vector search: {str(e)}")
+            return []
+        return [r for r in results if topic is None or r['metadata'].get('topic') in (None, topic)]
+
+    def retrieve(self, query_text: str, section: Optional[int] = None, topic: Optional[str] = None,
+                 n_results: int = 5, candidates: int = 20) -> List[Dict]:
+        """
+        Retrieve questions by reciprocal-rank fusion of BM25 and vector rankings
+
+        Args:
+            query_text (str): Free-text query (any language)
+            section (int, optional): Only questions from this section
+            topic (str, optional): Adds the topic's keywords and drops questions tagged with another topic
+            n_results (int): Number of questions to return
+            candidates (int): Depth of each ranking before fusion
+
+        Returns:
+            List[Dict]: Same shape as query_similar_questions, plus an "rrf_score"
+        """
+        lexical = self.lexical_search(query_text, section, topic, candidates)
+        vector = self.vector_search(query_text, section, topic, candidates)
+
+        fused: Dict[str, float] = defaultdict(float)
+        for rank, (entry_id, _) in enumerate(lexical, start=1):
+            fused[entry_id] += 1.0 / (self.rrf_k + rank)
+        vector_by_id = {}
+        for rank, result in enumerate(vector, start=1):
+            fused[result['id']] += 1.0 / (self.rrf_k + rank)
+            vector_by_id[result['id']] = result
+
+        results = []
+        for entry_id, score in sorted(fused.items(), key=lambda item: -item[1])[:n_results]:
+            entry = self._entries.get(entry_id)
+            vector_result = vector_by_id.get(entry_id)
+            results.append({
+                'id': entry_id,
+                'metadata': vector_result['metadata'] if vector_result else entry['metadata'],
+                'distance': vector_result['distance'] if vector_result else None,
+                'section': vector_result['section'] if vector_result else entry['section'],
+                'rrf_score': score
+            })
+        return results
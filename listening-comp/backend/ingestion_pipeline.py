@@ -0,0 +1,375 @@
+"""
+Streaming ingestion from YouTube videos to the question vector store.
+
+Each video flows through five stages connected by bounded queues:
+
+    fetch transcript -> extract sections -> parse questions -> embed -> upsert
+
+Every stage runs on its own worker threads, so while one video is being
+extracted by the LLM the next is already downloading and the previous one is
+being embedded. Bounded queues keep memory flat for hundreds of videos: a
+slow stage makes the ones before it wait instead of piling up work.
+
+Progress is checkpointed per video. Extracted sections are saved as soon as
+they exist (the expensive part), and a video is marked done once its
+questions are upserted, so an interrupted run resumes where it stopped.
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+from backend.get_transcript import YouTubeTranscriptDownloader
+from backend.question_history import question_hash
+from backend.transcript_chunker import chunk_entries, extract_chunk, merge_questions
+
+# Items buffered between two stages
+INGEST_QUEUE_SIZE = int(os.environ.get('INGEST_QUEUE_SIZE', '4'))
+# Concurrent embedding requests per batch
+INGEST_EMBED_WORKERS = int(os.environ.get('INGEST_EMBED_WORKERS', '8'))
+
+_DONE = object()
+
+
+class StageMetrics:
+    """Throughput and latency counters for one pipeline stage"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.items = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def record(self, seconds: float, error: bool = False):
+        with self._lock:
+            self.items += 1
+            self.errors += int(error)
+            self.busy_seconds += seconds
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            end = self.finished_at or time.perf_counter()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            return {
+                "stage": self.name,
+                "items": self.items,
+                "errors": self.errors,
+                "items_per_minute": self.items / elapsed * 60 if elapsed else 0.0,
+                "avg_latency_s": self.busy_seconds / self.items if self.items else 0.0,
+                "busy_seconds": round(self.busy_seconds, 2)
+            }
+
+
+class IngestionPipeline:
+    def __init__(self, downloader: Optional[YouTubeTranscriptDownloader] = None, vector_store=None,
+                 bedrock_client=None, checkpoint_dir: Optional[str] = None, queue_size: int = INGEST_QUEUE_SIZE,
+                 fetch_workers: int = 2, extract_workers: int = 3, embed_workers: int = INGEST_EMBED_WORKERS):
+        """
+        Initialize the pipeline
+
+        Args:
+            downloader (YouTubeTranscriptDownloader, optional): Transcript source (and cache)
+            vector_store (JLPTQuestionVectorStore, optional): Defaults to the shared store
+            bedrock_client (optional): Client used for extraction, defaults to the shared client
+            checkpoint_dir (str, optional): Per-video progress files
+            queue_size (int): Maximum items waiting between two stages
+            fetch_workers (int): Concurrent transcript downloads
+            extract_workers (int): Concurrent LLM extraction requests (chunks of all videos share them)
+            embed_workers (int): Concurrent embedding requests
+        """
+        if vector_store is None or bedrock_client is None:
+            from backend import resources
+            vector_store = vector_store or resources.get_vector_store()
+            bedrock_client = bedrock_client or resources.get_bedrock_client()
+
+        self.downloader = downloader or YouTubeTranscriptDownloader()
+        self.vector_store = vector_store
+        self.bedrock_client = bedrock_client
+        self.queue_size = queue_size
+        self.fetch_workers = fetch_workers
+        self.extract_workers = extract_workers
+        self.embed_workers = embed_workers
+
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        self.checkpoint_dir = checkpoint_dir or os.path.join(current_dir, 'data', 'ingestion')
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+
+        self.metrics = {name: StageMetrics(name) for name in ('fetch', 'extract', 'parse', 'embed', 'upsert')}
+        self._chunk_executor = ThreadPoolExecutor(max_workers=extract_workers, thread_name_prefix="ingest-llm")
+        self._embed_executor = ThreadPoolExecutor(max_workers=embed_workers, thread_name_prefix="ingest-embed")
+
+    # Checkpoints
+
+    def _checkpoint_path(self, video_id: str, kind: str) -> str:
+        return os.path.join(self.checkpoint_dir, f"{video_id}.{kind}.json")
+
+    def _read_checkpoint(self, video_id: str, kind: str) -> Optional[Dict]:
+        try:
+            with open(self._checkpoint_path(video_id, kind), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _write_checkpoint(self, video_id: str, kind: str, data: Dict):
+        path = self._checkpoint_path(video_id, kind)
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(f"{path}.tmp", path)
+
+    def is_done(self, video_id: str) -> bool:
+        checkpoint = self._read_checkpoint(video_id, 'status')
+        return bool(checkpoint and checkpoint.get('status') == 'done')
+
+    # Stages; each takes a work item and returns it (or None to drop it)
+
+    def fetch(self, item: Dict) -> Optional[Dict]:
+        if self._read_checkpoint(item['video_id'], 'sections'):
+            # Already extracted in an earlier run; no need for the transcript
+            return item
+        transcript = self.downloader.get_transcript(item['video_id'])
+        if not transcript:
+            raise RuntimeError("No transcript available")
+        self.downloader.save_transcript(transcript, item['video_id'])
+        item['entries'] = transcript
+        return item
+
+    def extract(self, item: Dict) -> Optional[Dict]:
+        checkpoint = self._read_checkpoint(item['video_id'], 'sections')
+        if checkpoint:
+            item['sections'] = {int(section): questions for section, questions in checkpoint['sections'].items()}
+            return item
+
+        chunks = chunk_entries(item.pop('entries'))
+        futures = [
+            self._chunk_executor.submit(extract_chunk, chunk, None, self.bedrock_client)
+            for chunk in chunks
+        ]
+        item['sections'] = merge_questions([future.result() for future in futures])
+        self._write_checkpoint(item['video_id'], 'sections', {
+            "video_id": item['video_id'],
+            "chunks": len(chunks),
+            "sections": item['sections'],
+            "extracted_at": datetime.now().isoformat()
+        })
+        return item
+
+    def parse(self, item: Dict) -> Optional[Dict]:
+        questions = []
+        seen = set()
+        for section, section_questions in item.pop('sections').items():
+            for question in section_questions:
+                question = {
+                    field: str(question.get(field) or '').strip()
+                    for field in ('introduction', 'conversation', 'question')
+                }
+                if not question['conversation'] or not question['question']:
+                    continue
+                # Content-derived ids make re-ingesting a video idempotent
+                content_hash = question_hash(question)
+                if content_hash in seen:
+                    continue
+                seen.add(content_hash)
+                questions.append({"section": section, "id": f"section{section}_{content_hash[:16]}",
+                                  "question": question})
+        item['questions'] = questions
+        return item
+
+    def embed(self, item: Dict) -> Optional[Dict]:
+        texts = [self.vector_store.embedding_text(entry['question']) for entry in item['questions']]
+        embeddings = list(self._embed_executor.map(self.vector_store._generate_embedding, texts))
+        for entry, embedding in zip(item['questions'], embeddings):
+            if not embedding:
+                raise RuntimeError("Empty embedding returned")
+            entry['embedding'] = embedding
+        return item
+
+    def upsert(self, item: Dict) -> Optional[Dict]:
+        for section in (1, 2, 3):
+            entries = [entry for entry in item['questions'] if entry['section'] == section]
+            if entries:
+                self.vector_store.store_questions(
+                    [entry['question'] for entry in entries],
+                    section,
+                    ids=[entry['id'] for entry in entries],
+                    embeddings=[entry['embedding'] for entry in entries]
+                )
+        self._write_checkpoint(item['video_id'], 'status', {
+            "video_id": item['video_id'],
+            "status": "done",
+            "questions": len(item['questions']),
+            "completed_at": datetime.now().isoformat()
+        })
+        return item
+
+    # Orchestration
+
+    def _run_stage(self, name: str, fn: Callable[[Dict], Optional[Dict]], inbox: queue.Queue,
+                   outbox: Optional[queue.Queue], workers: int, on_error: Callable[[Dict, str], None]):
+        """Start worker threads that move items from inbox through fn to outbox"""
+        metrics = self.metrics[name]
+        remaining = [workers]
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                item = inbox.get()
+                if item is _DONE:
+                    # Pass the end marker on once every worker of this stage has stopped
+                    inbox.put(_DONE)
+                    with lock:
+                        remaining[0] -= 1
+                        last = remaining[0] == 0
+                    if last:
+                        metrics.finished_at = time.perf_counter()
+                        if outbox is not None:
+                            outbox.put(_DONE)
+                    return
+
+                if metrics.started_at is None:
+                    metrics.started_at = time.perf_counter()
+                start = time.perf_counter()
+                try:
+                    result = fn(item)
+                    metrics.record(time.perf_counter() - start)
+                except Exception as e:
+                    metrics.record(time.perf_counter() - start, error=True)
+                    on_error(item, f"{name}: {str(e)}")
+                    continue
+                if result is not None and outbox is not None:
+                    outbox.put(result)
+
+        threads = [
+            threading.Thread(target=worker, name=f"ingest-{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def run(self, video_ids: Iterable[str], force: bool = False) -> Dict:
+        """
+        Ingest videos and block until all of them are done or failed
+
+        Args:
+            video_ids (Iterable[str]): Video IDs or URLs
+            force (bool): Re-ingest videos already marked done
+
+        Returns:
+            Dict: Counts per outcome and per-stage metrics
+        """
+        summary = {"ingested": 0, "skipped": 0, "failed": 0, "questions": 0, "errors": {}}
+        summary_lock = threading.Lock()
+
+        def on_error(item: Dict, error: str):
+            print(f"{item['video_id']}: failed in {error}")
+            with summary_lock:
+                summary["failed"] += 1
+                summary["errors"][item['video_id']] = error
+            self._write_checkpoint(item['video_id'], 'status', {
+                "video_id": item['video_id'], "status": "failed", "error": error,
+                "completed_at": datetime.now().isoformat()
+            })
+
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(5)]
+        done_queue = queue.Queue()
+        stages = [
+            ('fetch', self.fetch, self.fetch_workers),
+            ('extract', self.extract, self.extract_workers),
+            ('parse', self.parse, 1),
+            ('embed', self.embed, 1),
+            ('upsert', self.upsert, 1)
+        ]
+        threads = []
+        for i, (name, fn, workers) in enumerate(stages):
+            outbox = queues[i + 1] if i + 1 < len(stages) else done_queue
+            threads += self._run_stage(name, fn, queues[i], outbox, workers, on_error)
+
+        start = time.perf_counter()
+        # Feed the first queue; put() blocks while the pipeline is saturated
+        for video in video_ids:
+            video_id = self.downloader.extract_video_id(video) or video
+            if not force and self.is_done(video_id):
+                summary["skipped"] += 1
+                continue
+            queues[0].put({"video_id": video_id})
+        queues[0].put(_DONE)
+
+        while True:
+            item = done_queue.get()
+            if item is _DONE:
+                break
+            summary["ingested"] += 1
+            summary["questions"] += len(item['questions'])
+            print(f"{item['video_id']}: {len(item['questions'])} questions ingested")
+
+        for thread in threads:
+            thread.join()
+        summary["elapsed_s"] = round(time.perf_counter() - start, 2)
+        summary["stages"] = [metrics.snapshot() for metrics in self.metrics.values()]
+        return summary
+
+    def shutdown(self):
+        self._chunk_executor.shutdown(wait=False)
+        self._embed_executor.shutdown(wait=False)
+
+
+def _read_video_list(path: str) -> List[str]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest YouTube JLPT listening videos into the vector store")
+    parser.add_argument("videos", nargs="*", help="Video IDs or URLs")
+    parser.add_argument("--file", help="Text file with one video ID or URL per line")
+    parser.add_argument("--playlist", help="Playlist ID or URL to ingest completely")
+    parser.add_argument("--force", action="store_true", help="Re-ingest videos already marked done")
+    parser.add_argument("--queue-size", type=int, default=INGEST_QUEUE_SIZE, help="Items buffered between stages")
+    parser.add_argument("--fetch-workers", type=int, default=2)
+    parser.add_argument("--extract-workers", type=int, default=3)
+    parser.add_argument("--embed-workers", type=int, default=INGEST_EMBED_WORKERS)
+    parser.add_argument("--checkpoint-dir", help="Directory for per-video progress files")
+    parser.add_argument("--transcript-url", help="Fetch transcripts from an HTTP service instead of YouTube")
+    args = parser.parse_args()
+
+    from backend.get_transcript import HTTPTranscriptFetcher
+    fetcher = HTTPTranscriptFetcher(args.transcript_url) if args.transcript_url else None
+    downloader = YouTubeTranscriptDownloader(fetcher=fetcher)
+
+    videos = list(args.videos)
+    if args.file:
+        videos += _read_video_list(args.file)
+    if args.playlist:
+        videos += downloader.fetcher.list_playlist(downloader.extract_playlist_id(args.playlist) or args.playlist)
+    if not videos:
+        parser.error("no videos given")
+
+    pipeline = IngestionPipeline(
+        downloader=downloader,
+        checkpoint_dir=args.checkpoint_dir,
+        queue_size=args.queue_size,
+        fetch_workers=args.fetch_workers,
+        extract_workers=args.extract_workers,
+        embed_workers=args.embed_workers
+    )
+    summary = pipeline.run(list(dict.fromkeys(videos)), force=args.force)
+    pipeline.shutdown()
+
+    print(f"\nIngested {summary['ingested']} videos ({summary['questions']} questions), "
+          f"skipped {summary['skipped']}, failed {summary['failed']} in {summary['elapsed_s']}s")
+    print(f"{'stage':<8} {'items':>6} {'errors':>6} {'items/min':>10} {'avg s':>8}")
+    for stage in summary['stages']:
+        print(f"{stage['stage']:<8} {stage['items']:>6} {stage['errors']:>6} "
+              f"{stage['items_per_minute']:>10.1f} {stage['avg_latency_s']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
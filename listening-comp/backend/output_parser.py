@@ -0,0 +1,394 @@
+"""
+Tolerant parsing of structured LLM output.
+
+Model responses regularly wrap JSON in prose or code fences, leave trailing
+commas, put raw newlines inside strings or stop before the closing brackets.
+Instead of throwing such a response away (and paying for another call), the
+functions here repair what they can and validate the result against a small
+schema. Output that stopped early is only closed up for streaming previews;
+a final result never includes fields rebuilt that way. Every parse is
+counted per caller so the salvage rate is visible.
+"""
+import json
+import re
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+def _check_question(question: Dict) -> List[str]:
+    """Four non-empty string options and a correct_answer (0-based, as in the prompt) that indexes one"""
+    options = question["options"]
+    if len(options) != 4 or not all(isinstance(option, str) and option.strip() for option in options):
+        return ["options should be 4 non-empty strings"]
+    if not 0 <= question["correct_answer"] < len(options):
+        return [f"correct_answer {question['correct_answer']} is not an option index"]
+    return []
+
+
+# Field type per schema key; optional fields are listed in a schema's "_optional",
+# and "_check" is called on an otherwise valid result to return further problems
+QUESTION_SCHEMA = {
+    "introduction": str,
+    "conversation": str,
+    "question": str,
+    "options": list,
+    "correct_answer": int,
+    "_check": _check_question
+}
+EXTRACTED_QUESTION_SCHEMA = {
+    "introduction": str,
+    "conversation": str,
+    "question": str,
+    "section": int,
+    "_optional": {"introduction", "section"}
+}
+
+# Opening brackets tried per source before giving up, e.g. past "{see below}" in prose
+MAX_JSON_STARTS = 8
+
+_FENCE = re.compile(r'```(?:json)?\s*(.*?)(?:```|$)', re.DOTALL)
+_TRAILING_COMMA = re.compile(r',(\s*[}\]])')
+
+
+class ParseStats:
+    """Counts of clean, salvaged and failed parses per caller"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, name: str, outcome: str):
+        with self._lock:
+            counts = self._counts.setdefault(name, {"clean": 0, "salvaged": 0, "failed": 0})
+            counts[outcome] += 1
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """
+        Per-caller counts with salvage_rate, the share of malformed outputs
+        that were recovered instead of failing
+        """
+        with self._lock:
+            result = {}
+            for name, counts in self._counts.items():
+                malformed = counts["salvaged"] + counts["failed"]
+                result[name] = dict(counts, salvage_rate=counts["salvaged"] / malformed if malformed else None)
+            return result
+
+
+_stats = ParseStats()
+
+
+def parse_stats() -> Dict[str, Dict]:
+    """Process-wide parse outcomes by caller"""
+    return _stats.snapshot()
+
+
+def record_parse(name: str, outcome: str):
+    """Count a parse done outside parse_structured ("clean", "salvaged" or "failed")"""
+    _stats.record(name, outcome)
+
+
+def _closers(stack) -> str:
+    return ''.join('}' if opener == '{' else ']' for opener in reversed(stack))
+
+
+def _scan(text: str) -> Tuple[str, List[str], bool, bool, Optional[Tuple[int, List[str]]], Optional[int], int]:
+    """
+    Walk a JSON value that starts at text[0]
+
+    Raw newlines inside strings are escaped on the way. Stops after the value
+    closes; otherwise reports the open brackets, whether it ended inside a
+    string (or right after a backslash), the last point where a value was
+    complete and the last point where a top-level element was complete.
+
+    Returns:
+        Tuple: (text up to the end of the value, open brackets, in_string, escaped,
+        last_cut, element_cut, number of characters of text consumed)
+    """
+    out = []
+    stack = []
+    in_string = False
+    escaped = False
+    last_cut = None  # (index into out, stack) where the prefix ends on a complete value
+    element_cut = None  # index into out where the prefix ends on a complete top-level element
+
+    end = 0
+    for end, ch in enumerate(text, 1):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            elif ch == '\n':
+                out.append('\\n')
+                continue
+            elif ch == '\r':
+                continue
+            out.append(ch)
+            continue
+
+        out.append(ch)
+        if ch == '"':
+            in_string = True
+        elif ch in '{[':
+            stack.append(ch)
+            last_cut = (len(out), list(stack))
+        elif ch in '}]':
+            if stack:
+                stack.pop()
+            if not stack:
+                break
+            last_cut = (len(out), list(stack))
+            if len(stack) == 1:
+                element_cut = len(out)
+        elif ch == ',':
+            last_cut = (len(out) - 1, list(stack))
+            if len(stack) == 1:
+                element_cut = len(out) - 1
+
+    return ''.join(out), stack, in_string, escaped, last_cut, element_cut, end
+
+
+def _starts(text: str, opener: str) -> Iterator[int]:
+    """
+    Positions where a JSON value may start, at most MAX_JSON_STARTS
+
+    Lazy, so a value that parses at the first opener costs no scan. Openers
+    nested in a value already tried are skipped (they would yield a fragment
+    of it), and a value that runs to the end of the text is the last one.
+    """
+    start = text.find(opener)
+    for _ in range(MAX_JSON_STARTS):
+        if start == -1:
+            return
+        yield start
+        _, stack, in_string, _, _, _, end = _scan(text[start:])
+        if stack or in_string:
+            return
+        start = text.find(opener, start + end)
+
+
+def _candidates(text: str, opener: str, allow_truncated: bool) -> List[str]:
+    """
+    Repaired versions of JSON values opened with opener, most complete first
+
+    Each of the first MAX_JSON_STARTS openers is tried in turn, so a stray
+    bracket in leading prose does not hide the real value. Output that stops
+    early is only closed up (unterminated string, missing brackets) when
+    allow_truncated is set; otherwise a truncated array keeps just its
+    complete elements and a truncated object is given up.
+    """
+    return [candidate for start in _starts(text, opener)
+            for candidate in _candidates_at(text[start:], opener, allow_truncated)]
+
+
+def _candidates_at(text: str, opener: str, allow_truncated: bool) -> List[str]:
+    """Repaired versions of the JSON value that starts at text[0]"""
+    body, stack, in_string, escaped, last_cut, element_cut, _ = _scan(text)
+
+    if not stack and not in_string:
+        return [_TRAILING_COMMA.sub(r'\1', body)]
+
+    if not allow_truncated:
+        if opener == '[' and element_cut is not None:
+            return [_TRAILING_COMMA.sub(r'\1', body[:element_cut].rstrip().rstrip(',') + ']')]
+        return []
+
+    tail = body[:-1] if escaped else body
+    closed = (tail + '"' if in_string else tail).rstrip().rstrip(',')
+    candidates = [_TRAILING_COMMA.sub(r'\1', closed + _closers(stack))]
+    if last_cut:
+        index, cut_stack = last_cut
+        candidates.append(_TRAILING_COMMA.sub(r'\1', body[:index].rstrip().rstrip(',') + _closers(cut_stack)))
+    return candidates
+
+
+def extract_json(text: str, expect: type = dict, allow_truncated: bool = False) -> Tuple[Optional[Any], bool]:
+    """
+    Find and parse the first JSON object (or array) in model output
+
+    Tries the text as-is first, then inside code fences, then repairs:
+    trailing commas and raw newlines in strings. Closing an unterminated
+    string or missing brackets only happens with allow_truncated, meant for
+    output that is still streaming; a value rebuilt that way may have lost
+    fields or list items, so it is never a final result.
+
+    Args:
+        text (str): Model output
+        expect (type): dict or list
+        allow_truncated (bool): Also close up output that stops early
+
+    Returns:
+        Tuple[Optional[Any], bool]: (parsed value or None, whether repairs were needed)
+    """
+    if not text:
+        return None, False
+    opener = '{' if expect is dict else '['
+
+    # Fast path: a complete value parses as-is
+    decoder = json.JSONDecoder()
+    for start in _starts(text, opener):
+        try:
+            value, _ = decoder.raw_decode(text, start)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(value, expect):
+            return value, False
+
+    sources = [match.group(1) for match in _FENCE.finditer(text)] + [text]
+    for source in sources:
+        for candidate in _candidates(source, opener, allow_truncated):
+            try:
+                value = json.loads(candidate)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(value, expect):
+                return value, True
+    return None, False
+
+
+def parse_partial_json(text: str) -> Optional[Dict]:
+    """
+    Best-effort parse of a JSON object that may still be streaming in
+
+    Args:
+        text (str): Model output received so far
+
+    Returns:
+        Optional[Dict]: Fields parsed so far, or None if nothing usable yet
+    """
+    value, _ = extract_json(text, dict, allow_truncated=True)
+    return value
+
+
+def validate(value: Dict, schema: Dict) -> Tuple[Optional[Dict], List[str]]:
+    """
+    Check a parsed object against a schema, coercing near misses
+
+    Numbers given as strings are converted, lists of lines become one
+    newline-joined string, and unknown fields are kept.
+
+    Returns:
+        Tuple[Optional[Dict], List[str]]: (validated copy or None, problems found)
+    """
+    if not isinstance(value, dict):
+        return None, ["not an object"]
+    optional = schema.get("_optional", set())
+    result = dict(value)
+    errors = []
+
+    for field, field_type in schema.items():
+        if field.startswith("_"):
+            continue
+        if result.get(field) in (None, ""):
+            if field not in optional:
+                errors.append(f"missing {field}")
+            continue
+
+        current = result[field]
+        if isinstance(current, field_type) and not isinstance(current, bool):
+            continue
+        try:
+            if field_type is int:
+                result[field] = int(str(current).strip())
+            elif field_type is str and isinstance(current, list):
+                result[field] = "\n".join(str(item) for item in current)
+            elif field_type is str:
+                result[field] = str(current)
+            else:
+                errors.append(f"{field} should be {field_type.__name__}")
+        except (TypeError, ValueError):
+            errors.append(f"{field} should be {field_type.__name__}")
+
+    if not errors and "_check" in schema:
+        errors = schema["_check"](result)
+    return (None if errors else result), errors
+
+
+_LABEL = re.compile(r'^[\s\-*]*([A-Za-z_ ]+?)\s*[:：]\s*', re.MULTILINE)
+
+
+def parse_labeled_fields(text: str, fields: List[str]) -> List[Dict[str, str]]:
+    """
+    Parse "field: value" output (possibly multi-line values) into records
+
+    A new record starts whenever a field repeats. Labels are matched case
+    insensitively, so "Introduction:" and "- introduction:" both count.
+
+    Returns:
+        List[Dict[str, str]]: One dict per record, in order
+    """
+    wanted = {field.lower(): field for field in fields}
+    labels = [
+        (match.start(), match.end(), wanted[match.group(1).strip().lower().replace(' ', '_')])
+        for match in _LABEL.finditer(text)
+        if match.group(1).strip().lower().replace(' ', '_') in wanted
+    ]
+
+    records: List[Dict[str, str]] = []
+    current: Dict[str, str] = {}
+    for i, (_, value_start, field) in enumerate(labels):
+        value_end = labels[i + 1][0] if i + 1 < len(labels) else len(text)
+        value = text[value_start:value_end].strip().strip('-').strip()
+        if field in current:
+            records.append(current)
+            current = {}
+        current[field] = value
+    if current:
+        records.append(current)
+    return records
+
+
+def parse_structured(text: str, schema: Dict, name: str, many: bool = False,
+                     labeled_fallback: bool = False) -> Optional[Any]:
+    """
+    Extract, repair and validate structured model output
+
+    Args:
+        text (str): Model output
+        schema (Dict): Field types, see QUESTION_SCHEMA
+        name (str): Caller name for parse_stats
+        many (bool): Expect a JSON array of objects instead of one object
+        labeled_fallback (bool): Fall back to "field: value" lines when there is no JSON
+
+    Returns:
+        The validated object (or list of valid objects), None if nothing could be salvaged
+    """
+    value, repaired = extract_json(text, list if many else dict)
+    if value is None and many:
+        # A single object where a list was asked for
+        single, repaired = extract_json(text, dict)
+        value, repaired = ([single], True) if single is not None else (None, False)
+    if value is None and labeled_fallback:
+        fields = [field for field in schema if not field.startswith("_")]
+        records = parse_labeled_fields(text, fields)
+        value, repaired = (records if many else (records[0] if records else None)), True
+        if not records:
+            value = None
+
+    if value is None:
+        _stats.record(name, "failed")
+        return None
+
+    if many:
+        results = []
+        for item in value:
+            validated, errors = validate(item, schema)
+            repaired = repaired or bool(errors)
+            if validated is not None:
+                results.append(validated)
+        if value and not results:
+            _stats.record(name, "failed")
+            return None
+        _stats.record(name, "salvaged" if repaired else "clean")
+        return results
+
+    validated, errors = validate(value, schema)
+    if validated is None:
+        print(f"Invalid {name} output: {', '.join(errors)}")
+        _stats.record(name, "failed")
+        return None
+    _stats.record(name, "salvaged" if repaired or value != validated else "clean")
+    return validated
@@ -1,113 +1,360 @@
-import boto3
+import hashlib
 import json
-from typing import Dict, List, Optional
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
 from datetime import datetime
+from backend import resources, tracing
 from backend.vector_store import JLPTQuestionVectorStore
-from backend.question_history import QuestionHistory
+from backend.hybrid_retriever import RETRIEVAL_MODE, HybridRetriever
+from backend.question_history import QuestionHistory, question_hash
+from backend.output_parser import QUESTION_SCHEMA, parse_partial_json, parse_structured
+from backend.streaming import iter_converse_stream_text
 
 # Model ID for question generation
 MODEL_ID = "amazon.nova-micro-v1:0"
 
+# Generate feedback for all options in the background once a question is shown
+# (one LLM call and retrieval per option, so off by default)
+FEEDBACK_PREWARM = os.environ.get('FEEDBACK_PREWARM', 'false').lower() == 'true'
+# Background threads generating prewarmed feedback
+FEEDBACK_PREWARM_WORKERS = int(os.environ.get('FEEDBACK_PREWARM_WORKERS', '4'))
+# Feedback texts kept in memory; older entries are read back from the history database
+FEEDBACK_CACHE_SIZE = int(os.environ.get('FEEDBACK_CACHE_SIZE', '1024'))
+
+# Inference parameters shared by question generation and feedback
+INFERENCE_CONFIG = {
+    "temperature": 0.7,
+    "topP": 0.9,
+    "maxTokens": 500
+}
+
 class QuestionGenerator:
-    def __init__(self):
-        """Initialize vector store and Bedrock client for RAG-based question generation"""
-        self.vector_store = JLPTQuestionVectorStore()
-        self.bedrock_client = boto3.client('bedrock-runtime', region_name="us-east-1")
-        self.history = QuestionHistory()
-    
-    def generate_question(self, section: int = None, topic: str = None) -> Optional[Dict]:
-        """Generate a new question using RAG workflow"""
+    def __init__(self, vector_store: Optional[JLPTQuestionVectorStore] = None, bedrock_client=None,
+                 history: Optional[QuestionHistory] = None, retriever: Optional[HybridRetriever] = None):
+        """Initialize vector store and Bedrock client for RAG-based question generation
+        
+        Shared instances can be passed in (see backend.resources) so that
+        several generators reuse the same clients and history. Context
+        questions come from a HybridRetriever (BM25 + vectors) unless
+        RETRIEVAL_MODE=vector.
+        """
+        self.vector_store = vector_store or JLPTQuestionVectorStore()
+        self.bedrock_client = bedrock_client or resources.get_bedrock_client()
+        self.history = history or QuestionHistory()
+        if retriever is None and RETRIEVAL_MODE == 'hybrid':
+            retriever = HybridRetriever(self.vector_store)
+        self.retriever = retriever
+        
+        # Feedback per (feedback_key, answer), an LRU in front of the history database
+        self._feedback_cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._pending_feedback: Dict[Tuple[str, str], Future] = {}
+        self._feedback_lock = threading.Lock()
+        self._feedback_hits = 0
+        self._feedback_misses = 0
+        self._feedback_executor = ThreadPoolExecutor(max_workers=FEEDBACK_PREWARM_WORKERS,
+                                                     thread_name_prefix="feedback")
+    
+    def generate_question(self, section: int = None, topic: str = None, record: bool = True) -> Optional[Dict]:
+        """Generate a new question using RAG workflow
+        
+        With record=False the question is not stored; callers that hand it
+        out later (e.g. the question pool) call record_question themselves.
+        """
         try:
-            # 1. Find similar questions using semantic search with topic context
-            query = f"Generate a new JLPT listening question about {topic}" if topic else "Generate a new JLPT listening question"
-            similar_questions = self.vector_store.query_similar_questions(
-                query_text=query,
-                section=section,
-                n_results=2
-            )
-            
-            if not similar_questions:
-                print("No similar questions found in vector store")
+            # 1-2. Retrieve similar questions and build the prompt
+            messages = self._build_question_messages(section, topic)
+            if messages is None:
                 return None
             
-            # 2. Use retrieved questions as context for generation
-            question_context = similar_questions[0]['metadata']  # Already parsed by vector store
-            
             # 3. Generate new question using converse API with topic guidance
-            messages = [{
-                "role": "user",
-                "content": [{
-                    "text": self._create_question_prompt(question_context, topic)
-                }]
-            }]
-            
             response = self.bedrock_client.converse(
                 modelId=MODEL_ID,
                 messages=messages,
-                inferenceConfig={
-                    "temperature": 0.7,
-                    "topP": 0.9,
-                    "maxTokens": 500
-                }
+                inferenceConfig=INFERENCE_CONFIG
             )
             
-            # 4. Parse response into question format
-            new_question = self._parse_question_response(response['output']['message']['content'][0]['text'])
+            # 4-6. Parse, annotate and store the question
+            return self._finalize_question(
+                response['output']['message']['content'][0]['text'], section, topic, record
+            )
+            
+        except Exception as e:
+            print(f"Error generating question: {str(e)}")
+            return None
+    
+    def generate_question_stream(self, section: int = None, topic: str = None,
+                                 record: bool = True) -> Iterator[Tuple[Dict, bool]]:
+        """Generate a new question, yielding partially parsed fields as they stream in
+        
+        Yields:
+            Tuple[Dict, bool]: (question so far, done). The last item has
+            done=True and the validated question, or an empty dict on failure.
+        """
+        try:
+            messages = self._build_question_messages(section, topic)
+            if messages is None:
+                yield {}, True
+                return
             
-            # 5. Add topic and timestamp to the question metadata
-            if new_question:
-                new_question['topic'] = topic
-                new_question['timestamp'] = datetime.now().isoformat()
+            response = self.bedrock_client.converse_stream(
+                modelId=MODEL_ID,
+                messages=messages,
+                inferenceConfig=INFERENCE_CONFIG
+            )
             
-            # 6. Store the new question in vector store and history
-            if new_question and section:
-                self.vector_store.store_questions([new_question], section)
-                # Store in history with section and topic
-                self.history.add_question(new_question, section, topic or "General")
+            text = ""
+            fields_seen = None
+            for chunk in iter_converse_stream_text(response):
+                text += chunk
+                partial = parse_partial_json(text)
+                if partial and partial != fields_seen:
+                    fields_seen = partial
+                    yield partial, False
             
-            return new_question
+            yield self._finalize_question(text, section, topic, record) or {}, True
             
         except Exception as e:
             print(f"Error generating question: {str(e)}")
+            yield {}, True
+    
+    def _build_question_messages(self, section: Optional[int], topic: Optional[str]) -> Optional[List[Dict]]:
+        """Retrieve similar questions and build the converse messages for generation"""
+        # 1. Find similar questions using semantic search with topic context
+        query = f"Generate a new JLPT listening question about {topic}" if topic else "Generate a new JLPT listening question"
+        with tracing.span("retrieve_context", mode="hybrid" if self.retriever else "vector"):
+            if self.retriever:
+                similar_questions = self.retriever.retrieve(query, section=section, topic=topic, n_results=2)
+            else:
+                similar_questions = self.vector_store.query_similar_questions(
+                    query_text=query,
+                    section=section,
+                    n_results=2
+                )
+        
+        if not similar_questions:
+            print("No similar questions found in vector store")
             return None
+        
+        # 2. Use retrieved questions as context for generation
+        question_context = similar_questions[0]['metadata']  # Already parsed by vector store
+        
+        return [{
+            "role": "user",
+            "content": [{
+                "text": self._create_question_prompt(question_context, topic)
+            }]
+        }]
+    
+    def _finalize_question(self, response_text: str, section: Optional[int], topic: Optional[str],
+                           record: bool) -> Optional[Dict]:
+        """Parse the model output, add metadata and optionally record the question"""
+        # 4. Parse response into question format
+        new_question = self._parse_question_response(response_text)
+        
+        # 5. Add topic and timestamp to the question metadata
+        if new_question:
+            new_question['topic'] = topic
+            new_question['timestamp'] = datetime.now().isoformat()
+        
+        # 6. Store the new question in vector store and history
+        if record and new_question and section:
+            self.record_question(new_question, section, topic)
+        
+        return new_question
+    
+    def record_question(self, question: Dict, section: int, topic: Optional[str] = None):
+        """Store a generated question in the vector store and history
+        
+        The vector store id is derived from the question's content, so each
+        new question adds an entry and re-recording one replaces it.
+        """
+        self.vector_store.store_questions([question], section)
+        # Store in history with section and topic
+        self.history.add_question(question, section, topic or "General")
+    
+    @staticmethod
+    def feedback_key(question: Dict) -> str:
+        """Hash of everything feedback depends on: content, options and correct answer"""
+        payload = json.dumps(
+            [question_hash(question), question.get('options', []), question.get('correct_answer')],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def get_cached_feedback(self, question: Dict, user_answer: str) -> Optional[str]:
+        """Feedback generated earlier for this question and answer, if any"""
+        key = (self.feedback_key(question), str(user_answer))
+        with self._feedback_lock:
+            feedback = self._feedback_cache.get(key)
+            if feedback is not None:
+                self._feedback_cache.move_to_end(key)
+        if feedback is None:
+            feedback = self.history.get_feedback(*key)
+            if feedback is not None:
+                self._remember_feedback(key, feedback)
+        return feedback
+    
+    def _remember_feedback(self, key: Tuple[str, str], feedback: str):
+        with self._feedback_lock:
+            self._feedback_cache[key] = feedback
+            self._feedback_cache.move_to_end(key)
+            while len(self._feedback_cache) > FEEDBACK_CACHE_SIZE:
+                self._feedback_cache.popitem(last=False)
+    
+    def _count_feedback(self, hit: bool):
+        with self._feedback_lock:
+            if hit:
+                self._feedback_hits += 1
+            else:
+                self._feedback_misses += 1
+    
+    def feedback_cache_stats(self) -> Dict:
+        """Hits and misses of answer submissions against the feedback cache"""
+        with self._feedback_lock:
+            lookups = self._feedback_hits + self._feedback_misses
+            return {
+                "hits": self._feedback_hits,
+                "misses": self._feedback_misses,
+                "hit_rate": self._feedback_hits / lookups if lookups else None,
+                "cached": len(self._feedback_cache),
+                "prewarming": len(self._pending_feedback)
+            }
+    
+    def _store_feedback(self, key: Tuple[str, str], feedback: str):
+        self._remember_feedback(key, feedback)
+        self.history.save_feedback(*key, feedback)
+    
+    def _generate_feedback(self, question: Dict, user_answer: str) -> str:
+        """Generate feedback with the LLM and cache it; raises on failure"""
+        response = self.bedrock_client.converse(
+            modelId=MODEL_ID,
+            messages=self._build_feedback_messages(question, user_answer),
+            inferenceConfig=INFERENCE_CONFIG
+        )
+        feedback = response['output']['message']['content'][0]['text']
+        self._store_feedback((self.feedback_key(question), str(user_answer)), feedback)
+        return feedback
+    
+    def _prewarmed_feedback(self, question: Dict, user_answer: str) -> Optional[str]:
+        """Wait for a prewarm in flight for this answer; None if there is none or it failed"""
+        with self._feedback_lock:
+            pending = self._pending_feedback.get((self.feedback_key(question), str(user_answer)))
+        if pending is None:
+            return None
+        try:
+            return pending.result()
+        except Exception as e:
+            print(f"Prewarmed feedback failed, generating again: {str(e)}")
+            return None
+    
+    def prewarm_feedback(self, question: Dict) -> List[Future]:
+        """Generate feedback for every option in the background so answer submission hits the cache
+        
+        Returns the futures of all options still being generated (including
+        ones another caller started), so callers can wait for them.
+        """
+        if not FEEDBACK_PREWARM:
+            return []
+        key = self.feedback_key(question)
+        futures = []
+        for answer in (str(i) for i in range(1, len(question.get('options', [])) + 1)):
+            if self.get_cached_feedback(question, answer) is not None:
+                continue
+            with self._feedback_lock:
+                future = self._pending_feedback.get((key, answer))
+                started = future is None
+                if started:
+                    future = self._feedback_executor.submit(
+                        tracing.in_current_context(self._generate_feedback), question, answer
+                    )
+                    self._pending_feedback[(key, answer)] = future
+            if started:
+                future.add_done_callback(lambda _, k=(key, answer): self._clear_pending(k))
+            futures.append(future)
+        return futures
+    
+    def _clear_pending(self, key: Tuple[str, str]):
+        with self._feedback_lock:
+            self._pending_feedback.pop(key, None)
     
     def provide_feedback(self, question: Dict, user_answer: str) -> str:
-        """Provide contextual feedback using RAG workflow"""
+        """Provide contextual feedback using RAG workflow
+        
+        Feedback is cached per (question, answer); a prewarm already in
+        flight for the same answer is waited on instead of calling again,
+        and generation is retried here if that prewarm failed.
+        """
         try:
-            # 1. Find similar questions for context
-            similar_questions = self.vector_store.query_similar_questions(
-                query_text=f"{question.get('introduction', '')} {question.get('conversation', '')}",
-                section=None,
-                n_results=2
-            )
+            feedback = self.get_cached_feedback(question, user_answer)
+            if feedback is None:
+                feedback = self._prewarmed_feedback(question, user_answer)
+            self._count_feedback(hit=feedback is not None)
+            if feedback is not None:
+                return feedback
             
-            # 2. Generate feedback using converse API
-            messages = [{
-                "role": "user",
-                "content": [{
-                    "text": self._create_feedback_prompt(question, [q['metadata'] for q in similar_questions], user_answer)
-                }]
-            }]
+            # 1-2. Generate feedback using converse API
+            return self._generate_feedback(question, user_answer)
             
-            response = self.bedrock_client.converse(
+        except Exception as e:
+            print(f"Error providing feedback: {str(e)}")
+            return "Unable to generate feedback at this time."
+    
+    def provide_feedback_stream(self, question: Dict, user_answer: str) -> Iterator[str]:
+        """Provide contextual feedback, yielding text chunks as the model streams them
+        
+        Cached (or already prewarming) feedback is yielded in one piece.
+        """
+        try:
+            feedback = self.get_cached_feedback(question, user_answer)
+            if feedback is None:
+                feedback = self._prewarmed_feedback(question, user_answer)
+            self._count_feedback(hit=feedback is not None)
+            if feedback is not None:
+                yield feedback
+                return
+            
+            response = self.bedrock_client.converse_stream(
                 modelId=MODEL_ID,
-                messages=messages,
-                inferenceConfig={
-                    "temperature": 0.7,
-                    "topP": 0.9,
-                    "maxTokens": 500
-                }
+                messages=self._build_feedback_messages(question, user_answer),
+                inferenceConfig=INFERENCE_CONFIG
             )
-            
-            return response['output']['message']['content'][0]['text']
+            chunks = []
+            for chunk in iter_converse_stream_text(response):
+                chunks.append(chunk)
+                yield chunk
+            if chunks:
+                self._store_feedback((self.feedback_key(question), str(user_answer)), "".join(chunks))
             
         except Exception as e:
             print(f"Error providing feedback: {str(e)}")
-            return "Unable to generate feedback at this time."
+            yield "Unable to generate feedback at this time."
+    
+    def _build_feedback_messages(self, question: Dict, user_answer: str) -> List[Dict]:
+        """Retrieve similar questions and build the converse messages for feedback"""
+        # 1. Find similar questions for context
+        with tracing.span("retrieve_feedback_context"):
+            similar_questions = self.vector_store.query_similar_questions(
+                query_text=f"{question.get('introduction', '')} {question.get('conversation', '')}",
+                section=None,
+                n_results=2
+            )
+        
+        # 2. Build the feedback prompt
+        return [{
+            "role": "user",
+            "content": [{
+                "text": self._create_feedback_prompt(question, [q['metadata'] for q in similar_questions], user_answer)
+            }]
+        }]
     
-    def get_question_history(self, section: Optional[int] = None, topic: Optional[str] = None) -> List[Dict]:
-        """Get questions from history with optional filters"""
-        return self.history.get_questions(section, topic)
+    def get_question_history(self, section: Optional[int] = None, topic: Optional[str] = None,
+                             limit: Optional[int] = None, offset: int = 0,
+                             newest_first: bool = False) -> List[Dict]:
+        """Get questions from history with optional filters and paging"""
+        return self.history.get_questions(section, topic, limit=limit, offset=offset, newest_first=newest_first)
     
     def get_question_by_id(self, question_id: int) -> Optional[Dict]:
         """Get a specific question by ID"""
@@ -168,27 +415,17 @@ Note: The conversation should maintain JLPT level appropriateness and test liste
 """
     
     def _parse_question_response(self, response_text: str) -> Optional[Dict]:
-        """Parse the response from the model into a question format"""
+        """Parse the response from the model into a question format
+        
+        Malformed JSON (prose around it, trailing commas, raw newlines) is
+        repaired rather than rejected; output cut off before the object closes
+        is rejected, as are options that correct_answer does not index. See
+        backend.output_parser.
+        """
         try:
-            # Find the JSON block in the response
-            start_idx = response_text.find('{')
-            end_idx = response_text.rfind('}') + 1
-            if start_idx == -1 or end_idx == 0:
-                print("No JSON found in response")
-                return None
-            
-            json_str = response_text[start_idx:end_idx]
-            question = json.loads(json_str)
-            
-            # Validate required fields
-            required_fields = ['introduction', 'conversation', 'question', 'options', 'correct_answer']
-            if not all(field in question for field in required_fields):
-                print("Missing required fields in question")
-                return None
-            
-            # Ensure correct_answer is an integer
-            question['correct_answer'] = int(question['correct_answer'])
-            
+            question = parse_structured(response_text, QUESTION_SCHEMA, "question_generator")
+            if question is None:
+                print("No valid question JSON found in response")
             return question
         except Exception as e:
             print(f"Error parsing question response: {str(e)}")
@@ -1,78 +1,276 @@
+import hashlib
 import json
 import os
-from typing import Dict, List, Optional
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Set
 from datetime import datetime
 
+def question_hash(question: Dict) -> str:
+    """Stable hash of a question's content (introduction, conversation, question)"""
+    content = {field: question.get(field, '') for field in ('introduction', 'conversation', 'question')}
+    return hashlib.sha256(json.dumps(content, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
 class QuestionHistory:
-    def __init__(self):
-        """Initialize question history manager"""
+    def __init__(self, db_path: Optional[str] = None, legacy_json_path: Optional[str] = None):
+        """Initialize question history manager
+
+        History is stored in SQLite so adding a question is a single indexed
+        insert instead of rewriting the whole file. Entries from the old
+        question_history.json are imported once on first open.
+
+        Args:
+            db_path (str, optional): SQLite database file
+            legacy_json_path (str, optional): Old JSON history to migrate from
+        """
         current_dir = os.path.dirname(os.path.abspath(__file__))
-        self.history_file = os.path.join(current_dir, 'question_history.json')
-        self._load_history()
-    
-    def _load_history(self):
-        """Load question history from file"""
-        try:
-            if os.path.exists(self.history_file):
-                with open(self.history_file, 'r', encoding='utf-8') as f:
-                    self.history = json.load(f)
-            else:
-                self.history = []
-        except Exception as e:
-            print(f"Error loading history: {str(e)}")
-            self.history = []
-    
-    def _save_history(self):
-        """Save question history to file"""
+        self.db_path = db_path or os.path.join(current_dir, 'question_history.sqlite3')
+        self.history_file = legacy_json_path or os.path.join(current_dir, 'question_history.json')
+
+        # One instance is shared by all Streamlit sessions (see backend.resources)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._create_schema()
+        self._migrate_legacy_history()
+        self._backfill_references()
+
+    def _create_schema(self):
+        """Create tables and indexes if they do not exist"""
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS questions (
+                    id INTEGER PRIMARY KEY,
+                    timestamp TEXT NOT NULL,
+                    section INTEGER,
+                    topic TEXT,
+                    question TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_questions_section_topic ON questions(section, topic, id);
+                CREATE INDEX IF NOT EXISTS idx_questions_topic ON questions(topic, id);
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                CREATE TABLE IF NOT EXISTS conversation_formats (
+                    question_hash TEXT PRIMARY KEY,
+                    conversation TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS feedback_cache (
+                    feedback_key TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    feedback TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    PRIMARY KEY (feedback_key, answer)
+                );
+            """)
+
+    def _backfill_references(self):
+        """Fill content_hash/audio_file for rows stored before those columns existed (or imported from JSON)"""
+        with self._lock, self._conn:
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(questions)")}
+            for column in ("content_hash", "audio_file"):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE questions ADD COLUMN {column} TEXT")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_questions_content_hash ON questions(content_hash)")
+            rows = self._conn.execute("SELECT id, question FROM questions WHERE content_hash IS NULL").fetchall()
+            self._conn.executemany(
+                "UPDATE questions SET content_hash = ?, audio_file = ? WHERE id = ?",
+                [(*self._references(json.loads(row["question"])), row["id"]) for row in rows]
+            )
+
+    @staticmethod
+    def _references(question: Dict):
+        """(content hash, audio file name) stored alongside a question"""
+        audio_file = question.get('audio_file')
+        return question_hash(question), os.path.basename(audio_file) if audio_file else None
+
+    def _migrate_legacy_history(self):
+        """Import question_history.json once, keeping the original ids"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'legacy_json_migrated'").fetchone()
+        if row is None and os.path.exists(self.history_file):
+            self.migrate_from_json(self.history_file)
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """Import entries from a JSON history file
+
+        Args:
+            json_path (str): Path to a list of history entries
+
+        Returns:
+            int: Number of entries imported (existing ids are skipped)
+        """
         try:
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(self.history, f, ensure_ascii=False, indent=2)
+            with open(json_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+
+            with self._lock, self._conn:
+                before = self._conn.total_changes
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO questions (id, timestamp, section, topic, question) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (entry["id"], entry["timestamp"], entry["section"], entry["topic"],
+                         json.dumps(entry["question"], ensure_ascii=False))
+                        for entry in entries
+                    ]
+                )
+                imported = self._conn.total_changes - before
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_json_migrated', ?)",
+                    (datetime.now().isoformat(),)
+                )
+            print(f"Migrated {imported} questions from {json_path}")
+            return imported
         except Exception as e:
-            print(f"Error saving history: {str(e)}")
-    
+            print(f"Error migrating history: {str(e)}")
+            return 0
+
+    @staticmethod
+    def _row_to_entry(row: sqlite3.Row) -> Dict:
+        return {
+            "id": row["id"],
+            "timestamp": row["timestamp"],
+            "section": row["section"],
+            "topic": row["topic"],
+            "question": json.loads(row["question"])
+        }
+
+    @staticmethod
+    def _filters(section: Optional[int], topic: Optional[str]):
+        clauses, params = [], []
+        if section is not None:
+            clauses.append("section = ?")
+            params.append(section)
+        if topic is not None:
+            clauses.append("topic = ?")
+            params.append(topic)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
     def add_question(self, question: Dict, section: int, topic: str):
         """Add a new question to history"""
         try:
-            # Create history entry with metadata
-            entry = {
-                "id": len(self.history),
-                "timestamp": datetime.now().isoformat(),
-                "section": section,
-                "topic": topic,
-                "question": question
-            }
-            
-            # Add to history and save
-            self.history.append(entry)
-            self._save_history()
-            return entry["id"]
+            with self._lock, self._conn:
+                cursor = self._conn.execute(
+                    "INSERT INTO questions (timestamp, section, topic, question, content_hash, audio_file) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (datetime.now().isoformat(), section, topic, json.dumps(question, ensure_ascii=False),
+                     *self._references(question))
+                )
+            return cursor.lastrowid
         except Exception as e:
             print(f"Error adding question to history: {str(e)}")
             return None
-    
-    def get_questions(self, section: Optional[int] = None, topic: Optional[str] = None) -> List[Dict]:
-        """Get questions from history with optional filters"""
+
+    def get_questions(self, section: Optional[int] = None, topic: Optional[str] = None,
+                      limit: Optional[int] = None, offset: int = 0, newest_first: bool = False) -> List[Dict]:
+        """Get questions from history with optional filters
+
+        Args:
+            section (int, optional): Only questions from this section
+            topic (str, optional): Only questions on this topic
+            limit (int, optional): Page size; all matching questions when None
+            offset (int): Number of questions to skip
+            newest_first (bool): Order by descending id instead of ascending
+        """
         try:
-            filtered = self.history
-            
-            if section is not None:
-                filtered = [q for q in filtered if q["section"] == section]
-            
-            if topic is not None:
-                filtered = [q for q in filtered if q["topic"] == topic]
-            
-            return filtered
+            where, params = self._filters(section, topic)
+            order = "DESC" if newest_first else "ASC"
+            query = f"SELECT * FROM questions {where} ORDER BY id {order} LIMIT ? OFFSET ?"
+            params += [limit if limit is not None else -1, offset]
+            with self._lock:
+                rows = self._conn.execute(query, params).fetchall()
+            return [self._row_to_entry(row) for row in rows]
         except Exception as e:
             print(f"Error getting questions from history: {str(e)}")
             return []
-    
+
+    def count_questions(self, section: Optional[int] = None, topic: Optional[str] = None) -> int:
+        """Count questions matching the optional filters"""
+        try:
+            where, params = self._filters(section, topic)
+            with self._lock:
+                return self._conn.execute(f"SELECT COUNT(*) FROM questions {where}", params).fetchone()[0]
+        except Exception as e:
+            print(f"Error counting questions in history: {str(e)}")
+            return 0
+
     def get_question_by_id(self, question_id: int) -> Optional[Dict]:
         """Get a specific question by ID"""
         try:
-            for question in self.history:
-                if question["id"] == question_id:
-                    return question
-            return None
+            with self._lock:
+                row = self._conn.execute("SELECT * FROM questions WHERE id = ?", (question_id,)).fetchone()
+            return self._row_to_entry(row) if row else None
         except Exception as e:
             print(f"Error getting question by ID: {str(e)}")
             return None
+
+    def get_question_hashes(self) -> Set[str]:
+        """Content hashes of every question in history"""
+        try:
+            with self._lock:
+                rows = self._conn.execute("SELECT DISTINCT content_hash FROM questions").fetchall()
+            return {row["content_hash"] for row in rows}
+        except Exception as e:
+            print(f"Error getting question hashes: {str(e)}")
+            return set()
+
+    def get_audio_references(self) -> Set[str]:
+        """Content hashes of every question plus the audio file names old entries point to (used to keep their audio)"""
+        try:
+            with self._lock:
+                rows = self._conn.execute("SELECT DISTINCT content_hash, audio_file FROM questions").fetchall()
+            return {row["content_hash"] for row in rows} | {row["audio_file"] for row in rows if row["audio_file"]}
+        except Exception as e:
+            print(f"Error getting audio references: {str(e)}")
+            return set()
+
+    def get_conversation_format(self, content_hash: str) -> Optional[Dict]:
+        """Get the stored speaker-turn format for a question hash"""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT conversation FROM conversation_formats WHERE question_hash = ?", (content_hash,)
+                ).fetchone()
+            return json.loads(row["conversation"]) if row else None
+        except Exception as e:
+            print(f"Error getting conversation format: {str(e)}")
+            return None
+
+    def save_conversation_format(self, content_hash: str, conversation: Dict):
+        """Store the speaker-turn format for a question hash"""
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO conversation_formats (question_hash, conversation, created_at) VALUES (?, ?, ?)",
+                    (content_hash, json.dumps(conversation, ensure_ascii=False), datetime.now().isoformat())
+                )
+        except Exception as e:
+            print(f"Error saving conversation format: {str(e)}")
+
+    def get_feedback(self, feedback_key: str, answer: str) -> Optional[str]:
+        """Get stored feedback for a question (see QuestionGenerator.feedback_key) and answer"""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT feedback FROM feedback_cache WHERE feedback_key = ? AND answer = ?", (feedback_key, answer)
+                ).fetchone()
+            return row["feedback"] if row else None
+        except Exception as e:
+            print(f"Error getting cached feedback: {str(e)}")
+            return None
+
+    def save_feedback(self, feedback_key: str, answer: str, feedback: str):
+        """Store feedback for a question and answer"""
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO feedback_cache (feedback_key, answer, feedback, created_at) VALUES (?, ?, ?, ?)",
+                    (feedback_key, answer, feedback, datetime.now().isoformat())
+                )
+        except Exception as e:
+            print(f"Error saving feedback: {str(e)}")
@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+# Number of ready questions kept per (section, topic)
+QUESTION_POOL_DEPTH = int(os.environ.get('QUESTION_POOL_DEPTH', '2'))
+# Background workers generating questions (and audio) for the pool
+QUESTION_POOL_WORKERS = int(os.environ.get('QUESTION_POOL_WORKERS', '2'))
+# Whether pooled questions come with pre-generated audio (Polly calls for questions that may never be shown)
+QUESTION_POOL_AUDIO = os.environ.get('QUESTION_POOL_AUDIO', 'false').lower() == 'true'
+# Wait before refilling a key again after a failed or empty refill; doubles per consecutive failure
+QUESTION_POOL_RETRY_SECONDS = float(os.environ.get('QUESTION_POOL_RETRY_SECONDS', '60'))
+QUESTION_POOL_MAX_RETRY_SECONDS = 600
+
+
+class QuestionPool:
+    """
+    Per-(section, topic) pool of ready-to-serve questions.
+
+    A background worker pool keeps each requested key topped up to the target
+    depth, so get_question normally pops a finished question (with audio)
+    instead of waiting on the vector search, LLM and TTS calls. Questions are
+    only recorded in the history once they are actually handed out. A key
+    whose refill failed is not refilled again until its backoff has passed,
+    however often the page reruns.
+    """
+
+    def __init__(self, generator, audio_generator=None, target_depth: int = QUESTION_POOL_DEPTH,
+                 max_workers: int = QUESTION_POOL_WORKERS):
+        """
+        Initialize the pool
+
+        Args:
+            generator (QuestionGenerator): Generator used to build questions
+            audio_generator (AudioGenerator, optional): Pre-generates audio when set
+            target_depth (int): Ready questions to keep per key
+            max_workers (int): Background refill threads
+        """
+        self.generator = generator
+        self.audio_generator = audio_generator
+        self.target_depth = target_depth
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="question-pool")
+        # History and vector store writes must not queue behind long refills
+        self._record_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="question-pool-record")
+        self._lock = threading.Lock()
+        self._ready: Dict[Tuple[int, str], deque] = defaultdict(deque)
+        self._pending: Dict[Tuple[int, str], int] = defaultdict(int)
+        self._failures: Dict[Tuple[int, str], int] = defaultdict(int)
+        self._retry_at: Dict[Tuple[int, str], float] = {}
+
+        # Metrics
+        self._hits = 0
+        self._misses = 0
+        self._refill_failures = 0
+        self._refill_latencies_ms = deque(maxlen=200)
+
+    def get_question(self, section: int, topic: str) -> Optional[Dict]:
+        """
+        Return a question for (section, topic), from the pool when possible
+
+        On a miss the question is generated synchronously (without audio).
+        Either way a background refill is scheduled for the key.
+        """
+        question = self.take(section, topic)
+        if question is None:
+            question = self.generator.generate_question(section=section, topic=topic)
+        return question
+
+    def take(self, section: int, topic: str) -> Optional[Dict]:
+        """
+        Pop a ready question for (section, topic) without generating on a miss
+
+        Callers that get None generate (and record) the question themselves,
+        e.g. with QuestionGenerator.generate_question_stream.
+        """
+        key = (section, topic)
+        with self._lock:
+            question = self._ready[key].popleft() if self._ready[key] else None
+            if question is not None:
+                self._hits += 1
+            else:
+                self._misses += 1
+        self._schedule_refill(key)
+
+        if question is not None:
+            # Record off the request path; the stored copy never carries audio paths
+            recorded = {k: v for k, v in question.items() if k != 'audio_file'}
+            self._record_executor.submit(self._record, recorded, section, topic)
+        return question
+
+    def warm(self, section: int, topic: str):
+        """Start filling the pool for (section, topic) ahead of the first request"""
+        self._schedule_refill((section, topic))
+
+    def _schedule_refill(self, key: Tuple[int, str]):
+        with self._lock:
+            if time.monotonic() < self._retry_at.get(key, 0.0):
+                return
+            missing = self.target_depth - len(self._ready[key]) - self._pending[key]
+            for _ in range(max(missing, 0)):
+                self._pending[key] += 1
+                self._executor.submit(self._refill, key)
+
+    def _refill(self, key: Tuple[int, str]):
+        section, topic = key
+        start = time.perf_counter()
+        question = None
+        try:
+            question = self.generator.generate_question(section=section, topic=topic, record=False)
+            if question and self.audio_generator and QUESTION_POOL_AUDIO:
+                audio_file = self.audio_generator.generate_audio(question)
+                if audio_file:
+                    question['audio_file'] = audio_file
+        except Exception as e:
+            print(f"Error refilling question pool for {key}: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending[key] -= 1
+                if question:
+                    self._ready[key].append(question)
+                    self._refill_latencies_ms.append((time.perf_counter() - start) * 1000)
+                    self._failures.pop(key, None)
+                    self._retry_at.pop(key, None)
+                else:
+                    self._refill_failures += 1
+                    self._failures[key] += 1
+                    backoff = QUESTION_POOL_RETRY_SECONDS * 2 ** (self._failures[key] - 1)
+                    self._retry_at[key] = time.monotonic() + min(backoff, QUESTION_POOL_MAX_RETRY_SECONDS)
+
+    def _record(self, question: Dict, section: int, topic: str):
+        try:
+            self.generator.record_question(question, section, topic)
+        except Exception as e:
+            print(f"Error recording pooled question: {str(e)}")
+
+    def metrics(self) -> Dict:
+        """Pool depth per key, hit rate and refill latency"""
+        with self._lock:
+            requests = self._hits + self._misses
+            latencies = sorted(self._refill_latencies_ms)
+            return {
+                "depth": {f"section {s} / {t}": len(q) for (s, t), q in self._ready.items()},
+                "pending_refills": sum(self._pending.values()),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / requests if requests else 0.0,
+                "refill_failures": self._refill_failures,
+                "backing_off": sum(1 for retry_at in self._retry_at.values() if retry_at > time.monotonic()),
+                "refill_latency_ms_avg": sum(latencies) / len(latencies) if latencies else None,
+                "refill_latency_ms_p95": latencies[int(0.95 * (len(latencies) - 1))] if latencies else None
+            }
+
+    def shutdown(self):
+        """Stop background refills"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._record_executor.shutdown(wait=False)
@@ -0,0 +1,151 @@
+"""
+Process-wide shared backend resources.
+
+Streamlit runs every browser session in its own script thread, so building a
+QuestionGenerator or AudioGenerator per session multiplies boto3 clients,
+vector store handles and history reads. The getters below create each
+resource once, lazily on first use, and hand the same instance to every
+session. boto3 clients are thread-safe once created; creation itself goes
+through a private Session under a lock because the default session is not.
+Client configuration (pooling, retries, rate limits) lives in
+backend.bedrock_client.
+"""
+import threading
+import time
+from typing import Callable, Dict
+
+import boto3
+
+from backend.bedrock_client import REGION_NAME, create_bedrock_client, create_polly_client
+
+_lock = threading.RLock()
+_instances: Dict[str, object] = {}
+_init_times_ms: Dict[str, float] = {}
+_session = None
+
+
+def _get_or_create(name: str, factory: Callable[[], object]):
+    """Return the shared instance for name, creating it on first use"""
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+
+    with _lock:
+        instance = _instances.get(name)
+        if instance is None:
+            start = time.perf_counter()
+            instance = factory()
+            _init_times_ms[name] = (time.perf_counter() - start) * 1000
+            _instances[name] = instance
+        return instance
+
+
+def _get_session() -> boto3.session.Session:
+    global _session
+    with _lock:
+        if _session is None:
+            _session = boto3.session.Session(region_name=REGION_NAME)
+        return _session
+
+
+def get_bedrock_client():
+    """Shared bedrock-runtime client (a RateLimitedClient, see backend.bedrock_client)"""
+    return _get_or_create("bedrock_client", lambda: create_bedrock_client(_get_session()))
+
+
+def get_polly_client():
+    """Shared Polly client"""
+    return _get_or_create("polly_client", lambda: create_polly_client(_get_session()))
+
+
+def get_vector_store():
+    """Shared JLPTQuestionVectorStore"""
+    from backend.vector_store import JLPTQuestionVectorStore
+    return _get_or_create(
+        "vector_store",
+        lambda: JLPTQuestionVectorStore(bedrock_client=get_bedrock_client())
+    )
+
+
+def get_question_history():
+    """Shared QuestionHistory"""
+    from backend.question_history import QuestionHistory
+    return _get_or_create("question_history", QuestionHistory)
+
+
+def get_hybrid_retriever():
+    """Shared HybridRetriever over the shared vector store"""
+    from backend.hybrid_retriever import HybridRetriever
+    return _get_or_create("hybrid_retriever", lambda: HybridRetriever(get_vector_store()))
+
+
+def get_question_generator():
+    """Shared QuestionGenerator wired to the shared clients"""
+    from backend.question_generator import QuestionGenerator
+    from backend.hybrid_retriever import RETRIEVAL_MODE
+    return _get_or_create(
+        "question_generator",
+        lambda: QuestionGenerator(
+            vector_store=get_vector_store(),
+            bedrock_client=get_bedrock_client(),
+            history=get_question_history(),
+            retriever=get_hybrid_retriever() if RETRIEVAL_MODE == 'hybrid' else None
+        )
+    )
+
+
+def get_tts_provider():
+    """Shared TTS provider selected by TTS_PROVIDER"""
+    from backend.tts_providers import TTS_PROVIDER, create_tts_provider
+    return _get_or_create(
+        "tts_provider",
+        lambda: create_tts_provider(polly_client=get_polly_client() if TTS_PROVIDER == 'polly' else None)
+    )
+
+
+def get_audio_generator():
+    """Shared AudioGenerator wired to the shared clients"""
+    from backend.audio_generator import AudioGenerator
+    return _get_or_create(
+        "audio_generator",
+        lambda: AudioGenerator(
+            bedrock_client=get_bedrock_client(),
+            tts_provider=get_tts_provider(),
+            history=get_question_history()
+        )
+    )
+
+
+def get_audio_stream_server():
+    """Shared AudioStreamServer for progressive playback (starts listening on first use)"""
+    from backend.audio_stream_server import AudioStreamServer
+    return _get_or_create("audio_stream_server", AudioStreamServer)
+
+
+def get_question_pool():
+    """Shared QuestionPool of pre-generated questions"""
+    from backend.question_pool import QuestionPool
+    return _get_or_create(
+        "question_pool",
+        lambda: QuestionPool(get_question_generator(), audio_generator=get_audio_generator())
+    )
+
+
+def get_question_pipeline():
+    """Shared QuestionPipeline overlapping conversation formatting, audio and feedback prefetch"""
+    from backend.async_pipeline import QuestionPipeline
+    return _get_or_create(
+        "question_pipeline",
+        lambda: QuestionPipeline(get_question_generator(), get_audio_generator())
+    )
+
+
+def get_bedrock_chat():
+    """Shared BedrockChat (stateless, so one instance serves all sessions)"""
+    from backend.chat import BedrockChat
+    return _get_or_create("bedrock_chat", lambda: BedrockChat(bedrock_client=get_bedrock_client()))
+
+
+def init_times_ms() -> Dict[str, float]:
+    """Time spent constructing each shared resource, in milliseconds"""
+    return dict(_init_times_ms)
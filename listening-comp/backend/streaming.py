@@ -0,0 +1,19 @@
+from typing import Dict, Iterator
+
+
+def iter_converse_stream_text(response: Dict) -> Iterator[str]:
+    """
+    Yield text deltas from a Bedrock converse_stream response
+
+    Args:
+        response (Dict): Return value of bedrock_client.converse_stream
+
+    Yields:
+        str: Text chunks in arrival order
+    """
+    for event in response.get('stream', []):
+        content_block_delta = event.get('contentBlockDelta')
+        if content_block_delta:
+            text = content_block_delta.get('delta', {}).get('text')
+            if text:
+                yield text
@@ -1,16 +1,42 @@
-import boto3
+"""
+Extract structured JLPT listening questions from transcripts.
+
+Run from the listening-comp directory:
+
+    python -m backend.structured_data [TRANSCRIPT] [--batch DIR] [--output PATH]
+
+(python structured_data.py from backend/ works as well). Default paths are
+inside backend/data, wherever the command is run from.
+"""
+import argparse
 import json
-from botocore.config import Config
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import os
 
-def invoke_bedrock(prompt, model_id='amazon.nova-micro-v1:0'):
-    # Initialize Amazon Bedrock client
-    bedrock = boto3.client(
-        service_name='bedrock-runtime',
-        region_name='us-east-1',
-        config=Config(retries={'max_attempts': 3, 'mode': 'standard'})
-    )
+# Add parent directory to path so the backend package imports when run as a script
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from backend import resources
+from backend.output_parser import (EXTRACTED_QUESTION_SCHEMA, extract_json, parse_labeled_fields,
+                                    record_parse, validate)
+
+# Concurrent section extractions (Bedrock calls) in flight
+STRUCTURED_DATA_WORKERS = int(os.environ.get('STRUCTURED_DATA_WORKERS', '3'))
+# Progress file written to the output directory in batch mode
+MANIFEST_NAME = "structured_manifest.json"
+SECTION_ORDINALS = ["first", "second", "third"]
+# Transcripts and extracted questions live next to this module
+DATA_DIR = os.path.join(current_dir, "data")
+
+def invoke_bedrock(prompt, model_id='amazon.nova-micro-v1:0', bedrock_client=None):
+    # Reuse the process-wide Amazon Bedrock client (pooling, retries, rate limits)
+    bedrock = bedrock_client or resources.get_bedrock_client()
 
     # Define the system prompt
     system_list = [
@@ -54,112 +80,177 @@ def invoke_bedrock(prompt, model_id='amazon.nova-micro-v1:0'):
     return structured_data
 
 def process_section(structured_data):
-    # Split the structured data into individual sections
-    sections = structured_data.split('===')
-
-    # Further process each section and its questions
-    processed_sections = []
-    for section in sections:
-        section_parts = section.strip().split('---')
-        section_description = section_parts[0].strip()
-        questions = section_parts[1:]
-
-        processed_questions = []
-        for i, question in enumerate(questions, start=1):
-            parts = question.strip().split('\n')
-            if len(parts) >= 3:
-                processed_question = {
-                    'introduction': parts[0].replace('introduction:', '').strip(),
-                    'conversation': parts[1].replace('conversation:', '').strip(),
-                    'question': parts[2].replace('question:', '').strip()
-                }
-                processed_questions.append(f"Question {i}:\nIntroduction: {processed_question['introduction']}\nConversation: {processed_question['conversation']}\nQuestion: {processed_question['question']}\n")
-
-        processed_sections.append(f"Section Description: {section_description}\nQuestions:\n" + "\n".join(processed_questions))
-
-    return processed_sections
+    # Parse the model output; malformed JSON is repaired and "field: value" text is accepted too
+    section, repaired = extract_json(structured_data, dict)
+    if section is not None and isinstance(section.get('questions'), list):
+        section_description = str(section.get('section_description') or '')
+        raw_questions = section['questions']
+    else:
+        records = parse_labeled_fields(
+            structured_data, ['section_description', 'questions', 'introduction', 'conversation', 'question']
+        )
+        section_description = next((r['section_description'] for r in records if 'section_description' in r), '')
+        raw_questions = records
+        repaired = True
+
+    questions = [validate(question, EXTRACTED_QUESTION_SCHEMA)[0] for question in raw_questions]
+    questions = [question for question in questions if question is not None]
+    if not questions:
+        record_parse("structured_data", "failed")
+    else:
+        record_parse("structured_data", "salvaged" if repaired or len(questions) < len(raw_questions) else "clean")
+
+    processed_questions = []
+    for i, question in enumerate(questions, start=1):
+        processed_questions.append(f"Question {i}:\nIntroduction: {question.get('introduction', '')}\nConversation: {question['conversation']}\nQuestion: {question['question']}\n")
+
+    return [f"Section Description: {section_description}\nQuestions:\n" + "\n".join(processed_questions)]
 
 def save_output(processed_sections, output_path):
     # Ensure the output directory exists
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-    # Handle versioning if the output file already exists
-    base, ext = os.path.splitext(output_path)
-    version = 1
-    while os.path.exists(output_path):
-        output_path = f"{base}_v{version}{ext}"
-        version += 1
-
-    # Save the output to a file
-    with open(output_path, 'w', encoding='utf-8') as output_file:
+    # Replace the file atomically: a rerun overwrites it instead of piling up _vN
+    # copies the manifest never points at, and an interrupted write leaves the old one
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as output_file:
         for section in processed_sections:
             output_file.write(section + "\n\n")
+    os.replace(temp_path, output_path)
 
-def structure_jlpt_listening_data(transcript_path, output_base_path):
-    # Read the transcript from the file
-    with open(transcript_path, 'r', encoding='utf-8') as file:
-        transcript = file.read()
-
-    # Define prompts for each section
-    prompts = [
-        f"""
-        Extract the first section of the JLPT listening test questions from the following transcript, excluding any introduction and outro. Extract the description of the format and the questions for this section.
+def build_section_prompt(transcript, section_num):
+    ordinal = SECTION_ORDINALS[section_num - 1]
+    return f"""
+        Extract the {ordinal} section of the JLPT listening test questions from the following transcript, excluding any introduction and outro. Extract the description of the format and the questions for this section.
 
         {transcript}
 
-        For this section, provide the following structure:
-        section_description: <description of the section in Japanese>
-        questions:
-        - introduction: <introduction text>
-          conversation: <conversation text>
-          question: <question text>
+        For this section, respond with only a JSON object in this structure:
+        {{"section_description": "<description of the section in Japanese>",
+          "questions": [{{"introduction": "<introduction text>", "conversation": "<conversation text>", "question": "<question text>"}}]}}
 
         Ensure that the 'question' part is not empty and contains the actual question being asked.
-
-        Separate each question with '---'.
-        """,
-        f"""
-        Extract the second section of the JLPT listening test questions from the following transcript, excluding any introduction and outro. Extract the description of the format and the questions for this section.
-
-        {transcript}
-
-        For this section, provide the following structure:
-        section_description: <description of the section in Japanese>
-        questions:
-        - introduction: <introduction text>
-          conversation: <conversation text>
-          question: <question text>
-
-        Ensure that the 'question' part is not empty and contains the actual question being asked.
-
-        Separate each question with '---'.
-        """,
-        f"""
-        Extract the third section of the JLPT listening test questions from the following transcript, excluding any introduction and outro. Extract the description of the format and the questions for this section.
-
-        {transcript}
-
-        For this section, provide the following structure:
-        section_description: <description of the section in Japanese>
-        questions:
-        - introduction: <introduction text>
-          conversation: <conversation text>
-          question: <question text>
-
-        Ensure that the 'question' part is not empty and contains the actual question being asked.
-
-        Separate each question with '---'.
         """
+
+def submit_sections(executor, transcript, bedrock_client=None):
+    # One extraction per section, all running concurrently on the executor
+    return [
+        executor.submit(invoke_bedrock, build_section_prompt(transcript, i), bedrock_client=bedrock_client)
+        for i in range(1, len(SECTION_ORDINALS) + 1)
     ]
 
-    # Process each section separately
-    for i, prompt in enumerate(prompts, start=1):
-        structured_data = invoke_bedrock(prompt)
+def save_sections(section_outputs, output_base_path):
+    # Save each section once all of them succeeded, so a failed file leaves no partial output
+    output_paths = []
+    for i, structured_data in enumerate(section_outputs, start=1):
         processed_sections = process_section(structured_data)
         output_path = f"{output_base_path}_section_{i}.txt"
         save_output(processed_sections, output_path)
+        output_paths.append(output_path)
+    return output_paths
+
+def structure_jlpt_listening_data(transcript_path, output_base_path, max_workers=STRUCTURED_DATA_WORKERS,
+                                  bedrock_client=None):
+    # Read the transcript from the file
+    with open(transcript_path, 'r', encoding='utf-8') as file:
+        transcript = file.read()
+
+    # Extract all sections concurrently instead of one after another
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="structure") as executor:
+        futures = submit_sections(executor, transcript, bedrock_client)
+        section_outputs = [future.result() for future in futures]
+
+    return save_sections(section_outputs, output_base_path)
+
+def load_manifest(manifest_path):
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def write_manifest(manifest, manifest_path):
+    # Write atomically so an interrupted run never leaves a corrupt manifest
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, manifest_path)
+
+def structure_directory(transcript_dir, output_dir, max_workers=STRUCTURED_DATA_WORKERS, bedrock_client=None):
+    """
+    Structure every .txt transcript in a directory
+
+    Sections of all pending files share one bounded worker pool. Progress is
+    recorded per file in structured_manifest.json, so rerunning after an
+    interruption or failure only processes files that are new, changed or
+    not yet done.
+
+    Returns:
+        dict: Counts of "done", "skipped" and "failed" files
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+
+    transcripts = sorted(name for name in os.listdir(transcript_dir) if name.endswith('.txt'))
+    summary = {"done": 0, "skipped": 0, "failed": 0}
+
+    pending = []
+    for name in transcripts:
+        path = os.path.join(transcript_dir, name)
+        entry = manifest.get(name, {})
+        if entry.get("status") == "done" and entry.get("mtime") == os.path.getmtime(path):
+            summary["skipped"] += 1
+            continue
+        pending.append((name, path))
+
+    print(f"{len(pending)} of {len(transcripts)} transcripts to process ({summary['skipped']} already done)")
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="structure") as executor:
+        # Queue every file up front so the pool stays busy across file boundaries
+        queued = []
+        for name, path in pending:
+            with open(path, 'r', encoding='utf-8') as file:
+                transcript = file.read()
+            queued.append((name, path, time.perf_counter(), submit_sections(executor, transcript, bedrock_client)))
+
+        for i, (name, path, start, futures) in enumerate(queued, start=1):
+            try:
+                section_outputs = [future.result() for future in futures]
+                output_base_path = os.path.join(output_dir, os.path.splitext(name)[0])
+                outputs = save_sections(section_outputs, output_base_path)
+                manifest[name] = {
+                    "status": "done",
+                    "mtime": os.path.getmtime(path),
+                    "outputs": outputs,
+                    "completed_at": datetime.now().isoformat()
+                }
+                summary["done"] += 1
+                print(f"[{i}/{len(queued)}] {name}: done in {time.perf_counter() - start:.1f}s")
+            except Exception as e:
+                manifest[name] = {"status": "failed", "error": str(e), "completed_at": datetime.now().isoformat()}
+                summary["failed"] += 1
+                print(f"[{i}/{len(queued)}] {name}: failed: {str(e)}")
+            write_manifest(manifest, manifest_path)
+
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract structured JLPT listening questions from transcripts")
+    parser.add_argument("transcript", nargs="?", default=os.path.join(DATA_DIR, "transcripts", "0e0duD8_LFE.txt"),
+                        help="Transcript file to structure")
+    parser.add_argument("--output", default=os.path.join(DATA_DIR, "questions", "structured_questions"),
+                        help="Output base path (single file) or directory (--batch)")
+    parser.add_argument("--batch", metavar="DIR", help="Structure every .txt transcript in DIR")
+    parser.add_argument("--workers", type=int, default=STRUCTURED_DATA_WORKERS,
+                        help="Concurrent Bedrock requests")
+    args = parser.parse_args()
+
+    if args.batch:
+        summary = structure_directory(args.batch, args.output, max_workers=args.workers)
+        print(f"Done: {summary['done']}, skipped: {summary['skipped']}, failed: {summary['failed']}")
+    else:
+        structure_jlpt_listening_data(args.transcript, args.output, max_workers=args.workers)
 
 if __name__ == "__main__":
-    transcript_path = "./data/transcripts/0e0duD8_LFE.txt"
-    output_base_path = "./data/questions/structured_questions"
-    structure_jlpt_listening_data(transcript_path, output_base_path)
\ No newline at end of file
+    main()
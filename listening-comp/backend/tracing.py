@@ -0,0 +1,317 @@
+"""
+Lightweight tracing of user actions, pipeline stages and model calls.
+
+Spans nest through a ContextVar: a user action in the frontend opens an
+"action" span, backend steps open "stage" spans inside it, and every
+Bedrock call made through the shared client (see bedrock_client) is
+recorded as an "llm" span with latency, token counts, retries, errors and
+an estimated cost. Finished spans are kept in a bounded in-memory buffer,
+optionally appended to a JSONL file, and summarized per stage so it is
+visible which step dominates end-to-end latency.
+
+Work handed to a thread pool does not inherit the ContextVar; wrap the
+callable with in_current_context() to keep its spans under the caller's.
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+# Set to false to disable span recording
+TRACING = os.environ.get('TRACING', 'true').lower() == 'true'
+# Finished spans kept in memory for the debug panel
+TRACE_MAX_SPANS = int(os.environ.get('TRACE_MAX_SPANS', '5000'))
+# Append every finished span to this JSONL file (disabled when empty)
+TRACE_EXPORT_PATH = os.environ.get('TRACE_EXPORT_PATH', '')
+
+# Estimated on-demand prices in USD per 1,000 (input, output) tokens
+MODEL_PRICES = {
+    "amazon.nova-micro-v1:0": (0.000035, 0.00014),
+    "amazon.nova-lite-v1:0": (0.00006, 0.00024),
+    "amazon.titan-embed-text-v1": (0.0001, 0.0),
+    "amazon.titan-embed-text-v2:0": (0.00002, 0.0)
+}
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    """One timed operation; attributes hold kind-specific data such as token counts"""
+
+    def __init__(self, name: str, kind: str = "stage", parent: Optional['Span'] = None, **attributes):
+        self.name = name
+        self.kind = kind
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.attributes = dict(attributes)
+        self.error: Optional[str] = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self, error: Optional[str] = None):
+        """Close the span and hand it to the tracer (only the first call counts)"""
+        if self.duration_ms is not None:
+            return
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        self.error = error or self.error
+        _tracer.record(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time": self.start_time,
+            "duration_ms": round(self.duration_ms, 2) if self.duration_ms is not None else None,
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+
+class Tracer:
+    """Collects finished spans: a bounded buffer plus optional JSONL export"""
+
+    def __init__(self, max_spans: int = TRACE_MAX_SPANS, export_path: str = TRACE_EXPORT_PATH):
+        self._spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+        self.export_path = export_path
+
+    def record(self, span: Span):
+        entry = span.to_dict()
+        with self._lock:
+            self._spans.append(entry)
+            if self.export_path:
+                try:
+                    with open(self.export_path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                except OSError as e:
+                    print(f"Error exporting span: {str(e)}")
+
+    def spans(self) -> List[Dict]:
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+
+_tracer = Tracer()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, kind: str = "stage", **attributes) -> Iterator[Optional[Span]]:
+    """
+    Time a block as a child of the current span (or as a new trace)
+
+    Yields the Span (None when TRACING is off) so the block can attach
+    attributes. An exception escaping the block is recorded and re-raised.
+    """
+    if not TRACING:
+        yield None
+        return
+    current = Span(name, kind, parent=_current_span.get(), **attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        current.finish()
+
+
+def start_span(name: str, kind: str = "stage", **attributes) -> Optional[Span]:
+    """Open a span without making it current; the caller must finish() it (e.g. once a stream ends)"""
+    if not TRACING:
+        return None
+    return Span(name, kind, parent=_current_span.get(), **attributes)
+
+
+def in_current_context(fn: Callable) -> Callable:
+    """Bind fn to a copy of the current context so spans opened in a worker thread nest correctly"""
+    context = contextvars.copy_context()
+    return functools.partial(context.run, fn)
+
+
+def estimate_cost(model_id: str, input_tokens: int, output_tokens: int) -> Optional[float]:
+    prices = MODEL_PRICES.get(model_id)
+    if prices is None:
+        return None
+    return (input_tokens * prices[0] + output_tokens * prices[1]) / 1000
+
+
+def finish_llm_span(llm_span: Optional[Span], input_tokens: int = 0, output_tokens: int = 0,
+                    retries: int = 0, error: Optional[str] = None):
+    """Attach token counts, retries and cost to an "llm" span and close it"""
+    if llm_span is None:
+        return
+    llm_span.set(
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        retries=retries,
+        cost_usd=estimate_cost(llm_span.attributes.get('model_id'), input_tokens, output_tokens)
+    )
+    llm_span.finish(error)
+
+
+def usage_from_response(response: Dict) -> Dict[str, int]:
+    """Token counts of a converse or invoke_model response"""
+    usage = response.get('usage')
+    if usage:
+        return {"input_tokens": usage.get('inputTokens', 0), "output_tokens": usage.get('outputTokens', 0)}
+    headers = response.get('ResponseMetadata', {}).get('HTTPHeaders', {})
+    return {
+        "input_tokens": int(headers.get('x-amzn-bedrock-input-token-count', 0)),
+        "output_tokens": int(headers.get('x-amzn-bedrock-output-token-count', 0))
+    }
+
+
+def usage_from_event(event: Dict) -> Optional[Dict[str, int]]:
+    """Token counts carried by the final event of a converse_stream or invoke_model_with_response_stream"""
+    metadata = event.get('metadata')
+    if metadata and 'usage' in metadata:
+        return {"input_tokens": metadata['usage'].get('inputTokens', 0),
+                "output_tokens": metadata['usage'].get('outputTokens', 0)}
+    chunk = event.get('chunk')
+    if chunk:
+        try:
+            body = json.loads(chunk.get('bytes', b'{}'))
+        except (TypeError, ValueError):
+            return None
+        metrics = body.get('amazon-bedrock-invocationMetrics')
+        if metrics:
+            return {"input_tokens": metrics.get('inputTokenCount', 0),
+                    "output_tokens": metrics.get('outputTokenCount', 0)}
+        usage = (body.get('metadata') or {}).get('usage')
+        if usage:
+            return {"input_tokens": usage.get('inputTokens', 0), "output_tokens": usage.get('outputTokens', 0)}
+    return None
+
+
+def trace_stream(events, llm_span: Optional[Span], retries: int = 0):
+    """Pass stream events through, closing llm_span with the final usage once the stream ends"""
+    usage = {"input_tokens": 0, "output_tokens": 0}
+    error = None
+    try:
+        for event in events:
+            usage = usage_from_event(event) or usage
+            yield event
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        finish_llm_span(llm_span, retries=retries, error=error, **usage)
+
+
+def get_spans(trace_id: Optional[str] = None) -> List[Dict]:
+    """Finished spans, optionally of one trace"""
+    spans = _tracer.spans()
+    return [s for s in spans if s['trace_id'] == trace_id] if trace_id else spans
+
+
+def clear():
+    _tracer.clear()
+
+
+def to_jsonl(spans: Optional[List[Dict]] = None) -> str:
+    return "".join(json.dumps(s, ensure_ascii=False) + "\n" for s in (spans if spans is not None else get_spans()))
+
+
+def export_jsonl(path: str) -> int:
+    """Write the buffered spans to path; returns the number written"""
+    spans = get_spans()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(to_jsonl(spans))
+    return len(spans)
+
+
+def summarize(spans: Optional[List[Dict]] = None) -> List[Dict]:
+    """
+    Per-stage latency and usage, slowest total first
+
+    Returns:
+        List[Dict]: One row per (kind, name) with call count, total/avg/p95
+        milliseconds, tokens, estimated cost, retries and errors
+    """
+    groups: Dict[tuple, List[Dict]] = {}
+    for s in spans if spans is not None else get_spans():
+        if s['duration_ms'] is not None:
+            groups.setdefault((s['kind'], s['name']), []).append(s)
+
+    rows = []
+    for (kind, name), members in groups.items():
+        durations = np.array([s['duration_ms'] for s in members])
+        attributes = [s['attributes'] for s in members]
+        rows.append({
+            "kind": kind,
+            "name": name,
+            "count": len(members),
+            "total_ms": round(float(durations.sum()), 1),
+            "avg_ms": round(float(durations.mean()), 1),
+            "p95_ms": round(float(np.percentile(durations, 95)), 1),
+            "input_tokens": sum(a.get('input_tokens', 0) for a in attributes),
+            "output_tokens": sum(a.get('output_tokens', 0) for a in attributes),
+            "cost_usd": round(sum(a.get('cost_usd') or 0.0 for a in attributes), 6),
+            "retries": sum(a.get('retries', 0) for a in attributes),
+            "errors": sum(1 for s in members if s['error'])
+        })
+    return sorted(rows, key=lambda row: -row['total_ms'])
+
+
+def recent_actions(limit: int = 10) -> List[Dict]:
+    """
+    Latest root spans with how their time splits across direct children
+
+    Children can overlap (e.g. concurrent prefetches), so their shares may
+    add up to more than 100%.
+    """
+    spans = get_spans()
+    children: Dict[str, List[Dict]] = {}
+    for s in spans:
+        if s['parent_id']:
+            children.setdefault(s['parent_id'], []).append(s)
+
+    roots = [s for s in spans if s['parent_id'] is None][-limit:]
+    actions = []
+    for root in reversed(roots):
+        duration = root['duration_ms'] or 0.0
+        trace = [s for s in spans if s['trace_id'] == root['trace_id']]
+        llm = [s for s in trace if s['kind'] == 'llm']
+        stage_ms: Dict[str, float] = {}
+        for child in children.get(root['span_id'], []):
+            stage_ms[child['name']] = stage_ms.get(child['name'], 0.0) + (child['duration_ms'] or 0.0)
+        actions.append({
+            "action": root['name'],
+            "trace_id": root['trace_id'],
+            "duration_ms": round(duration, 1),
+            "llm_calls": len(llm),
+            "llm_ms": round(sum(s['duration_ms'] or 0.0 for s in llm), 1),
+            "tokens": sum(s['attributes'].get('input_tokens', 0) + s['attributes'].get('output_tokens', 0) for s in llm),
+            "error": root['error'],
+            "stages": {
+                name: f"{ms:.0f} ms ({ms / duration:.0%})" if duration else f"{ms:.0f} ms"
+                for name, ms in stage_ms.items()
+            }
+        })
+    return actions
@@ -0,0 +1,292 @@
+import argparse
+import json
+import os
+import re
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional
+
+from backend.output_parser import EXTRACTED_QUESTION_SCHEMA, parse_structured
+from backend.structured_data import DATA_DIR, STRUCTURED_DATA_WORKERS, invoke_bedrock
+
+# Upper bound on transcript characters per extraction prompt
+TRANSCRIPT_CHUNK_MAX_CHARS = int(os.environ.get('TRANSCRIPT_CHUNK_MAX_CHARS', '2500'))
+# Transcript entries repeated at the start of the next chunk, so questions cut at a boundary survive
+TRANSCRIPT_CHUNK_OVERLAP = int(os.environ.get('TRANSCRIPT_CHUNK_OVERLAP', '3'))
+# Pause between two entries (seconds) that counts as a good place to cut
+TRANSCRIPT_GAP_SECONDS = float(os.environ.get('TRANSCRIPT_GAP_SECONDS', '1.5'))
+
+# Section announcements such as "問題1" or "もんだい２" in the transcript
+SECTION_MARKER = re.compile(r'(?:問題|もんだい)\s*([1-3１-３])')
+# Preferred places to split an entry that is longer than a whole chunk
+SENTENCE_END = re.compile(r'[。！？!?]')
+
+
+def load_transcript_entries(path: str) -> List[Dict]:
+    """
+    Load transcript entries, preferring timed segments
+
+    A .jsonl file (one {"text", "start", "duration"} object per line, as
+    written by YouTubeTranscriptDownloader) keeps timing information. For a
+    plain .txt file the timed .jsonl next to it is used when present;
+    otherwise every non-empty line becomes an entry without timing.
+
+    Args:
+        path (str): Transcript .txt or .jsonl file
+
+    Returns:
+        List[Dict]: Entries with "text" and, when known, "start" and "duration"
+    """
+    base, ext = os.path.splitext(path)
+    jsonl_path = path if ext == '.jsonl' else f"{base}.jsonl"
+    if os.path.exists(jsonl_path):
+        with open(jsonl_path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    with open(path, 'r', encoding='utf-8') as f:
+        return [{"text": line.strip()} for line in f if line.strip()]
+
+
+def _gap_after(entries: List[Dict], i: int) -> float:
+    """Silence between entry i and the next one, 0 when timing is unknown"""
+    if i + 1 >= len(entries):
+        return 0.0
+    current, following = entries[i], entries[i + 1]
+    if current.get('start') is None or following.get('start') is None:
+        return 0.0
+    return following['start'] - (current['start'] + current.get('duration', 0.0))
+
+
+def split_long_entries(entries: List[Dict], max_chars: int) -> List[Dict]:
+    """
+    Split entries longer than max_chars into pieces that fit
+
+    Pieces end at the last sentence end that fits, or at max_chars when
+    there is none. Timed entries share their duration out by characters.
+    """
+    result = []
+    for entry in entries:
+        text = entry['text']
+        if len(text) <= max_chars:
+            result.append(entry)
+            continue
+
+        offset = 0
+        while offset < len(text):
+            end = min(offset + max_chars, len(text))
+            if end < len(text):
+                ends = [match.end() for match in SENTENCE_END.finditer(text, offset, end)]
+                end = ends[-1] if ends else end
+            piece = dict(entry, text=text[offset:end])
+            if entry.get('start') is not None:
+                duration = entry.get('duration', 0.0)
+                piece['start'] = entry['start'] + duration * offset / len(text)
+                piece['duration'] = duration * (end - offset) / len(text)
+            result.append(piece)
+            offset = end
+    return result
+
+
+def chunk_entries(entries: List[Dict], max_chars: int = TRANSCRIPT_CHUNK_MAX_CHARS,
+                  gap_seconds: float = TRANSCRIPT_GAP_SECONDS,
+                  overlap: int = TRANSCRIPT_CHUNK_OVERLAP) -> List[Dict]:
+    """
+    Split transcript entries into chunks of at most max_chars characters
+
+    When a chunk fills up it is cut at the longest pause (at least
+    gap_seconds) in its second half, which is usually the silence between
+    two questions; without timing it is cut where it is full. The last
+    overlap entries of a chunk are repeated at the start of the next one.
+    Entries longer than max_chars are split first, so the bound always holds.
+
+    Returns:
+        List[Dict]: Chunks with "index", "start", "end" and "text"
+    """
+    entries = split_long_entries(entries, max(1, max_chars))
+    chunks = []
+    begin = 0
+    while begin < len(entries):
+        # Grow the chunk until the next entry would not fit
+        end = begin
+        size = 0
+        while end < len(entries) and (end == begin or size + len(entries[end]['text']) + 1 <= max_chars):
+            size += len(entries[end]['text']) + 1
+            end += 1
+
+        if end < len(entries):
+            # Prefer cutting at the longest long-enough pause in the second half
+            middle = begin + (end - begin) // 2
+            gaps = [(_gap_after(entries, i), i) for i in range(middle, end - 1)]
+            best_gap, best_index = max(gaps, default=(0.0, None))
+            if best_index is not None and best_gap >= gap_seconds:
+                end = best_index + 1
+
+        selected = entries[begin:end]
+        chunks.append({
+            "index": len(chunks),
+            "start": selected[0].get('start'),
+            "end": (selected[-1]['start'] + selected[-1].get('duration', 0.0))
+            if selected[-1].get('start') is not None else None,
+            "text": "\n".join(entry['text'] for entry in selected)
+        })
+
+        if end >= len(entries):
+            break
+        # Step back for the overlap, but always make progress
+        begin = max(end - overlap, begin + 1)
+    return chunks
+
+
+def build_chunk_prompt(chunk: Dict, section_hint: Optional[int]) -> str:
+    hint = f"The excerpt most likely continues section {section_hint}." if section_hint else ""
+    return f"""
+        The following is an excerpt from a JLPT listening test transcript. Extract every complete question in it,
+        ignoring the test introduction, outro and any question that is cut off at the start or end of the excerpt.
+        {hint}
+
+        {chunk['text']}
+
+        Respond with only a JSON array, one object per question:
+        [{{"section": <1, 2 or 3, or null if unknown>, "introduction": "<introduction text>",
+          "conversation": "<conversation text>", "question": "<question text>"}}]
+
+        Ensure that the 'question' part is not empty and contains the actual question being asked.
+        Respond with [] if the excerpt contains no complete question.
+        """
+
+
+def _section_hint(chunk: Dict) -> Optional[int]:
+    """Last section number announced in the chunk, if any"""
+    markers = SECTION_MARKER.findall(chunk['text'])
+    return int(unicodedata.normalize('NFKC', markers[-1])) if markers else None
+
+
+def extract_chunk(chunk: Dict, section_hint: Optional[int] = None, bedrock_client=None) -> List[Dict]:
+    """Extract the questions of one chunk; each gets the chunk index attached"""
+    response = invoke_bedrock(build_chunk_prompt(chunk, section_hint), bedrock_client=bedrock_client)
+    questions = parse_structured(response, EXTRACTED_QUESTION_SCHEMA, "transcript_chunker", many=True) or []
+    for question in questions:
+        question['chunk'] = chunk['index']
+    return questions
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r'[\s、。，．,.!?！？「」]', '', unicodedata.normalize('NFKC', text or ''))
+
+
+def _is_duplicate(a: Dict, b: Dict) -> bool:
+    """Same question extracted twice, e.g. from two overlapping chunks"""
+    conv_a, conv_b = _normalize(a['conversation']), _normalize(b['conversation'])
+    if _normalize(a['question']) != _normalize(b['question']) and not (conv_a and conv_a == conv_b):
+        return False
+    if conv_a in conv_b or conv_b in conv_a:
+        return True
+    return SequenceMatcher(None, conv_a, conv_b).ratio() >= 0.8
+
+
+def merge_questions(chunk_results: List[List[Dict]]) -> Dict[int, List[Dict]]:
+    """
+    Merge per-chunk extractions into questions per section
+
+    Results are taken in chunk order. Duplicates from overlapping chunks are
+    collapsed, keeping the longer conversation. Questions without a section
+    inherit the section of the question before them (section 1 at the start).
+
+    Returns:
+        Dict[int, List[Dict]]: Questions for sections 1-3
+    """
+    merged: List[Dict] = []
+    for questions in chunk_results:
+        for question in questions:
+            # Overlap only ever repeats questions from the chunk just before
+            duplicate = next((kept for kept in reversed(merged[-10:]) if _is_duplicate(kept, question)), None)
+            if duplicate is None:
+                merged.append(question)
+            elif len(question['conversation']) > len(duplicate['conversation']):
+                duplicate.update({k: v for k, v in question.items() if k != 'section' or v})
+
+    sections = {1: [], 2: [], 3: []}
+    current = 1
+    for question in merged:
+        try:
+            section = int(question.get('section') or current)
+        except (TypeError, ValueError):
+            section = current
+        current = section if section in sections else current
+        sections[current].append({
+            'introduction': question.get('introduction', ''),
+            'conversation': question['conversation'],
+            'question': question['question']
+        })
+    return sections
+
+
+def structure_transcript_chunked(transcript_path: str, output_base_path: str,
+                                 max_workers: int = STRUCTURED_DATA_WORKERS,
+                                 max_chars: int = TRANSCRIPT_CHUNK_MAX_CHARS, bedrock_client=None) -> List[str]:
+    """
+    Chunked (map-reduce) alternative to structure_jlpt_listening_data
+
+    Each chunk is extracted in parallel with a bounded prompt size, so the
+    cost of a call does not grow with the video length. Results are merged
+    and written to {output_base_path}_section_{n}.json.
+
+    Returns:
+        List[str]: Paths of the written section files
+    """
+    entries = load_transcript_entries(transcript_path)
+    chunks = chunk_entries(entries, max_chars=max_chars)
+
+    # Section announcements are found locally so each chunk can be told where it is
+    hints = []
+    current = None
+    for chunk in chunks:
+        hints.append(current)
+        current = _section_hint(chunk) or current
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chunk-extract") as executor:
+        futures = [
+            executor.submit(extract_chunk, chunk, hint, bedrock_client)
+            for chunk, hint in zip(chunks, hints)
+        ]
+        chunk_results = []
+        for chunk, future in zip(chunks, futures):
+            try:
+                chunk_results.append(future.result())
+            except Exception as e:
+                print(f"Error extracting chunk {chunk['index']}: {str(e)}")
+                chunk_results.append([])
+
+    sections = merge_questions(chunk_results)
+    print(f"Extracted {sum(len(q) for q in sections.values())} questions from {len(chunks)} chunks "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_base_path)), exist_ok=True)
+    output_paths = []
+    for section, questions in sections.items():
+        output_path = f"{output_base_path}_section_{section}.json"
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump({"section": section, "questions": questions}, f, ensure_ascii=False, indent=2)
+        output_paths.append(output_path)
+    return output_paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunked extraction of JLPT listening questions from a transcript")
+    parser.add_argument("transcript", help="Transcript .txt or timed .jsonl file")
+    parser.add_argument("--output", default=os.path.join(DATA_DIR, "questions", "structured_questions"),
+                        help="Output base path")
+    parser.add_argument("--workers", type=int, default=STRUCTURED_DATA_WORKERS, help="Concurrent Bedrock requests")
+    parser.add_argument("--max-chars", type=int, default=TRANSCRIPT_CHUNK_MAX_CHARS,
+                        help="Maximum transcript characters per prompt")
+    args = parser.parse_args()
+
+    for path in structure_transcript_chunked(args.transcript, args.output, args.workers, args.max_chars):
+        print(f"Saved {path}")
+
+
+if __name__ == "__main__":
+    main()
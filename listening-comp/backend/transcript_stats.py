@@ -0,0 +1,159 @@
+"""
+Transcript statistics: script breakdown, line/segment counts and JLPT kanji coverage.
+
+Characters are classified in one pass over a NumPy codepoint array
+(np.searchsorted against the edges of the script ranges), so a transcript
+of several hundred KB takes milliseconds. Results are cached per content
+hash, because Streamlit reruns the page, and so asks for the same
+transcript's stats, on every interaction.
+
+    python -m backend.transcript_stats transcripts/VIDEO_ID.txt
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict
+
+import numpy as np
+
+# Transcripts whose stats are kept in memory
+TRANSCRIPT_STATS_CACHE_SIZE = 32
+
+SCRIPTS = ("hiragana", "katakana", "kanji", "latin", "other")
+_SPACE = len(SCRIPTS)
+
+# (first, last, script index) codepoint ranges, sorted and non-overlapping; anything else is "other"
+_RANGES = [
+    (0x0009, 0x000D, _SPACE),
+    (0x0020, 0x0020, _SPACE),
+    (0x0041, 0x005A, 3),
+    (0x0061, 0x007A, 3),
+    (0x00C0, 0x024F, 3),  # Accented Latin
+    (0x3000, 0x3000, _SPACE),  # Ideographic space
+    (0x3040, 0x309F, 0),
+    (0x30A0, 0x30FF, 1),
+    (0x31F0, 0x31FF, 1),  # Katakana phonetic extensions
+    (0x3400, 0x4DBF, 2),  # CJK extension A
+    (0x4E00, 0x9FFF, 2),
+    (0xF900, 0xFAFF, 2),  # CJK compatibility ideographs
+    (0xFF21, 0xFF3A, 3),  # Full-width Latin
+    (0xFF41, 0xFF5A, 3),
+    (0xFF66, 0xFF9F, 1)  # Half-width katakana
+]
+_EDGES = np.array([edge for first, last, _ in _RANGES for edge in (first, last + 1)], dtype=np.uint32)
+_RANGE_SCRIPT = np.array([script for _, _, script in _RANGES], dtype=np.int64)
+
+# Sentence-like segments: text between sentence-final punctuation or line breaks
+SEGMENT = re.compile(r'[^。！？!?\n]+')
+
+# There is no official kanji list since the 2010 JLPT revision; these are the commonly used study lists
+N5_KANJI = frozenset(
+    "一二三四五六七八九十百千万円年月日火水木金土曜本人今時半分上下左右中外前後午先生学校友何毎週名"
+    "男女子目耳口手足力気天空雨山川田花食飲言話語読書聞見行来出入休会買長高安小大少多白国電車駅道"
+    "社店父母東西南北間"
+)
+N4_KANJI = frozenset(
+    "悪以意医員院運映英遠屋音歌夏家画海回開界楽館漢寒顔帰起究急牛去強教京業近銀区計兄軽犬研県建験"
+    "元工広考光好合黒菜作産紙思姉止市仕死使始試私字自事持室質写者借弱首主秋集習終住重春所暑場乗色"
+    "森心親真進図青正声世赤夕切説洗早走送族村体太待貸台代題短知地池茶着昼注町鳥朝通弟低転都度答冬"
+    "頭同動堂働特肉売発飯病品不風服物文別勉便歩方妹味民明門問夜野薬有用洋理旅料林"
+) - N5_KANJI
+JLPT_LEVELS = ("N5", "N4", "N3+")
+
+_cache: "OrderedDict[str, Dict]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _codepoints(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+
+
+def _script_indices(codepoints: np.ndarray) -> np.ndarray:
+    """Index into SCRIPTS (or _SPACE) per codepoint"""
+    bins = np.searchsorted(_EDGES, codepoints, side='right')
+    # An odd bin lies inside range (bin - 1) // 2, an even one between ranges
+    inside = (bins & 1).astype(bool)
+    indices = np.full(len(codepoints), SCRIPTS.index("other"), dtype=np.int64)
+    indices[inside] = _RANGE_SCRIPT[(bins[inside] - 1) // 2]
+    return indices
+
+
+def _kanji_levels(kanji: np.ndarray) -> Dict:
+    """Occurrences and distinct kanji per estimated JLPT level"""
+    levels = {level: {"unique": 0, "occurrences": 0} for level in JLPT_LEVELS}
+    codes, counts = np.unique(kanji, return_counts=True)
+    for code, count in zip(codes.tolist(), counts.tolist()):
+        char = chr(code)
+        level = "N5" if char in N5_KANJI else "N4" if char in N4_KANJI else "N3+"
+        levels[level]["unique"] += 1
+        levels[level]["occurrences"] += count
+
+    total = len(kanji)
+    for level in levels.values():
+        level["share"] = round(level["occurrences"] / total, 4) if total else 0.0
+    return {"unique": len(codes), "levels": levels}
+
+
+def compute_stats(text: str) -> Dict:
+    """
+    Statistics of a transcript (uncached)
+
+    Returns:
+        Dict: "total_chars", "japanese_chars", "scripts" (count and share of
+        non-whitespace characters per script), "lines", "non_empty_lines",
+        "segments" and "kanji" (distinct kanji and per-level coverage, where
+        kanji outside the N5/N4 lists count as "N3+")
+    """
+    codepoints = _codepoints(text)
+    indices = _script_indices(codepoints)
+    counts = np.bincount(indices, minlength=len(SCRIPTS) + 1)
+    visible = int(counts[:len(SCRIPTS)].sum())
+
+    lines = text.split('\n')
+    return {
+        "total_chars": len(text),
+        "japanese_chars": int(counts[:3].sum()),
+        "scripts": {
+            script: {
+                "count": int(counts[i]),
+                "share": round(int(counts[i]) / visible, 4) if visible else 0.0
+            }
+            for i, script in enumerate(SCRIPTS)
+        },
+        "lines": len(lines),
+        "non_empty_lines": sum(1 for line in lines if line.strip()),
+        "segments": sum(1 for segment in SEGMENT.findall(text) if segment.strip()),
+        "kanji": _kanji_levels(codepoints[indices == SCRIPTS.index("kanji")])
+    }
+
+
+def transcript_stats(text: str) -> Dict:
+    """compute_stats, cached per transcript content"""
+    key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    stats = compute_stats(text)
+    with _cache_lock:
+        _cache[key] = stats
+        while len(_cache) > TRANSCRIPT_STATS_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print script breakdown and JLPT kanji coverage of a transcript")
+    parser.add_argument("path", help="Transcript text file")
+    args = parser.parse_args()
+
+    with open(args.path, 'r', encoding='utf-8') as f:
+        print(json.dumps(transcript_stats(f.read()), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import threading
+import unicodedata
+import uuid
+from typing import Dict, Optional
+
+# Disk budget for cached TTS segments
+TTS_CACHE_MAX_MB = int(os.environ.get('TTS_CACHE_MAX_MB', '200'))
+
+
+class TTSSegmentCache:
+    """
+    Content-addressed, size-bounded cache of synthesized speech segments.
+
+    Each entry is a file named by the hash of (voice, engine, sample rate,
+    normalized text). Hits refresh the file's mtime, and when the directory
+    grows past max_bytes the least recently used files are evicted. Because
+    state lives on disk, every AudioGenerator (and process) shares the cache.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        """
+        Initialize the cache
+
+        Args:
+            directory (str): Folder holding cached segments
+            max_bytes (int): Size budget before LRU eviction
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._size_bytes = sum(
+            entry.stat().st_size for entry in os.scandir(directory) if entry.is_file()
+        )
+        self._hits = 0
+        self._misses = 0
+        self._bytes_saved = 0
+        self._evictions = 0
+
+    @staticmethod
+    def make_key(voice: str, engine: str, text: str, sample_rate: int) -> str:
+        """Hash of voice, engine, sample rate and whitespace/width-normalized text"""
+        normalized = " ".join(unicodedata.normalize("NFKC", text).split())
+        payload = "\x1f".join([voice, engine, str(sample_rate), normalized])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pcm")
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached audio bytes, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Mark as recently used for LRU eviction
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._misses += 1
+            return None
+
+        with self._lock:
+            self._hits += 1
+            self._bytes_saved += len(data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Store audio bytes under key, evicting old entries if over budget"""
+        path = self._path(key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            existed = os.path.exists(path)
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            # Atomic so concurrent readers never see a partial segment
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error writing TTS cache entry: {str(e)}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            if not existed:
+                self._size_bytes += len(data)
+            if self._size_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until 90% of the budget is free"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".pcm"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+
+        self._size_bytes = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in entries:
+            if self._size_bytes <= target:
+                break
+            try:
+                os.remove(path)
+                self._size_bytes -= size
+                self._evictions += 1
+            except OSError:
+                pass
+
+    def stats(self) -> Dict:
+        """Hit rate, bytes saved and current size"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "bytes_saved": self._bytes_saved,
+                "size_bytes": self._size_bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self._evictions
+            }
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_segment_cache() -> TTSSegmentCache:
+    """Process-wide cache under listening-comp/cache/tts"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+            _shared_cache = TTSSegmentCache(
+                os.path.join(project_root, "cache", "tts"),
+                TTS_CACHE_MAX_MB * 1024 * 1024
+            )
+        return _shared_cache
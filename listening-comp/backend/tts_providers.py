@@ -0,0 +1,176 @@
+import io
+import json
+import os
+import threading
+import wave
+from typing import Dict, Optional
+
+import numpy as np
+
+# Which TTS backend AudioGenerator uses: "polly" or "opea"
+TTS_PROVIDER = os.environ.get('TTS_PROVIDER', 'polly')
+# Local OPEA tts microservice (see opea-comps/mega-service-new)
+OPEA_TTS_ENDPOINT = os.environ.get('OPEA_TTS_ENDPOINT', 'http://localhost:9088')
+# Sample rate of the PCM returned by every provider
+SAMPLE_RATE = 16000
+
+
+class TTSProvider:
+    """
+    Text-to-speech backend used by AudioGenerator.
+
+    Providers return signed 16-bit little-endian mono PCM at SAMPLE_RATE, so
+    segments from any provider can be concatenated and cached the same way.
+    """
+
+    # Engine name, part of the TTS segment cache key
+    name = "base"
+
+    @property
+    def voices(self) -> Dict[str, str]:
+        """Voice ids for the "male", "female" and "announcer" roles"""
+        raise NotImplementedError
+
+    def synthesize(self, text: str, voice_id: str) -> bytes:
+        """Synthesize text and return PCM bytes"""
+        raise NotImplementedError
+
+
+class PollyTTSProvider(TTSProvider):
+    """Amazon Polly standard Japanese voices"""
+
+    name = "polly-standard"
+
+    def __init__(self, polly_client=None):
+        """
+        Initialize the provider
+
+        Args:
+            polly_client (optional): Existing Polly client; one is created on first use otherwise
+        """
+        self._client = polly_client
+        self._voices: Optional[Dict[str, str]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from backend import resources
+                    self._client = resources.get_polly_client()
+        return self._client
+
+    @property
+    def voices(self) -> Dict[str, str]:
+        """Preferred voices, verified against describe_voices on first use"""
+        if self._voices is not None:
+            return self._voices
+
+        with self._lock:
+            if self._voices is None:
+                voices = {"male": "Takumi", "female": "Mizuki", "announcer": "Takumi"}
+                try:
+                    response = self.client.describe_voices(LanguageCode='ja-JP')
+                    available_voices = {voice['Id'] for voice in response['Voices']}
+                    print(f"Available Japanese voices: {available_voices}")
+
+                    # Default to first available voice if preferred voices not available
+                    if available_voices and not any(voice in available_voices for voice in voices.values()):
+                        default_voice = next(iter(available_voices))
+                        voices = {role: default_voice for role in voices}
+                except Exception as e:
+                    print(f"Error verifying voices: {str(e)}")
+                self._voices = voices
+        return self._voices
+
+    def synthesize(self, text: str, voice_id: str) -> bytes:
+        # Check if voice_id is available and use Japanese voice if not
+        if voice_id not in ["Takumi", "Mizuki"]:
+            voice_id = self.voices["male"] if voice_id in ["Matthew", "Justin"] else self.voices["female"]
+            print(f"Substituting non-Japanese voice with {voice_id}")
+
+        response = self.client.synthesize_speech(
+            Text=text,
+            OutputFormat='pcm',
+            SampleRate=str(SAMPLE_RATE),
+            VoiceId=voice_id,
+            LanguageCode='ja-JP',
+            Engine='standard'  # Use standard engine for Japanese voices
+        )
+        return response['AudioStream'].read()
+
+
+class OpeaTTSProvider(TTSProvider):
+    """Local OPEA tts microservice (SpeechT5 or GPT-SoVITS behind /v1/audio/speech)"""
+
+    name = "opea"
+
+    def __init__(self, endpoint: str = OPEA_TTS_ENDPOINT, timeout: float = 60.0, max_connections: int = 8):
+        """
+        Initialize the provider
+
+        Args:
+            endpoint (str): Base URL of the tts service
+            timeout (float): Per-request timeout in seconds
+            max_connections (int): Kept-alive connections to the service
+        """
+        import urllib3
+        self.endpoint = endpoint.rstrip('/')
+        self.timeout = timeout
+        # One pool for all requests so connections are reused
+        self._http = urllib3.PoolManager(maxsize=max_connections, block=True)
+
+    @property
+    def voices(self) -> Dict[str, str]:
+        # The OPEA service only distinguishes its built-in voices; no discovery call needed
+        return {"male": "male", "female": "default", "announcer": "male"}
+
+    def synthesize(self, text: str, voice_id: str) -> bytes:
+        response = self._http.request(
+            'POST',
+            f"{self.endpoint}/v1/audio/speech",
+            body=json.dumps({"input": text, "voice": voice_id, "response_format": "wav"}).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            timeout=self.timeout
+        )
+        if response.status != 200:
+            raise RuntimeError(f"TTS service returned {response.status}: {response.data[:200]!r}")
+        return _wav_to_pcm(response.data)
+
+
+def _wav_to_pcm(data: bytes) -> bytes:
+    """Convert a WAV payload to 16-bit mono PCM at SAMPLE_RATE"""
+    with wave.open(io.BytesIO(data), 'rb') as f:
+        channels = f.getnchannels()
+        sample_width = f.getsampwidth()
+        rate = f.getframerate()
+        frames = f.readframes(f.getnframes())
+
+    if sample_width != 2:
+        raise ValueError(f"Unsupported WAV sample width: {sample_width * 8} bit")
+
+    samples = np.frombuffer(frames, dtype='<i2')
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    if rate != SAMPLE_RATE and len(samples):
+        # Linear resampling is plenty for speech
+        positions = np.arange(0, len(samples), rate / SAMPLE_RATE)
+        samples = np.interp(positions, np.arange(len(samples)), samples)
+    return np.asarray(samples).astype('<i2').tobytes()
+
+
+def create_tts_provider(name: Optional[str] = None, polly_client=None) -> TTSProvider:
+    """
+    Build the configured TTS provider
+
+    Args:
+        name (str, optional): "polly" or "opea", defaults to TTS_PROVIDER
+        polly_client (optional): Client to reuse for the Polly provider
+    """
+    name = name or TTS_PROVIDER
+    if name == 'polly':
+        return PollyTTSProvider(polly_client)
+    if name == 'opea':
+        return OpeaTTSProvider()
+    raise ValueError(f"Unknown TTS provider: {name}")
@@ -0,0 +1,269 @@
+import io
+import json
+import os
+import threading
+from typing import Dict, List
+
+import numpy as np
+
+
+class NumpyVectorIndex:
+    """
+    Brute-force cosine similarity index backed by a memory-mapped .npy file.
+
+    Embeddings are L2-normalized and stored as float32 rows, so a query is a
+    single matrix-vector product followed by argpartition for the top-k.
+    Ids and metadata live in a JSONL file with one line per row.
+    """
+
+    def __init__(self, directory: str, name: str):
+        """
+        Open (or lazily create) an index stored under directory
+
+        Args:
+            directory (str): Folder holding the index files
+            name (str): Index name, used as the file prefix
+        """
+        self.name = name
+        self.embeddings_path = os.path.join(directory, f"{name}.npy")
+        self.metadata_path = os.path.join(directory, f"{name}.jsonl")
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._ids: List[str] = []
+        self._metadatas: List[Dict] = []
+        self._positions: Dict[str, int] = {}
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _load(self):
+        """Memory-map existing embeddings and read the id/metadata rows"""
+        if not os.path.exists(self.embeddings_path):
+            return
+
+        # A header that claims more rows than the file holds (left by an interrupted
+        # append) must not be memory-mapped: numpy would pad it with zero rows
+        (rows, dim), _, data_offset = self._read_header()
+        salvaged = os.path.getsize(self.embeddings_path) < data_offset + rows * dim * 4
+        if salvaged:
+            self._matrix = self._salvage_rows()
+        else:
+            self._matrix = np.load(self.embeddings_path, mmap_mode='r+')
+        if os.path.exists(self.metadata_path):
+            with open(self.metadata_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        row = json.loads(line)
+                        self._positions[row['id']] = len(self._ids)
+                        self._ids.append(row['id'])
+                        self._metadatas.append(row['metadata'])
+
+        # A crash between the two writes can leave extra embedding rows
+        if salvaged or self._matrix.shape[0] != len(self._ids):
+            rows = min(self._matrix.shape[0], len(self._ids))
+            print(f"Index {self.name} is inconsistent, truncating to {rows} rows")
+            self._rewrite(np.array(self._matrix[:rows]), self._ids[:rows], self._metadatas[:rows])
+
+    def _salvage_rows(self) -> np.ndarray:
+        """Rows fully present in a .npy file whose header overstates its length"""
+        (_, dim), _, data_offset = self._read_header()
+        rows = max(0, (os.path.getsize(self.embeddings_path) - data_offset) // (dim * 4))
+        with open(self.embeddings_path, 'rb') as f:
+            f.seek(data_offset)
+            matrix = np.frombuffer(f.read(rows * dim * 4), dtype=np.float32).reshape(rows, dim)
+        print(f"Index {self.name} has a truncated embeddings file, keeping {rows} rows")
+        return matrix
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """L2-normalize rows, leaving zero vectors untouched"""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(np.float32)
+
+    def _rewrite(self, matrix: np.ndarray, ids: List[str], metadatas: List[Dict]):
+        """Write the full index from scratch and re-open the memory map"""
+        self._matrix = None
+        np.save(self.embeddings_path, matrix)
+        self._write_metadata(ids, metadatas, mode='w')
+
+        self._ids = list(ids)
+        self._metadatas = list(metadatas)
+        self._positions = {row_id: i for i, row_id in enumerate(self._ids)}
+        self._matrix = np.load(self.embeddings_path, mmap_mode='r+')
+
+    def _write_metadata(self, ids: List[str], metadatas: List[Dict], mode: str):
+        """Write (mode='w') or append (mode='a') id/metadata rows"""
+        with open(self.metadata_path, mode, encoding='utf-8') as f:
+            for row_id, metadata in zip(ids, metadatas):
+                f.write(json.dumps({"id": row_id, "metadata": metadata}, ensure_ascii=False) + "\n")
+
+    def _read_header(self):
+        """(shape, header writer, data offset) of the .npy file on disk"""
+        with open(self.embeddings_path, 'rb') as f:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, _, _ = np.lib.format.read_array_header_1_0(f)
+                write_header = np.lib.format.write_array_header_1_0
+            else:
+                shape, _, _ = np.lib.format.read_array_header_2_0(f)
+                write_header = np.lib.format.write_array_header_2_0
+            return shape, write_header, f.tell()
+
+    def _append_rows(self, rows: np.ndarray):
+        """
+        Append rows to the .npy file in place.
+
+        The rows are written and flushed before the header is updated with
+        the new shape, so a crash in between leaves a file whose header
+        still describes only the old rows. When the new header no longer
+        fits the old one's padding, a complete new file is written next to
+        it and swapped in atomically.
+        """
+        old_rows = self._matrix.shape[0]
+        dim = self._matrix.shape[1]
+        header = {'descr': np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+                  'fortran_order': False,
+                  'shape': (old_rows + rows.shape[0], dim)}
+
+        _, write_header, data_offset = self._read_header()
+        header_bytes = io.BytesIO()
+        write_header(header_bytes, header)
+
+        if header_bytes.tell() != data_offset:
+            # Header grew past its padding: read the rows before anything is written
+            existing = np.array(self._matrix)
+            self._matrix = None
+            temp_path = f"{self.embeddings_path}.tmp"
+            with open(temp_path, 'wb') as f:
+                np.lib.format.write_array(f, np.vstack([existing, rows]))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.embeddings_path)
+        else:
+            self._matrix = None
+            with open(self.embeddings_path, 'r+b') as f:
+                f.seek(data_offset + old_rows * dim * 4)
+                f.write(rows.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+                f.seek(0)
+                f.write(header_bytes.getvalue())
+
+        self._matrix = np.load(self.embeddings_path, mmap_mode='r+')
+
+    def add(self, ids: List[str], embeddings: List[List[float]], metadatas: List[Dict]):
+        """
+        Insert or update rows
+
+        Args:
+            ids (List[str]): Row ids; existing ids are overwritten in place,
+                and of an id repeated within the batch the last row wins
+            embeddings (List[List[float]]): Raw embedding vectors
+            metadatas (List[Dict]): Metadata stored with each row
+        """
+        if not ids:
+            return
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        last = {row_id: i for i, row_id in enumerate(ids)}
+        batch = [(row_id, vectors[i], metadatas[i]) for row_id, i in last.items()]
+
+        with self._lock:
+            new_ids, new_rows, new_metadatas = [], [], []
+            updated = False
+            for row_id, vector, metadata in batch:
+                if row_id in self._positions:
+                    position = self._positions[row_id]
+                    self._matrix[position] = vector
+                    self._metadatas[position] = metadata
+                    updated = True
+                else:
+                    self._positions[row_id] = len(self._ids) + len(new_ids)
+                    new_ids.append(row_id)
+                    new_rows.append(vector)
+                    new_metadatas.append(metadata)
+
+            if self._matrix is None:
+                self._rewrite(np.vstack(new_rows), new_ids, new_metadatas)
+                return
+
+            if new_rows:
+                self._append_rows(np.vstack(new_rows))
+                self._ids.extend(new_ids)
+                self._metadatas.extend(new_metadatas)
+
+            if updated:
+                # Updated vectors are already written through the memory map
+                self._matrix.flush()
+                self._write_metadata(self._ids, self._metadatas, mode='w')
+            elif new_rows:
+                self._write_metadata(new_ids, new_metadatas, mode='a')
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], metadatas: List[Dict]):
+        """Same as add(), which already overwrites existing ids (mirrors Chroma's upsert)"""
+        self.add(ids, embeddings, metadatas)
+
+    def get(self) -> Dict:
+        """Return all ids and metadatas, in the same shape as a Chroma get()"""
+        with self._lock:
+            return {'ids': list(self._ids), 'metadatas': list(self._metadatas)}
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 5) -> Dict:
+        """
+        Find the nearest rows by cosine similarity
+
+        Args:
+            query_embeddings (List[List[float]]): Query vectors
+            n_results (int): Number of results per query
+
+        Returns:
+            Dict: Chroma-shaped result with ids, metadatas and cosine distances
+        """
+        result = {'ids': [], 'metadatas': [], 'distances': []}
+        queries = self._normalize(np.asarray(query_embeddings, dtype=np.float32))
+
+        # add() re-opens the memory map and grows the rows under the same lock
+        with self._lock:
+            for query in queries:
+                if self._matrix is None or len(self._ids) == 0:
+                    result['ids'].append([])
+                    result['metadatas'].append([])
+                    result['distances'].append([])
+                    continue
+
+                scores = self._matrix @ query
+                k = min(n_results, scores.shape[0])
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top])]
+
+                result['ids'].append([self._ids[i] for i in top])
+                result['metadatas'].append([self._metadatas[i] for i in top])
+                result['distances'].append([float(1.0 - scores[i]) for i in top])
+
+        return result
+
+
+class NumpyIndexClient:
+    """Minimal stand-in for chromadb.PersistentClient backed by NumpyVectorIndex"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._indexes: Dict[str, NumpyVectorIndex] = {}
+        self._lock = threading.Lock()
+
+    def _exists(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self.path, f"{name}.npy"))
+
+    def get_or_create_collection(self, name: str) -> NumpyVectorIndex:
+        with self._lock:
+            if name not in self._indexes:
+                self._indexes[name] = NumpyVectorIndex(self.path, name)
+            return self._indexes[name]
+
+    def get_collection(self, name: str) -> NumpyVectorIndex:
+        if name not in self._indexes and not self._exists(name):
+            raise ValueError(f"Collection {name} does not exist.")
+        return self.get_or_create_collection(name)
@@ -1,26 +1,48 @@
-import boto3
-import chromadb
 import json
 import os
-from typing import List, Dict
+import threading
+from collections import deque
+from typing import List, Dict, Optional
+from backend import resources
+from backend.output_parser import EXTRACTED_QUESTION_SCHEMA, parse_structured
+from backend.question_history import question_hash
+from backend.vector_index import NumpyIndexClient
+
+# Vector index backend: "chroma" (default) or "numpy" for small question banks
+VECTOR_STORE_BACKEND = os.environ.get('VECTOR_STORE_BACKEND', 'chroma')
+# Recent store_questions calls remembered for writes_since
+WRITE_LOG_SIZE = 256
 
 class JLPTQuestionVectorStore:
-    def __init__(self):
+    def __init__(self, backend: Optional[str] = None, storage_path: Optional[str] = None, bedrock_client=None):
         """
         Initialize the vector store for JLPT listening test questions
+        
+        Args:
+            backend (str, optional): "chroma" or "numpy", defaults to VECTOR_STORE_BACKEND
+            storage_path (str, optional): Override for the index directory
+            bedrock_client (optional): Shared bedrock-runtime client to reuse
         """
-        # Always use backend/vector_storage
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        storage_path = os.path.join(current_dir, 'vector_storage')
+        self.backend = backend or VECTOR_STORE_BACKEND
+        if self.backend not in ('chroma', 'numpy'):
+            raise ValueError(f"Unknown vector store backend: {self.backend}")
+        
+        # Default to backend/vector_storage (numpy indexes go in a subfolder)
+        if storage_path is None:
+            current_dir = os.path.dirname(os.path.abspath(__file__))
+            storage_path = os.path.join(current_dir, 'vector_storage')
+            if self.backend == 'numpy':
+                storage_path = os.path.join(storage_path, 'numpy')
         
         # Initialize Bedrock client for embeddings
-        self.bedrock = boto3.client(
-            service_name='bedrock-runtime',
-            region_name='us-east-1'
-        )
+        self.bedrock = bedrock_client or resources.get_bedrock_client()
         
-        # Initialize ChromaDB client
-        self.chroma_client = chromadb.PersistentClient(path=storage_path)
+        # Initialize the index client; both expose the same collection API
+        if self.backend == 'numpy':
+            self.client = NumpyIndexClient(path=storage_path)
+        else:
+            import chromadb
+            self.client = chromadb.PersistentClient(path=storage_path)
         
         # Define collection names for each section
         self.section_collections = {
@@ -28,6 +50,12 @@ class JLPTQuestionVectorStore:
             2: "jlpt_section2_questions",
             3: "jlpt_section3_questions"
         }
+        
+        # Bumped on every write so derived indexes (e.g. HybridRetriever) know to update;
+        # the latest writes are kept so they can catch up without reloading everything
+        self.version = 0
+        self._writes = deque(maxlen=WRITE_LOG_SIZE)
+        self._writes_lock = threading.Lock()
     
     def _generate_embedding(self, text: str, model_id: str = 'amazon.titan-embed-text-v1') -> List[float]:
         """
@@ -50,47 +78,106 @@ class JLPTQuestionVectorStore:
         response_body = json.loads(response['body'].read())
         return response_body.get('embedding', [])
     
-    def store_questions(self, questions: List[Dict], section: int):
+    @staticmethod
+    def embedding_text(question: Dict) -> str:
+        """Convert question to a single string for embedding"""
+        return (
+            f"Introduction: {question.get('introduction', '')} "
+            f"Conversation: {question.get('conversation', '')} "
+            f"Question: {question.get('question', '')}"
+        )
+    
+    def store_questions(self, questions: List[Dict], section: int, ids: Optional[List[str]] = None,
+                        embeddings: Optional[List[List[float]]] = None):
         """
         Store questions in a section-specific collection
         
         Args:
             questions (List[Dict]): List of questions to store
             section (int): Section number (1, 2, or 3)
+            ids (List[str], optional): Collection ids, defaults to section{n}_{content hash[:16]}
+                (as the ingestion pipeline uses), so storing the same question again replaces it
+            embeddings (List[List[float]], optional): Precomputed embeddings, generated here otherwise
         """
         # Validate section
         if section not in self.section_collections:
             raise ValueError(f"Invalid section. Must be one of {list(self.section_collections.keys())}")
+        if not questions:
+            return
         
         # Get or create collection for the section
-        collection = self.chroma_client.get_or_create_collection(
+        collection = self.client.get_or_create_collection(
             name=self.section_collections[section]
         )
         
-        # Process and store questions
-        for i, question in enumerate(questions):
-            # Convert question to a single string for embedding
-            embedding_text = (
-                f"Introduction: {question.get('introduction', '')} "
-                f"Conversation: {question.get('conversation', '')} "
-                f"Question: {question.get('question', '')}"
-            )
-            
-            # Generate embedding
-            embedding = self._generate_embedding(embedding_text)
-            
-            # Store question with full metadata
-            collection.add(
-                ids=[f"section{section}_question_{i}"],
-                embeddings=[embedding],
-                metadatas=[{
-                    "full_question": json.dumps(question),
-                    "section": section,
-                    "introduction": question.get('introduction', ''),
-                    "conversation": question.get('conversation', ''),
-                    "question_text": question.get('question', '')
-                }]
-            )
+        ids = ids or [f"section{section}_{question_hash(question)[:16]}" for question in questions]
+        # An id repeated within the batch keeps its last question
+        last = {question_id: i for i, question_id in enumerate(ids)}
+        if len(last) < len(ids):
+            keep = sorted(last.values())
+            ids = [ids[i] for i in keep]
+            questions = [questions[i] for i in keep]
+            embeddings = [embeddings[i] for i in keep] if embeddings is not None else None
+        if embeddings is None:
+            embeddings = [self._generate_embedding(self.embedding_text(question)) for question in questions]
+        
+        # Store all questions with full metadata in one call; upsert so both backends
+        # replace an existing id (Chroma's add would silently keep the old question)
+        collection.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            metadatas=[{
+                "full_question": json.dumps(question),
+                "section": section,
+                "introduction": question.get('introduction', ''),
+                "conversation": question.get('conversation', ''),
+                "question_text": question.get('question', '')
+            } for question in questions]
+        )
+        with self._writes_lock:
+            self.version += 1
+            self._writes.append((self.version, [
+                {'id': question_id, 'section': section, 'metadata': question}
+                for question_id, question in zip(ids, questions)
+            ]))
+    
+    def writes_since(self, version: Optional[int]) -> Optional[List[Dict]]:
+        """
+        Entries stored after the given version, shaped like get_all_questions
+        
+        Returns None when that is unknown (the version is older than the
+        kept writes), in which case callers should reload everything.
+        """
+        with self._writes_lock:
+            if version is None or version > self.version:
+                return None
+            if version == self.version:
+                return []
+            if not self._writes or self._writes[0][0] > version + 1:
+                return None
+            return [entry for write_version, entries in self._writes if write_version > version for entry in entries]
+    
+    def get_all_questions(self, section: Optional[int] = None) -> List[Dict]:
+        """
+        Return every stored question
+        
+        Args:
+            section (int, optional): Only questions from this section
+        
+        Returns:
+            List[Dict]: Entries with id, section and the parsed question as metadata
+        """
+        sections = [section] if section else list(self.section_collections.keys())
+        questions = []
+        for section_num in sections:
+            collection = self.client.get_or_create_collection(name=self.section_collections[section_num])
+            stored = collection.get()
+            for question_id, metadata in zip(stored['ids'], stored['metadatas']):
+                question = metadata['full_question']
+                if isinstance(question, str):
+                    question = json.loads(question)
+                questions.append({'id': question_id, 'section': section_num, 'metadata': question})
+        return questions
     
     def query_similar_questions(
         self, 
@@ -122,7 +209,7 @@ class JLPTQuestionVectorStore:
         # Collect results from all specified collections
         all_results = []
         for collection_name in search_collections:
-            collection = self.chroma_client.get_collection(name=collection_name)
+            collection = self.client.get_collection(name=collection_name)
             
             # Perform similarity search
             results = collection.query(
@@ -152,7 +239,7 @@ class JLPTQuestionVectorStore:
         self, 
         original_question: Dict, 
         model_id: str = 'amazon.nova-micro-v1:0'
-    ) -> Dict:
+    ) -> Optional[Dict]:
         """
         Generate a derivative question using Amazon Bedrock
         
@@ -161,7 +248,7 @@ class JLPTQuestionVectorStore:
             model_id (str): Bedrock LLM model to use
         
         Returns:
-            Dict: Derivative question with same structure
+            Dict: Derivative question with same structure, or None if the output could not be parsed
         """
         prompt = f"""
         Generate a new JLPT listening test question following these guidelines:
@@ -174,7 +261,8 @@ class JLPTQuestionVectorStore:
         Conversation: {original_question.get('conversation', '')}
         Question: {original_question.get('question', '')}
 
-        New Derivative Question:
+        Respond with only a JSON object:
+        {{"introduction": "<introduction text>", "conversation": "<conversation text>", "question": "<question text>"}}
         """
         
         # Invoke Bedrock model
@@ -192,13 +280,10 @@ class JLPTQuestionVectorStore:
         response_body = json.loads(response['body'].read())
         derivative_text = response_body.get('completion', '')
         
-        # Parse derivative question (you might need to adjust parsing)
-        derivative_parts = derivative_text.split('\n')
-        return {
-            'introduction': derivative_parts[0].replace('Introduction: ', '').strip(),
-            'conversation': derivative_parts[1].replace('Conversation: ', '').strip(),
-            'question': derivative_parts[2].replace('Question: ', '').strip()
-        }
+        # Repair/validate JSON, falling back to "Introduction: ..." lines
+        return parse_structured(
+            derivative_text, EXTRACTED_QUESTION_SCHEMA, "question_derivative", labeled_fallback=True
+        )
 
 # Example usage
 if __name__ == "__main__":
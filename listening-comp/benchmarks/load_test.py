@@ -0,0 +1,165 @@
+"""
+Load test of the listening pipeline against the local AWS stand-in.
+
+Starts backend.aws_standin in-process (replaying recordings when --recordings
+is given, synthesizing responses otherwise), points the app's Bedrock and
+Polly clients at it and drives QuestionGenerator and AudioGenerator with N
+concurrent simulated users. Each user repeatedly generates a question,
+synthesizes its audio and asks for feedback on an answer. Reports per-step
+latency percentiles, throughput and the stand-in's request counts.
+
+Usage:
+    python benchmarks/load_test.py --users 1 4 16 --iterations 5 \\
+        --latency converse=lognormal:900:0.4 invoke_model=lognormal:120:0.3 synthesize_speech=lognormal:250:0.3
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+
+# Add project root to path to import app modules
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from backend.aws_standin import StandInServer, parse_latency_specs
+
+DEFAULT_LATENCY = [
+    "converse=lognormal:900:0.4",
+    "converse_stream=lognormal:400:0.3",
+    "converse_stream:chunk=fixed:30",
+    "invoke_model=lognormal:120:0.3",
+    "synthesize_speech=lognormal:250:0.3",
+    "describe_voices=fixed:50"
+]
+SEED_QUESTIONS = [
+    {"introduction": "男の人と女の人が話しています。", "conversation": f"男：{topic}について話しましょう。\n女：はい。",
+     "question": f"{topic}について、何が正しいですか。", "topic": topic}
+    for topic in ["Daily Conversation", "Shopping", "Restaurant", "School Life", "Work Situation"]
+]
+
+
+def build_app(workdir: str):
+    """App components wired to the stand-in, with all state in workdir"""
+    from backend.audio_generator import AudioGenerator
+    from backend.audio_store import AudioArtifactStore
+    from backend.bedrock_client import create_bedrock_client, create_polly_client
+    from backend.question_generator import QuestionGenerator
+    from backend.question_history import QuestionHistory
+    from backend.tts_cache import TTSSegmentCache
+    from backend.tts_providers import PollyTTSProvider
+    from backend.vector_store import JLPTQuestionVectorStore
+
+    bedrock = create_bedrock_client()
+    history = QuestionHistory(db_path=os.path.join(workdir, "history.sqlite3"),
+                              legacy_json_path=os.path.join(workdir, "none.json"))
+    store = JLPTQuestionVectorStore(backend="numpy", storage_path=os.path.join(workdir, "vectors"),
+                                    bedrock_client=bedrock)
+    store.store_questions(SEED_QUESTIONS, 2)
+    generator = QuestionGenerator(vector_store=store, bedrock_client=bedrock, history=history)
+    audio_generator = AudioGenerator(
+        bedrock_client=bedrock,
+        tts_provider=PollyTTSProvider(create_polly_client()),
+        segment_cache=TTSSegmentCache(os.path.join(workdir, "tts"), 512 * 1024 * 1024),
+        history=history,
+        store=AudioArtifactStore(os.path.join(workdir, "audio"), os.path.join(workdir, "temp"))
+    )
+    return bedrock, generator, audio_generator
+
+
+def simulate_user(generator, audio_generator, iterations: int, seed: int) -> Dict[str, List[float]]:
+    """One user's session; returns latencies in ms per step (failures under "errors")"""
+    rng = random.Random(seed)
+    timings: Dict[str, List[float]] = {"question": [], "audio": [], "feedback": [], "errors": []}
+    for _ in range(iterations):
+        start = time.perf_counter()
+        question = generator.generate_question(section=2, topic=rng.choice(SEED_QUESTIONS)["topic"], record=False)
+        timings["question"].append((time.perf_counter() - start) * 1000)
+        if not question:
+            timings["errors"].append(1)
+            continue
+
+        start = time.perf_counter()
+        audio_file = audio_generator.generate_audio(question)
+        timings["audio"].append((time.perf_counter() - start) * 1000)
+        if not audio_file:
+            timings["errors"].append(1)
+
+        start = time.perf_counter()
+        feedback = "".join(generator.provide_feedback_stream(question, str(rng.randint(1, 4))))
+        timings["feedback"].append((time.perf_counter() - start) * 1000)
+        if not feedback or feedback.startswith("Unable"):
+            timings["errors"].append(1)
+    return timings
+
+
+def run_level(generator, audio_generator, users: int, iterations: int) -> Dict:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        results = list(executor.map(
+            lambda i: simulate_user(generator, audio_generator, iterations, seed=i), range(users)
+        ))
+    elapsed = time.perf_counter() - start
+
+    row = {"users": users, "sessions/s": users * iterations / elapsed}
+    for step in ("question", "audio", "feedback"):
+        values = np.array([v for r in results for v in r[step]])
+        row[f"{step} p50"] = float(np.percentile(values, 50)) if len(values) else float('nan')
+        row[f"{step} p95"] = float(np.percentile(values, 95)) if len(values) else float('nan')
+    row["errors"] = sum(len(r["errors"]) for r in results)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the question/audio/feedback pipeline at N concurrent users")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 16], help="Concurrent users per level")
+    parser.add_argument("--iterations", type=int, default=5, help="Sessions per user")
+    parser.add_argument("--recordings", help="Directory recorded with AWS_RECORD_DIR")
+    parser.add_argument("--latency", nargs="*", default=DEFAULT_LATENCY, help="operation=distribution items")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests throttled by the stand-in")
+    parser.add_argument("--prewarm", action="store_true", help="Keep feedback prewarming on (4 extra calls per question)")
+    args = parser.parse_args()
+
+    server = StandInServer(port=0, recordings_dir=args.recordings, latency=parse_latency_specs(args.latency),
+                           error_rate=args.error_rate).start()
+    # Read at import time by the backend modules
+    os.environ.update({
+        "BEDROCK_ENDPOINT_URL": server.url,
+        "POLLY_ENDPOINT_URL": server.url,
+        "AWS_ACCESS_KEY_ID": os.environ.get("AWS_ACCESS_KEY_ID", "standin"),
+        "AWS_SECRET_ACCESS_KEY": os.environ.get("AWS_SECRET_ACCESS_KEY", "standin"),
+        "FEEDBACK_PREWARM": "true" if args.prewarm else "false",
+        "AUDIO_OUTPUT_FORMAT": "wav"
+    })
+
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    try:
+        bedrock, generator, audio_generator = build_app(workdir)
+        print(f"Stand-in at {server.url} with {server.recordings.count} recorded responses\n")
+
+        columns = None
+        for users in args.users:
+            row = run_level(generator, audio_generator, users, args.iterations)
+            if columns is None:
+                columns = list(row.keys())
+                print("".join(f"{column:>16}" for column in columns))
+            print("".join(f"{row[column]:>16.1f}" if isinstance(row[column], float) else f"{row[column]:>16}"
+                          for column in columns))
+
+        print(f"\nStand-in requests: {server.stats()}")
+        print(f"Client stats: {bedrock.stats()}")
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
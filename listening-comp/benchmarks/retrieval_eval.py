@@ -0,0 +1,188 @@
+"""
+Offline evaluation of question retrieval: vector-only vs BM25-only vs hybrid.
+
+Builds a temporary NumPy vector store from a question set and measures
+recall@k and query latency for each retriever. Two kinds of labeled queries
+are evaluated:
+
+- known-item: a fragment of one question's conversation must retrieve that question
+- topic: the topic's generation query must retrieve questions labeled with that topic
+
+Questions come from JSON files ({"section": n, "questions": [...]}, as
+written by transcript_chunker, optionally with a "topic" per question):
+--questions, or by default the chunker output in backend/data/questions.
+Only when there is none are questions synthesized per topic. Synthesized
+questions are built from the same TOPIC_KEYWORDS the BM25 side matches on,
+so their BM25 and topic recall says nothing about real transcripts; it only
+checks that the pipeline works. Embeddings come from a local hashing
+embedder standing in for Titan unless --bedrock is passed.
+
+Usage:
+    python benchmarks/retrieval_eval.py --per-topic 40 --k 5
+"""
+import argparse
+import glob
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+# Add project root to path to import app modules
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from backend.hybrid_retriever import TOPIC_KEYWORDS, HybridRetriever, tokenize
+from backend.vector_store import JLPTQuestionVectorStore
+
+SECTION_TOPICS = {
+    2: ["Daily Conversation", "Shopping", "Restaurant", "School Life", "Work Situation"],
+    3: ["Public Announcement", "Train Station", "Hospital", "Office", "Event Information"]
+}
+DEFAULT_QUESTIONS_GLOB = os.path.join(project_root, "backend", "data", "questions", "*_section_*.json")
+FILLER = ["そうですね", "ええと", "じゃあ", "ちょっと", "本当に", "大丈夫です", "わかりました", "どうしましょう"]
+
+
+class HashingEmbeddingClient:
+    """Stands in for bedrock-runtime invoke_model with Titan-shaped responses"""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def invoke_model(self, modelId, body):
+        text = json.loads(body)["inputText"]
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            digest = hashlib.md5(token.encode('utf-8')).digest()
+            vector[int.from_bytes(digest[:4], 'little') % self.dim] += 1.0 if digest[4] & 1 else -1.0
+        return {"body": io.BytesIO(json.dumps({"embedding": vector.tolist()}).encode('utf-8'))}
+
+
+def synthesize_questions(per_topic: int, seed: int) -> Dict[int, List[Dict]]:
+    rng = random.Random(seed)
+    sections = {}
+    for section, topics in SECTION_TOPICS.items():
+        questions = []
+        for topic in topics:
+            keywords = TOPIC_KEYWORDS[topic].split()
+            for i in range(per_topic):
+                words = rng.sample(keywords, 3) + rng.sample(FILLER, 3)
+                rng.shuffle(words)
+                questions.append({
+                    "introduction": f"{rng.choice(keywords)}で話しています。",
+                    "conversation": "。".join(f"{w}{rng.choice(FILLER)}" for w in words) + f"。番号{section}{i}",
+                    "question": f"{rng.choice(keywords)}について、何が正しいですか。",
+                    "topic": topic
+                })
+        sections[section] = questions
+    return sections
+
+
+def load_questions(paths: List[str]) -> Dict[int, List[Dict]]:
+    sections: Dict[int, List[Dict]] = {}
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        sections.setdefault(int(data["section"]), []).extend(data["questions"])
+    return sections
+
+
+def build_queries(store: JLPTQuestionVectorStore, max_queries: int, seed: int) -> List[Dict]:
+    rng = random.Random(seed)
+    entries = store.get_all_questions()
+    queries = []
+    for entry in rng.sample(entries, min(max_queries, len(entries))):
+        conversation = entry['metadata'].get('conversation', '')
+        start = rng.randrange(max(1, len(conversation) - 16))
+        queries.append({"kind": "known-item", "query": conversation[start:start + 16],
+                        "section": entry['section'], "topic": None, "relevant": {entry['id']}})
+
+    by_topic: Dict[str, set] = {}
+    for entry in entries:
+        if entry['metadata'].get('topic'):
+            by_topic.setdefault(entry['metadata']['topic'], set()).add(entry['id'])
+    for topic, ids in by_topic.items():
+        section = next(e['section'] for e in entries if e['id'] in ids)
+        queries.append({"kind": "topic", "query": f"Generate a new JLPT listening question about {topic}",
+                        "section": section, "topic": topic, "relevant": ids})
+    return queries
+
+
+def evaluate(retriever: HybridRetriever, queries: List[Dict], k: int) -> Dict[str, Dict]:
+    # Every method gets the same section/topic filters, so only the rankings differ
+    methods = {
+        "vector": lambda q: [r['id'] for r in retriever.vector_search(q['query'], q['section'], q['topic'], k)],
+        "bm25": lambda q: [i for i, _ in retriever.lexical_search(q['query'], q['section'], q['topic'], k)],
+        "hybrid": lambda q: [r['id'] for r in retriever.retrieve(q['query'], q['section'], q['topic'], k)]
+    }
+    report = {}
+    for name, method in methods.items():
+        latencies = []
+        recall: Dict[str, List[float]] = {}
+        for query in queries:
+            start = time.perf_counter()
+            ids = method(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits = len(set(ids[:k]) & query['relevant'])
+            recall.setdefault(query['kind'], []).append(hits / min(k, len(query['relevant'])))
+        report[name] = {
+            **{f"recall@{k} {kind}": float(np.mean(values)) for kind, values in recall.items()},
+            "p50 ms": float(np.percentile(latencies, 50)),
+            "p95 ms": float(np.percentile(latencies, 95))
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate vector, BM25 and hybrid question retrieval")
+    parser.add_argument("--questions", nargs="*", help="Section JSON files; synthesized when omitted")
+    parser.add_argument("--per-topic", type=int, default=40, help="Synthesized questions per topic")
+    parser.add_argument("--queries", type=int, default=200, help="Known-item queries")
+    parser.add_argument("--k", type=int, default=5, help="Cutoff for recall@k")
+    parser.add_argument("--bedrock", action="store_true", help="Embed with Titan instead of the local embedder")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    paths = args.questions or sorted(glob.glob(DEFAULT_QUESTIONS_GLOB))
+    if paths:
+        sections = load_questions(paths)
+        print(f"Questions from {len(paths)} file(s)")
+    else:
+        sections = synthesize_questions(args.per_topic, args.seed)
+        print("WARNING: no extracted questions found (run backend/transcript_chunker.py or pass --questions); "
+              "using synthesized questions built from TOPIC_KEYWORDS, so BM25/topic recall is inflated "
+              "and not indicative of real transcripts")
+    workdir = tempfile.mkdtemp(prefix="retrieval_eval_")
+    try:
+        store = JLPTQuestionVectorStore(
+            backend="numpy",
+            storage_path=workdir,
+            bedrock_client=None if args.bedrock else HashingEmbeddingClient()
+        )
+        for section, questions in sections.items():
+            store.store_questions(questions, section, ids=[f"s{section}_q{i}" for i in range(len(questions))])
+
+        retriever = HybridRetriever(store)
+        queries = build_queries(store, args.queries, args.seed)
+        print(f"{sum(len(q) for q in sections.values())} questions, {len(queries)} queries, k={args.k}\n")
+
+        report = evaluate(retriever, queries, args.k)
+        columns = list(next(iter(report.values())).keys())
+        print(f"{'method':<8}" + "".join(f"{column:>22}" for column in columns))
+        for name, row in report.items():
+            print(f"{name:<8}" + "".join(f"{row[column]:>22.3f}" for column in columns))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Measure the backend cold-start cost of a new Streamlit session.
+
+"per-session" builds a fresh QuestionGenerator per session, as the app used
+to do, with its own bedrock client, vector store and history; "shared" goes
+through backend.resources, so only the first session pays for client and
+vector store construction. No AWS calls are made, and the vector index and
+history live in a temporary directory so the app's data is never touched.
+
+Usage:
+    python benchmarks/session_cold_start.py --sessions 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Add project root to path to import app modules
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+# Client construction only needs a region and some credentials to exist
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+os.environ.setdefault('VECTOR_STORE_BACKEND', 'numpy')
+
+import boto3
+
+from backend import resources
+from backend.bedrock_client import REGION_NAME, create_bedrock_client
+from backend.question_generator import QuestionGenerator
+from backend.question_history import QuestionHistory
+from backend.vector_store import JLPTQuestionVectorStore
+
+
+def _history(storage_dir: str) -> QuestionHistory:
+    return QuestionHistory(
+        db_path=os.path.join(storage_dir, 'question_history.sqlite3'),
+        legacy_json_path=os.path.join(storage_dir, 'question_history.json')
+    )
+
+
+def use_temp_storage(storage_dir: str):
+    """Point the shared vector store and history at storage_dir instead of backend/"""
+    resources.get_vector_store = lambda: resources._get_or_create(
+        "vector_store",
+        lambda: JLPTQuestionVectorStore(storage_path=os.path.join(storage_dir, 'vectors'),
+                                        bedrock_client=resources.get_bedrock_client())
+    )
+    resources.get_question_history = lambda: resources._get_or_create(
+        "question_history", lambda: _history(storage_dir)
+    )
+
+
+def per_session(storage_dir: str) -> float:
+    start = time.perf_counter()
+    # A private client, as each session used to create, rather than the shared one
+    bedrock_client = create_bedrock_client(boto3.session.Session(region_name=REGION_NAME))
+    QuestionGenerator(
+        vector_store=JLPTQuestionVectorStore(storage_path=os.path.join(storage_dir, 'vectors'),
+                                             bedrock_client=bedrock_client),
+        bedrock_client=bedrock_client,
+        history=_history(storage_dir)
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def shared() -> float:
+    start = time.perf_counter()
+    resources.get_question_generator()
+    return (time.perf_counter() - start) * 1000
+
+
+def report(name: str, timings):
+    first, rest = timings[0], timings[1:]
+    average = sum(rest) / len(rest) if rest else 0.0
+    print(f"{name:<12} first session {first:>8.2f} ms   later sessions avg {average:>8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-session backend construction")
+    parser.add_argument("--sessions", type=int, default=20)
+    args = parser.parse_args()
+
+    storage_dir = tempfile.mkdtemp(prefix="cold_start_bench_")
+    use_temp_storage(storage_dir)
+    report("per-session", [per_session(storage_dir) for _ in range(args.sessions)])
+    report("shared", [shared() for _ in range(args.sessions)])
+
+
+if __name__ == "__main__":
+    main()
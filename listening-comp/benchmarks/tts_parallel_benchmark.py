@@ -0,0 +1,114 @@
+"""
+Measure sequential vs concurrent TTS segment synthesis.
+
+Runs a local fake Polly endpoint that answers synthesize_speech after a fixed
+delay, points a real boto3 Polly client at it, and synthesizes the speech
+parts of a dialogue with AudioGenerator at different concurrency limits.
+
+Usage:
+    python benchmarks/tts_parallel_benchmark.py --lines 10 --latency-ms 300
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+
+# Add project root to path to import app modules
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from backend.audio_generator import AudioGenerator
+from backend.tts_cache import TTSSegmentCache
+
+
+class FakePollyHandler(BaseHTTPRequestHandler):
+    """Answers DescribeVoices and SynthesizeSpeech like the Polly REST API"""
+    latency_s = 0.3
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        voices = {"Voices": [{"Id": "Takumi", "LanguageCode": "ja-JP"}, {"Id": "Mizuki", "LanguageCode": "ja-JP"}]}
+        self._send(json.dumps(voices).encode(), "application/json")
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        time.sleep(self.latency_s)
+        # 100 ms of 16-bit PCM silence per character
+        self._send(b"\x00" * 3200 * len(request.get("Text", "")), "audio/pcm")
+
+
+def start_fake_polly(latency_ms: int) -> ThreadingHTTPServer:
+    FakePollyHandler.latency_s = latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakePollyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent TTS segment synthesis")
+    parser.add_argument("--lines", type=int, default=10, help="Dialogue lines per question")
+    parser.add_argument("--latency-ms", type=int, default=300, help="Fake TTS round-trip latency")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    server = start_fake_polly(args.latency_ms)
+    polly = boto3.client(
+        "polly",
+        region_name="us-east-1",
+        endpoint_url=f"http://127.0.0.1:{server.server_port}",
+        aws_access_key_id="benchmark",
+        aws_secret_access_key="benchmark"
+    )
+
+    conversation = {
+        "announcer_intro": "男の人と女の人が話しています。",
+        "conversation": [
+            {"speaker": "A", "gender": "male" if i % 2 else "female", "text": f"これは{i}番目のせりふです。"}
+            for i in range(args.lines)
+        ],
+        "announcer_question": "女の人はこれから何をしますか。"
+    }
+
+    print(f"{args.lines + 2} speech segments, {args.latency_ms} ms per TTS call")
+    for concurrency in args.concurrency:
+        # Empty cache per run so every segment really goes to the TTS endpoint
+        cache_dir = tempfile.mkdtemp(prefix="tts_bench_cache_")
+        generator = AudioGenerator(
+            bedrock_client=object(),
+            polly_client=polly,
+            max_concurrency=concurrency,
+            segment_cache=TTSSegmentCache(cache_dir, 100 * 1024 * 1024)
+        )
+        plan = generator._build_segment_plan(conversation)
+
+        start = time.perf_counter()
+        segments = generator._synthesize_segments(plan)
+        elapsed = time.perf_counter() - start
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+        status = "ok" if segments else "failed"
+        print(f"concurrency {concurrency:>2}: {elapsed * 1000:>8.1f} ms ({status})")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
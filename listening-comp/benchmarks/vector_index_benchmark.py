@@ -0,0 +1,95 @@
+"""
+Compare the Chroma and NumPy vector index backends.
+
+Builds both indexes from the same random embeddings (no Bedrock calls), then
+measures cold load time (client open + first query) and query latency.
+
+Usage:
+    python benchmarks/vector_index_benchmark.py --size 3000 --dim 1536
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add project root to path to import app modules
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from backend.vector_index import NumpyIndexClient
+
+
+def open_client(backend: str, path: str):
+    if backend == 'numpy':
+        return NumpyIndexClient(path=path)
+    import chromadb
+    return chromadb.PersistentClient(path=path)
+
+
+def build_index(backend: str, path: str, embeddings: np.ndarray, batch_size: int = 500):
+    collection = open_client(backend, path).get_or_create_collection(name="benchmark")
+    for start in range(0, len(embeddings), batch_size):
+        batch = embeddings[start:start + batch_size]
+        collection.add(
+            ids=[f"question_{i}" for i in range(start, start + len(batch))],
+            embeddings=batch.tolist(),
+            metadatas=[{"full_question": "{}", "section": 2} for _ in batch]
+        )
+
+
+def measure(backend: str, path: str, queries: np.ndarray, n_results: int):
+    start = time.perf_counter()
+    collection = open_client(backend, path).get_collection(name="benchmark")
+    collection.query(query_embeddings=[queries[0].tolist()], n_results=n_results)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        collection.query(query_embeddings=[query.tolist()], n_results=n_results)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return load_ms, np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vector index backends")
+    parser.add_argument("--size", type=int, default=3000, help="Number of stored questions")
+    parser.add_argument("--dim", type=int, default=1536, help="Embedding dimension (Titan v1 is 1536)")
+    parser.add_argument("--queries", type=int, default=200, help="Number of timed queries")
+    parser.add_argument("--n-results", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    embeddings = rng.normal(size=(args.size, args.dim)).astype(np.float32)
+    queries = rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+
+    backends = ['numpy']
+    try:
+        import chromadb  # noqa: F401
+        backends.insert(0, 'chroma')
+    except ImportError:
+        print("chromadb not installed, benchmarking the numpy backend only")
+
+    print(f"{args.size} vectors x {args.dim} dims, {args.queries} queries, top-{args.n_results}")
+    print(f"{'backend':<8} {'build s':>9} {'load ms':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for backend in backends:
+        path = tempfile.mkdtemp(prefix=f"vector_bench_{backend}_")
+        try:
+            start = time.perf_counter()
+            build_index(backend, path, embeddings)
+            build_s = time.perf_counter() - start
+            load_ms, p50, p95 = measure(backend, path, queries, args.n_results)
+            print(f"{backend:<8} {build_s:>9.2f} {load_ms:>9.1f} {p50:>8.2f} {p95:>8.2f}")
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
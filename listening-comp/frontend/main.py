@@ -1,6 +1,7 @@
 import streamlit as st
 import sys
 import os
+import time
 from datetime import datetime
 
 # Add project root to Python path
@@ -8,16 +9,20 @@ project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if project_root not in sys.path:
     sys.path.append(project_root)
 
-from backend.question_generator import QuestionGenerator
-from backend.chat import BedrockChat
 from backend.get_transcript import YouTubeTranscriptDownloader
-from backend.audio_generator import AudioGenerator
+from backend import resources, tracing
+from backend.audio_stream_server import AUDIO_STREAMING
+from backend.output_parser import parse_stats
+from backend.transcript_stats import transcript_stats
 
 from typing import Dict
 import json
 from collections import Counter
 import re
 
+# Number of history entries shown per page in the sidebar
+HISTORY_PAGE_SIZE = 20
+
 # Page config
 st.set_page_config(
     page_title="JLPT Listening Practice",
@@ -26,20 +31,20 @@ st.set_page_config(
 )
 
 # Initialize session state
+# Backend generators and clients are process-wide (backend.resources) and are
+# built lazily on first use; session state only holds per-user data.
+if 'session_cold_start_ms' not in st.session_state:
+    st.session_state.session_cold_start_ms = None
 if 'transcript' not in st.session_state:
     st.session_state.transcript = None
 if 'messages' not in st.session_state:
     st.session_state.messages = []
-if 'question_generator' not in st.session_state:
-    st.session_state.question_generator = QuestionGenerator()
 if 'current_question' not in st.session_state:
     st.session_state.current_question = None
 if 'correct_answer' not in st.session_state:
     st.session_state.correct_answer = None
 if 'stage' not in st.session_state:
     st.session_state.stage = None
-if 'audio_generator' not in st.session_state:
-    st.session_state.audio_generator = AudioGenerator()
 if 'current_audio_file' not in st.session_state:
     st.session_state.current_audio_file = None
 
@@ -120,10 +125,6 @@ def render_chat_stage():
     """Render an improved chat interface"""
     st.header("Chat with Nova")
 
-    # Initialize BedrockChat instance if not in session state
-    if 'bedrock_chat' not in st.session_state:
-        st.session_state.bedrock_chat = BedrockChat()
-
     # Introduction text
     st.markdown("""
     Start by exploring Nova's base Japanese language capabilities. Try asking questions about Japanese grammar, 
@@ -170,33 +171,25 @@ def render_chat_stage():
 
 def process_message(message: str):
     """Process a message and generate a response"""
+    # Earlier turns go to the model as context (trimmed to a token budget)
+    history = list(st.session_state.messages)
+
     # Add user message to state and display
     st.session_state.messages.append({"role": "user", "content": message})
     with st.chat_message("user", avatar="🧑‍💻"):
         st.markdown(message)
 
-    # Generate and display assistant's response
+    # Stream the assistant's response as the model produces it
     with st.chat_message("assistant", avatar="🤖"):
-        response = st.session_state.bedrock_chat.generate_response(message)
+        placeholder = st.empty()
+        response = ""
+        with tracing.span("chat", kind="action"):
+            for chunk in resources.get_bedrock_chat().generate_response_stream(message, history=history):
+                response += chunk
+                placeholder.markdown(response)
         if response:
-            st.markdown(response)
             st.session_state.messages.append({"role": "assistant", "content": response})
 
-def count_characters(text):
-    """Count Japanese and total characters in text"""
-    if not text:
-        return 0, 0
-        
-    def is_japanese(char):
-        return any([
-            '\u4e00' <= char <= '\u9fff',  # Kanji
-            '\u3040' <= char <= '\u309f',  # Hiragana
-            '\u30a0' <= char <= '\u30ff',  # Katakana
-        ])
-    
-    jp_chars = sum(1 for char in text if is_japanese(char))
-    return jp_chars, len(text)
-
 def render_transcript_stage():
     """Render the raw transcript stage"""
     st.header("Raw Transcript Processing")
@@ -252,14 +245,29 @@ def render_transcript_stage():
     with col2:
         st.subheader("Transcript Stats")
         if st.session_state.transcript:
-            # Calculate stats
-            jp_chars, total_chars = count_characters(st.session_state.transcript)
-            total_lines = len(st.session_state.transcript.split('\n'))
+            # Calculate stats (cached per transcript, so reruns are free)
+            stats = transcript_stats(st.session_state.transcript)
             
             # Display stats
-            st.metric("Total Characters", total_chars, key="total_chars")
-            st.metric("Japanese Characters", jp_chars, key="jp_chars")
-            st.metric("Total Lines", total_lines, key="total_lines")
+            st.metric("Total Characters", stats["total_chars"])
+            st.metric("Japanese Characters", stats["japanese_chars"])
+            st.metric("Total Lines", stats["lines"])
+            st.metric("Segments", stats["segments"])
+
+            st.caption("Script breakdown")
+            st.dataframe(
+                [{"script": script, "characters": value["count"], "share": f"{value['share']:.1%}"}
+                 for script, value in stats["scripts"].items()],
+                hide_index=True
+            )
+
+            st.caption(f"Estimated JLPT kanji level ({stats['kanji']['unique']} distinct kanji)")
+            st.dataframe(
+                [{"level": level, "distinct": value["unique"], "occurrences": value["occurrences"],
+                  "share": f"{value['share']:.1%}"}
+                 for level, value in stats["kanji"]["levels"].items()],
+                hide_index=True
+            )
         else:
             st.info("Load a transcript to see statistics")
 
@@ -302,13 +310,31 @@ def render_rag_stage():
         # Placeholder for LLM response
         st.info("Generated response will appear here")
 
+def render_question_preview(placeholder, partial: Dict):
+    """Render the fields of a question that is still being generated"""
+    lines = ["*Generating question...*"]
+    if partial.get("introduction"):
+        lines.append(f"**Introduction:** {partial['introduction']}")
+    if partial.get("conversation"):
+        lines.append("**Conversation:**  \n" + partial["conversation"].replace("\n", "  \n"))
+    if partial.get("question"):
+        lines.append(f"**Question:** {partial['question']}")
+    for i, option in enumerate(partial.get("options") or [], 1):
+        lines.append(f"{i}. {option}")
+    placeholder.markdown("\n\n".join(lines))
+
 def render_interactive_stage():
     """Render the interactive stage of the app"""
     st.title("JLPT Listening Practice")
     
+    # Shared generator, created on first use by any session; record what the
+    # first access costs this session (near zero once another session built it)
+    start = time.perf_counter()
+    question_generator = resources.get_question_generator()
+    if st.session_state.session_cold_start_ms is None:
+        st.session_state.session_cold_start_ms = (time.perf_counter() - start) * 1000
+    
     # Initialize session state
-    if 'question_generator' not in st.session_state:
-        st.session_state.question_generator = QuestionGenerator()
     if 'current_question' not in st.session_state:
         st.session_state.current_question = None
     if 'feedback' not in st.session_state:
@@ -332,10 +358,14 @@ def render_interactive_stage():
         # Add filter toggle
         show_all_history = st.checkbox("Show all questions", value=True)
         
-        # Get question history
-        history = st.session_state.question_generator.get_question_history(
+        # Get the newest page(s) of question history
+        if 'history_limit' not in st.session_state:
+            st.session_state.history_limit = HISTORY_PAGE_SIZE
+        history = question_generator.get_question_history(
             section=None if show_all_history else section_num,
-            topic=None if show_all_history else selected_topic
+            topic=None if show_all_history else selected_topic,
+            limit=st.session_state.history_limit,
+            newest_first=True
         )
         
         if not history:
@@ -375,7 +405,7 @@ def render_interactive_stage():
             
             # Create a container for scrollable history
             with st.container():
-                for entry in reversed(history):
+                for entry in history:
                     timestamp = datetime.fromisoformat(entry["timestamp"]).strftime("%H:%M")
                     question = entry["question"]
                     preview = question.get("introduction", "")[:40] + "..."
@@ -394,6 +424,11 @@ def render_interactive_stage():
                         st.session_state.section = entry['section']
                         st.session_state.topic = entry['topic']
                         st.rerun()
+            
+            if len(history) >= st.session_state.history_limit:
+                if st.button("Show older questions", key="history_more", use_container_width=True):
+                    st.session_state.history_limit += HISTORY_PAGE_SIZE
+                    st.rerun()
     
     # Section selection
     st.markdown("### Section Selection")
@@ -417,25 +452,69 @@ def render_interactive_stage():
         key="topic"
     )
     
+    # Keep ready questions for the selected section/topic in the background
+    question_pool = resources.get_question_pool()
+    question_pool.warm(section_num, selected_topic)
+    
     # Generate new question button
     if st.button("Generate New Question", key="generate_question"):
-        try:
-            new_question = st.session_state.question_generator.generate_question(
-                section=section_num,
-                topic=selected_topic
-            )
-            if new_question:
-                # Remove any existing audio file reference
-                new_question.pop('audio_file', None)
-                st.session_state.current_question = new_question
-                st.session_state.feedback = None
-                st.session_state.show_audio = False
-                st.rerun()
-            else:
-                st.error("Failed to generate a new question. Please try again.")
-        except Exception as e:
-            st.error(f"Error generating question: {str(e)}")
+        with tracing.span("generate_question", kind="action"):
+            try:
+                new_question = question_pool.take(
+                    section=section_num,
+                    topic=selected_topic
+                )
+                if new_question is None:
+                    # Pool miss: stream the generation so fields appear as they arrive
+                    preview = st.empty()
+                    for partial, done in question_generator.generate_question_stream(
+                        section=section_num,
+                        topic=selected_topic
+                    ):
+                        if done:
+                            new_question = partial or None
+                        else:
+                            render_question_preview(preview, partial)
+                    preview.empty()
+                if new_question:
+                    # Pooled questions may already come with their audio
+                    has_audio = os.path.exists(new_question.get('audio_file') or '')
+                    if not has_audio:
+                        new_question.pop('audio_file', None)
+                    # Format the conversation and generate feedback for every option
+                    # in the background while the user reads and listens
+                    resources.get_question_pipeline().prefetch(new_question)
+                    st.session_state.current_question = new_question
+                    st.session_state.feedback = None
+                    st.session_state.show_audio = has_audio
+                    st.rerun()
+                else:
+                    st.error("Failed to generate a new question. Please try again.")
+            except Exception as e:
+                st.error(f"Error generating question: {str(e)}")
 
+    with st.expander("Question Pool Metrics"):
+        st.json(question_pool.metrics())
+    with st.expander("TTS Cache Metrics"):
+        st.json(resources.get_audio_generator().segment_cache.stats())
+    with st.expander("Audio Store Metrics"):
+        st.json(resources.get_audio_generator().store.stats())
+    with st.expander("Output Parser Metrics"):
+        st.json(parse_stats())
+    with st.expander("Feedback Cache Metrics"):
+        st.json(question_generator.feedback_cache_stats())
+    with st.expander("Bedrock Client Metrics"):
+        st.json(resources.get_bedrock_client().stats())
+    with st.expander("Prefetch Timeline"):
+        timeline = resources.get_question_pipeline().last_timeline
+        st.code(timeline.render() if timeline else "No prefetch has finished yet")
+    with st.expander("Trace Summary"):
+        # Where time and tokens go, per stage and per recent user action
+        st.dataframe(tracing.summarize(), use_container_width=True)
+        st.json(tracing.recent_actions(limit=5))
+        st.download_button("Download spans (JSONL)", tracing.to_jsonl(), file_name="traces.jsonl",
+                           mime="application/jsonl", key="download_traces")
+    
     # Display current question
     if st.session_state.current_question:
         question = st.session_state.current_question
@@ -481,17 +560,30 @@ def render_interactive_stage():
             if not st.session_state.show_audio:
                 # Only show the generate button if audio hasn't been generated
                 if st.button("🔊 Generate Audio", key="generate_audio", use_container_width=True):
-                    with st.spinner("Generating audio..."):
-                        audio_file = st.session_state.audio_generator.generate_audio(question)
-                        if audio_file and os.path.exists(audio_file):
-                            # Create a new copy of the question to avoid modifying the original
+                    with tracing.span("generate_audio", kind="action"):
+                        audio_generator = resources.get_audio_generator()
+                        if AUDIO_STREAMING and not audio_generator.get_cached_audio(question):
+                            # Start playback from the first synthesized segment; the
+                            # final file is written to audio_file once streaming ends
+                            stream_server = resources.get_audio_stream_server()
                             updated_question = question.copy()
-                            updated_question['audio_file'] = audio_file
+                            updated_question['audio_file'] = audio_generator.output_path(question)
+                            stream_id = stream_server.publish(audio_generator.stream_audio(question))
+                            updated_question['audio_stream_url'] = stream_server.url(stream_id)
                             st.session_state.current_question = updated_question
                             st.session_state.show_audio = True
                             st.rerun()
-                        else:
-                            st.error("Failed to generate audio. Please try again.")
+                        with st.spinner("Generating audio..."):
+                            audio_file = audio_generator.generate_audio(question)
+                            if audio_file and os.path.exists(audio_file):
+                                # Create a new copy of the question to avoid modifying the original
+                                updated_question = question.copy()
+                                updated_question['audio_file'] = audio_file
+                                st.session_state.current_question = updated_question
+                                st.session_state.show_audio = True
+                                st.rerun()
+                            else:
+                                st.error("Failed to generate audio. Please try again.")
             else:
                 # Show the audio player and a regenerate button
                 if 'audio_file' in question and os.path.exists(question['audio_file']):
@@ -500,15 +592,21 @@ def render_interactive_stage():
                         st.audio(question['audio_file'])
                     with col2:
                         if st.button("🔄 Regenerate", key="regenerate_audio", use_container_width=True):
-                            with st.spinner("Regenerating audio..."):
-                                audio_file = st.session_state.audio_generator.generate_audio(question)
-                                if audio_file and os.path.exists(audio_file):
-                                    updated_question = question.copy()
-                                    updated_question['audio_file'] = audio_file
-                                    st.session_state.current_question = updated_question
-                                    st.rerun()
-                                else:
-                                    st.error("Failed to regenerate audio. Please try again.")
+                            with tracing.span("regenerate_audio", kind="action"):
+                                with st.spinner("Regenerating audio..."):
+                                    audio_file = resources.get_audio_generator().generate_audio(question, force=True)
+                                    if audio_file and os.path.exists(audio_file):
+                                        updated_question = question.copy()
+                                        updated_question['audio_file'] = audio_file
+                                        updated_question.pop('audio_stream_url', None)
+                                        st.session_state.current_question = updated_question
+                                        st.rerun()
+                                    else:
+                                        st.error("Failed to regenerate audio. Please try again.")
+                elif question.get('audio_stream_url'):
+                    # Still synthesizing: play the growing stream
+                    st.audio(question['audio_stream_url'], format="audio/wav")
+                    st.caption("Audio is streaming while the rest of the question is synthesized.")
                 else:
                     st.error("Audio file not found. Please try regenerating the audio.")
                     if st.button("🔄 Try Again", key="retry_audio", use_container_width=True):
@@ -553,34 +651,37 @@ def render_interactive_stage():
         
         # Submit answer button
         if st.button("Submit Answer", key="submit_answer"):
-            try:
-                feedback = st.session_state.question_generator.provide_feedback(
-                    question=st.session_state.current_question,
-                    user_answer=str(st.session_state.selected_answer)
-                )
-                
-                # Show feedback with correct answer highlighting
-                st.session_state.feedback = feedback
-                correct_answer = st.session_state.current_question.get('correct_answer', 0) + 1
-                user_answer = st.session_state.selected_answer
+            with tracing.span("submit_answer", kind="action"):
+                try:
+                    # Show feedback with correct answer highlighting
+                    correct_answer = st.session_state.current_question.get('correct_answer', 0) + 1
+                    user_answer = st.session_state.selected_answer
                 
-                # Display feedback
-                st.markdown("### Feedback")
-                is_correct = user_answer == correct_answer
-                st.markdown(f"Your answer: {'✅' if is_correct else '❌'} Option {user_answer}")
-                st.markdown(f"Correct answer: Option {correct_answer}")
+                    # Display feedback
+                    st.markdown("### Feedback")
+                    is_correct = user_answer == correct_answer
+                    st.markdown(f"Your answer: {'✅' if is_correct else '❌'} Option {user_answer}")
+                    st.markdown(f"Correct answer: Option {correct_answer}")
                 
-                # Display feedback message with appropriate styling
-                if is_correct:
-                    st.success("✨ Correct! Great job! ✨")
-                else:
-                    st.error("❌ Incorrect. Let's learn from this!")
+                    # Display feedback message with appropriate styling
+                    if is_correct:
+                        st.success("✨ Correct! Great job! ✨")
+                    else:
+                        st.error("❌ Incorrect. Let's learn from this!")
                 
-                # Display the feedback text
-                st.info(feedback)
+                    # Stream the feedback text as the model produces it
+                    feedback_placeholder = st.empty()
+                    feedback = ""
+                    for chunk in question_generator.provide_feedback_stream(
+                        question=st.session_state.current_question,
+                        user_answer=str(st.session_state.selected_answer)
+                    ):
+                        feedback += chunk
+                        feedback_placeholder.info(feedback)
+                    st.session_state.feedback = feedback
                 
-            except Exception as e:
-                st.error(f"Error providing feedback: {str(e)}")
+                except Exception as e:
+                    st.error(f"Error providing feedback: {str(e)}")
 
 def main():
     """Main entry point for the Streamlit app"""
@@ -622,7 +723,9 @@ def main():
             st.json({
                 "selected_stage": selected_stage,
                 "transcript_loaded": st.session_state.transcript is not None,
-                "chat_messages": len(st.session_state.messages)
+                "chat_messages": len(st.session_state.messages),
+                "session_cold_start_ms": st.session_state.session_cold_start_ms,
+                "shared_resource_init_ms": resources.init_times_ms()
             })
 
 if __name__ == "__main__":